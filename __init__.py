@@ -1,24 +1,81 @@
-from flask import Flask , render_template, request, flash, url_for, redirect, send_from_directory, jsonify
+from flask import Flask , render_template, request, flash, url_for, redirect, send_from_directory, jsonify, abort, Response, stream_with_context, make_response
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 import werkzeug.exceptions
 import os
-import subprocess
+import multiprocessing
+import threading
 import sys
 import time
 import logging
 import traceback
+import hashlib
+import json
+import sqlite3
+import argparse
 
 
 from app import split_pdf 
+from app import jobs
+from app import result_cache
+from app import batch
+from app import pdf_writer
+from app import metrics
+from app import uploads
+from app import workspaces
+from app import admission
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
 
+# uploads are streamed to the upload folder and checked while the request is parsed, instead of being spooled and copied
+class StreamingUploadRequest(Flask.request_class):
+	def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+		return uploads.HashingUploadFile(app.config['UPLOAD_FOLDER'], filename)
+
+
 app = Flask(__name__)
+app.request_class = StreamingUploadRequest
+TRUSTED_PROXIES = 1 # proxies in front of the app (nginx) that set X-Forwarded-For, the client address is taken from them, 0 when clients connect directly
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES) # otherwise every client has the proxy's address and shares its upload rate limit
 app.secret_key = 'secret'
 MAX_FILE_SIZE = 25 #size in MB
+MAX_PAGES = 500 # longer pdfs are turned away before they are queued, they would not split within SPLITTER_TIMEOUT
+SPLITTER_WORKERS = 2 # job threads per app process, each one with its own warm worker process
+SPLITTER_MAX_TASKS_PER_WORKER = 50 # recycle workers every so often to give memory back
+SPLITTER_TIMEOUT = 300 # seconds before a split is considered failed
+SPLIT_IN_MEMORY = True # keep pages in memory instead of writing them to temporary directories
+MAX_QUEUED_JOBS = 20 # uploads waiting for a free worker, anything above this is turned away
+MAX_QUEUED_COST = 2000 # pages at the default dpi queued or being split by every app process together, uploads above it are turned away
+MAX_RUNNING_COST = 300 # pages at the default dpi split at the same time by every app process together, more would push the server into swap
+SECONDS_PER_PAGE = 0.5 # rough time a worker takes to split a page at the default dpi, to tell turned away clients when to come back
+UPLOAD_RATE = 0.2 # uploads a second each client can make on average
+UPLOAD_BURST = 10 # uploads a client can make at once before UPLOAD_RATE applies
+JOB_STATUS_REFRESH = 2 # seconds between status page reloads
+RESULT_CACHE_SIZE = 500 # size in MB of the outputs kept for repeated uploads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024 # bytes sent at a time when streaming an output that is still being written
+DOWNLOAD_POLL_INTERVAL = 0.5 # seconds between checks for new output bytes
+PROGRESS_POLL_INTERVAL = 0.5 # seconds between checks for new progress of a job followed by the status page
+EVENT_STREAM_SECONDS = 20 # seconds a progress stream stays open, under gunicorn's 30 second worker timeout, the browser then reconnects
+# stream outputs while they are written, every download holds a worker until its split is done
+# only for threaded or gevent gunicorn workers with a timeout above SPLITTER_TIMEOUT, sync workers get the status page instead
+STREAM_DOWNLOADS = False
+WORKSPACE_TTL = 24 * 60 * 60 # seconds uploads and outputs are kept after they were last written
+WORKSPACE_QUOTA = 2000 # size in MB of the upload and output folders together, the oldest workspaces are removed first above it
+WORKSPACE_GRACE = SPLITTER_TIMEOUT * (MAX_QUEUED_JOBS + 1) # seconds a workspace is kept whatever the quota, long enough for a queued split to finish
+WORKSPACE_REAP_INTERVAL = 60 # seconds between passes of the reaper
+splitter_pools = threading.local()
+job_queue = None
+job_queue_lock = threading.Lock()
+workspace_reaper = None
+results = None
+results_lock = threading.Lock()
+metrics_store = None
+metrics_lock = threading.Lock()
+rate_limiter = None
+rate_limiter_lock = threading.Lock()
 
 
 if (len(sys.argv) > 1) and (sys.argv[1] == "DEBUG"):
@@ -32,6 +89,11 @@ else:
 app.config['UPLOAD_FOLDER'] = str(app.root_path) + "/static/uploaded_files"  
 file_input_location_absolute = str(app.root_path)+"/static/uploaded_files/" 
 file_output_location_absolute = str(app.root_path)+"/static/served_files/"
+jobs_database_path = str(app.root_path)+"/jobs.sqlite" # shared by every app process, outside static/ so it is never served
+result_cache_location_absolute = str(app.root_path)+"/result_cache/"
+layouts_database_path = str(app.root_path)+"/layouts.sqlite" # slide layouts found on earlier uploads, shared by every splitter worker
+metrics_database_path = str(app.root_path)+"/metrics.sqlite" # stage timing histograms of every app process, for /metrics
+rate_limits_database_path = str(app.root_path)+"/rate_limits.sqlite" # upload token buckets of every client, shared by every app process
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE * 1024 * 1024
 ALLOWED_EXTENSIONS = set(['pdf'])
 
@@ -39,32 +101,185 @@ def allowed_filename(filename):
 	return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def call_pdf_splitter_subprocess(filename, splitting_mode):
-	script_path = os.path.join(app.root_path, 'app/split_pdf.py')
-	#full_path_to_filename = os.path.join(file_input_location_absolute, filename)
-	args = list()
-	args.append(sys.executable)
-	args.append(script_path)
-	args.append('-f')
-	args.append(filename)
-	args.append('-i')
-	args.append(file_input_location_absolute)
-	args.append('-o')
-	args.append(file_output_location_absolute)
-	args.append('-m')
-	args.append(str(splitting_mode))
-	
-	logger.info("running script, args:")
+# pre-forked worker that already has cv2, numpy, reportlab and pdf2image imported
+# every calling thread gets its own single process pool, created lazily so that every gunicorn worker forks its own after startup
+# and so that a split that times out can be killed without taking other threads' splits with it
+def get_splitter_pool():
+	pool = getattr(splitter_pools, 'pool', None)
+	if pool is None:
+		pool = multiprocessing.Pool(processes=1, maxtasksperchild=SPLITTER_MAX_TASKS_PER_WORKER)
+		splitter_pools.pool = pool
+		logger.info("Started splitter worker for thread "+threading.current_thread().name)
+	return pool
+
+def recycle_splitter_pool(): # kill this thread's worker, the next split forks a fresh one
+	pool = splitter_pools.pool
+	splitter_pools.pool = None
+	pool.terminate()
+	pool.join()
+
+# split_document keyword arguments picked on the upload form, only the ones users are allowed to set
+def get_split_options(request_args):
+	split_options = {}
+	if request_args.get('vector') == '1':
+		split_options['vector'] = True
+	dpi = request_args.get('dpi', type=int)
+	if dpi in split_pdf.ALLOWED_DPIS: # anything else keeps the default, rendering cost grows with the square of the dpi
+		split_options['dpi'] = dpi
+	if request_args.get('image_format') in pdf_writer.IMAGE_FORMATS:
+		split_options['image_format'] = request_args.get('image_format')
+	if request_args.get('resize_filter') in split_pdf.RESIZE_FILTERS: # the width is left to the dpi, a bigger one would cost more than the budget accounts for
+		split_options['resize_filter'] = request_args.get('resize_filter')
+	for option, parse in [('pages', split_pdf.parse_page_ranges), ('slides', split_pdf.parse_slide_indexes)]:
+		if request_args.get(option, '').strip():
+			try:
+				split_options[option] = parse(request_args.get(option))
+			except argparse.ArgumentTypeError: # like a dpi that is not allowed, the whole document is split
+				logger.warning("ignoring "+option+" option "+request_args.get(option))
+	return split_options
+
+def get_result_cache():
+	global results
+	with results_lock:
+		if results is None:
+			results = result_cache.ResultCache(result_cache_location_absolute, RESULT_CACHE_SIZE * 1024 * 1024)
+	return results
+
+def get_metrics_store():
+	global metrics_store
+	with metrics_lock:
+		if metrics_store is None:
+			metrics_store = metrics.MetricsStore(metrics_database_path)
+	return metrics_store
+
+def get_rate_limiter():
+	global rate_limiter
+	with rate_limiter_lock:
+		if rate_limiter is None:
+			rate_limiter = admission.RateLimiter(rate_limits_database_path, UPLOAD_RATE, UPLOAD_BURST)
+	return rate_limiter
+
+def check_rate_limit(): # seconds the client has to wait before it can upload again, 0 if it can upload now
+	try:
+		return get_rate_limiter().acquire(request.remote_addr or 'unknown')
+	except sqlite3.Error as err: # rather let an upload through than fail it
+		logger.error("Failed to check the rate limit of "+str(request.remote_addr))
+		logger.error(err)
+		return 0
+
+def get_retry_after(queue): # seconds until the queue has likely made room, for the Retry-After header
+	return max(1, min(SPLITTER_TIMEOUT, int(queue.outstanding_cost() * SECONDS_PER_PAGE / SPLITTER_WORKERS)))
+
+def turn_away(message, status_code, retry_after): # the failure page, with a status code and a Retry-After header that clients and proxies understand
+	flash(message)
+	response = make_response(render_template('unsuccesful.html'), status_code)
+	response.headers['Retry-After'] = str(retry_after)
+	return response
+
+def record_split(filename, splitting_mode, status, started_at, timings): # a json log line for every split, and its stage timings in the /metrics histograms
+	logger.info(json.dumps({'event': 'split', 'filename': filename, 'mode': int(splitting_mode), 'status': status, 'seconds': round(time.time() - started_at, 3), 'stages': timings}))
+	try:
+		get_metrics_store().record_job(status, timings)
+	except sqlite3.Error as err: # metrics are only informative, the split itself is not affected
+		logger.error("Failed to record metrics of "+filename)
+		logger.error(err)
+
+def get_result_cache_key(filename, splitting_mode, split_options, content_hash=None): # uploads are keyed by their contents, not their name
+	if content_hash is None: # streamed uploads were hashed on their way in
+		content_hash = result_cache.hash_file(os.path.join(file_input_location_absolute, filename))
+	return result_cache.make_key(content_hash, splitting_mode, split_options)
+
+def make_upload_path(filename): # where a new upload is saved, relative to the upload folder, in a workspace of its own
+	workspace_id = workspaces.new_workspace_id()
+	workspaces.make_workspace(file_input_location_absolute, workspace_id)
+	return workspace_id+"/"+filename
+
+def get_output_path(upload_path): # where the output of an upload is served from, relative to the output folder, in the same workspace
+	workspace_id, filename = upload_path.split("/", 1)
+	return workspace_id+"/new_"+filename
+
+def is_output_path(output_path): # whether a path taken from a request names an output, and nothing else
+	parts = output_path.split("/")
+	return len(parts) == 2 and workspaces.is_workspace_id(parts[0]) and parts[1] == secure_filename(parts[1])
+
+def save_upload(pdf_file, upload_path): # move a streamed upload into its workspace, returns its content hash, raises uploads.UploadRejected if it is not a pdf
+	pdf_file.stream.keep(file_input_location_absolute+upload_path)
+	return pdf_file.stream.content_hash()
+
+# (page count, None) of an upload that can be queued, (None, why it can not be split) otherwise
+# only the pages selected by the split options are counted, they are all that is rendered
+def check_uploaded_pdf(filename, split_options):
+	try:
+		page_count = split_pdf.get_pdf_page_count(os.path.join(file_input_location_absolute, filename))
+	except Exception:
+		return None, "This file does not look like a pdf."
+	selected_page_count = split_pdf.count_selected_pages(split_options.get('pages'), page_count)
+	if selected_page_count == 0:
+		return None, "Your file has "+str(page_count)+" pages, none of the pages you selected are in it."
+	if selected_page_count > MAX_PAGES:
+		return None, "You selected "+str(selected_page_count)+" pages, up to "+str(MAX_PAGES)+" pages can be split."
+	return selected_page_count, None
+
+# queue a split, an identical upload that is still being split gets the same job id
+# raises jobs.QueueFullError if the queue has no room for the cost of the split
+def submit_split(queue, filename, splitting_mode, split_options, page_count, content_hash=None):
+	return queue.submit_unique(get_result_cache_key(filename, splitting_mode, split_options, content_hash), filename, splitting_mode, split_options, cost=admission.split_cost(page_count, split_options))
+
+def get_cached_result(filename, splitting_mode, split_options, content_hash=None): # copy a previous output for the same upload to its workspace in served_files, returns its path or None
+	output_filename = get_output_path(filename)
+	workspaces.make_workspace(file_output_location_absolute, output_filename.split("/")[0])
+	cache = get_result_cache()
+	hit = cache.get(get_result_cache_key(filename, splitting_mode, split_options, content_hash), file_output_location_absolute+output_filename)
+	logger.info("result cache "+("hit" if hit else "miss")+" for "+filename+", "+str(cache.stats()))
+	if hit:
+		return output_filename
+	return None
+
+def call_pdf_splitter(filename, splitting_mode, split_options=None, progress_callback=None): # filename is the upload's path in its workspace, returns the output's path
+	workspace_id, pdf_name = filename.split("/", 1)
+	output_destination = workspaces.make_workspace(file_output_location_absolute, workspace_id)+"/"
+	args = (pdf_name, file_input_location_absolute+workspace_id+"/", output_destination, int(splitting_mode), SPLIT_IN_MEMORY)
+	split_options = dict((str(key), value) for key, value in (split_options or {}).items()) # keys come back from json as unicode
+	logger.info("running splitter, args:")
 	logger.info(args)
-	process = subprocess.Popen(args)
-	process.wait()
-	logger.info("Subprocess finished")
+	logger.info(split_options)
+	splitter_options = dict(split_options, layout_cache_path=layouts_database_path)
+	if progress_callback is not None:
+		splitter_options['progress_callback'] = progress_callback # sent to the worker process, it writes straight to the job database
+	started_at = time.time()
+	try:
+		output_filename, timings = get_splitter_pool().apply_async(split_pdf.split_document_with_timings, args, splitter_options).get(SPLITTER_TIMEOUT)
+	except multiprocessing.TimeoutError:
+		logger.error("splitter timed out, recycling its worker. Failure!")
+		recycle_splitter_pool() # otherwise the worker keeps going and the next split waits behind it
+		record_split(filename, splitting_mode, 'timeout', started_at, [])
+		raise Exception("splitter timed out on "+filename)
+	except Exception as err:
+		logger.error("splitter failed. Failure!")
+		logger.error(err)
+		record_split(filename, splitting_mode, 'failed', started_at, [])
+		raise Exception("splitter failed on "+filename)
+	logger.info("Splitter finished. Success")
+	record_split(filename, splitting_mode, 'done', started_at, timings)
+	output_filename = workspace_id+"/"+output_filename
+	try:
+		get_result_cache().put(get_result_cache_key(filename, splitting_mode, split_options), file_output_location_absolute+output_filename)
+	except (IOError, OSError) as err: # the split itself succeeded, the next upload just runs it again
+		logger.error("Failed to cache the output of "+filename)
+		logger.error(err)
+	return output_filename
 
-	if process.returncode != 0:
-		logger.error("subprocess ended with non 0 return code. Failure!")
-		raise Exception()
-	logger.info("Subprocess returned 0 code. Success")
-	return
+# created lazily for the same reason as the splitter pool, threads do not survive a fork
+# every app process also runs a workspace reaper, two of them removing the same workspace is harmless
+def get_job_queue():
+	global job_queue, workspace_reaper
+	with job_queue_lock: # two first requests at once would otherwise start two sets of job threads
+		if job_queue is None:
+			job_queue = jobs.JobQueue(call_pdf_splitter, SPLITTER_WORKERS, MAX_QUEUED_JOBS, jobs_database_path, report_progress=True, max_queued_cost=MAX_QUEUED_COST, max_running_cost=MAX_RUNNING_COST, max_running_seconds=SPLITTER_TIMEOUT * 2)
+		if workspace_reaper is None:
+			workspace_reaper = workspaces.Reaper([file_input_location_absolute, file_output_location_absolute], WORKSPACE_TTL, WORKSPACE_QUOTA * 1024 * 1024, WORKSPACE_GRACE, WORKSPACE_REAP_INTERVAL)
+			workspace_reaper.start()
+	return job_queue
 
 
 #========================================================
@@ -75,7 +290,16 @@ def call_pdf_splitter_subprocess(filename, splitting_mode):
 @app.route('/', methods=['GET', 'POST'])
 def upload_pdf():
 	if request.method == 'POST':
-		splitting_mode = request.form['mode'] # get the radio button selected
+		retry_after = check_rate_limit() # before the upload is read
+		if retry_after:
+			logger.warning("Client "+str(request.remote_addr)+" is over its upload rate")
+			return turn_away("You are uploading files too quickly, please wait a little before trying again.", 429, retry_after)
+		try:
+			splitting_mode = request.form['mode'] # get the radio button selected, parsing the form streams the upload to disk
+		except uploads.UploadRejected as err:
+			logger.warning("Upload rejected while streaming: "+str(err))
+			flash("This webapp only works with pdf files.")
+			return redirect(url_for('unsuccesful'))
 		logger.info("splitting mode set to"+str(splitting_mode))
 		if 'pdf' in request.files:
 			pdf_file = request.files['pdf']
@@ -83,8 +307,18 @@ def upload_pdf():
 				if pdf_file and allowed_filename(pdf_file.filename):
 					filename = secure_filename(pdf_file.filename) # make sure the filename is not dangerous		
 					if filename:
-						pdf_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename)) #only save if the filename is safe
-						return redirect(url_for('uploaded_file',filename=filename, splitting_mode=splitting_mode))
+						split_options = get_split_options(request.form)
+						upload_path = make_upload_path(filename)
+						try:
+							content_hash = save_upload(pdf_file, upload_path) #only save if the filename is safe
+						except uploads.UploadRejected:
+							logger.warning("non pdf file uploaded")
+							flash("This webapp only works with pdf files.")
+							return redirect(url_for('unsuccesful'))
+						output_filename = get_cached_result(upload_path, splitting_mode, split_options, content_hash)
+						if output_filename: # the same pdf was already split with the same settings
+							return redirect(url_for('serve_file', output_filename=output_filename))
+						return queue_upload(upload_path, splitting_mode, split_options, content_hash)
 					else:
 						logger.warning("Uploaded file did not pass secure name check")
 						flash("There seems to be something wrong with the name of the file you tried to upload.")	
@@ -104,27 +338,229 @@ def upload_pdf():
 	return render_template('upload.html') # if not a post request, show the html for submitting the file
 
 
-#process pdf, verify successful and then send it to a custom url
-@app.route('/uploads/<splitting_mode>/<filename>')
-def uploaded_file(filename, splitting_mode):
-	logger.info("sending file with mode "+str(splitting_mode))
-	
+#queue the pdf for processing and send the user to a page that waits for it
+def queue_upload(filename, splitting_mode, split_options, content_hash=None):
+	logger.info("queueing file with mode "+str(splitting_mode))
+	page_count, error = check_uploaded_pdf(filename, split_options) # bad and overlong pdfs never take a place in the queue
+	if error:
+		logger.warning("upload "+filename+" can not be split: "+error)
+		flash(error)
+		return redirect(url_for('unsuccesful'))
+
+	queue = get_job_queue()
 	try:
-		call_pdf_splitter_subprocess(filename, splitting_mode)
-	except Exception:
-		logger.error("error when calling the subprocess, showing error template")
+		job_id = submit_split(queue, filename, splitting_mode, split_options, page_count, content_hash)
+	except jobs.QueueFullError:
+		logger.warning("job queue is full, turning upload away")
+		return turn_away("The server is busy right now, please try again in a few minutes.", 503, get_retry_after(queue))
+
+	return redirect(url_for('job_status', job_id=job_id))
+
+
+#wait for the job to finish, then send the user to the output file
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+	job = get_job_queue().get(job_id)
+	if job is None:
+		abort(404)
+
+	if job.status == jobs.JOB_DONE:
+		return redirect(url_for('serve_file', output_filename=job.result))
+	if job.status == jobs.JOB_FAILED:
+		logger.error("job "+job_id+" failed, showing error template")
+		flash("Your file might be too many pages long.")
+		return redirect(url_for('unsuccesful'))
+	download_url = url_for('job_download', job_id=job_id) if STREAM_DOWNLOADS else None
+	return render_template('job_status.html', status=job.status, refresh=JOB_STATUS_REFRESH, download_url=download_url, events_url=url_for('job_events', job_id=job_id), progress=job.progress)
+
+
+#machine readable job status, for polling from javascript
+@app.route('/jobs/<job_id>/status')
+def job_status_json(job_id):
+	job = get_job_queue().get(job_id)
+	if job is None:
+		return jsonify({'job_id': job_id, 'status': 'unknown'}), 404 # the not found handler would redirect to an html page
+
+	response = {'job_id': job_id, 'status': job.status, 'progress': job.progress}
+	if job.status == jobs.JOB_DONE:
+		response['url'] = url_for('serve_file', output_filename=job.result)
+	elif job.status != jobs.JOB_FAILED and STREAM_DOWNLOADS:
+		response['download_url'] = url_for('job_download', job_id=job_id)
+	return jsonify(response)
+
+
+# yield the output of a job as the splitter writes it, pages are flushed to the partial file one at a time
+# the partial file is renamed once it is complete, the open handle keeps following it
+# only started for running jobs, so it never waits longer than a split can take
+def generate_job_output(queue, job_id, output_path):
+	partial_output_path = output_path+split_pdf.PARTIAL_OUTPUT_SUFFIX
+	deadline = time.time() + SPLITTER_TIMEOUT # never poll forever, even if the job is stuck
+	output_file = None
+	while output_file is None:
+		job = queue.get(job_id)
+		try:
+			output_file = open(partial_output_path, 'rb')
+		except IOError:
+			if job is None or job.status == jobs.JOB_FAILED or time.time() > deadline:
+				return
+			if job.status == jobs.JOB_DONE: # finished before the partial file was ever seen
+				output_file = open(output_path, 'rb')
+			else:
+				time.sleep(DOWNLOAD_POLL_INTERVAL)
+	with output_file:
+		while True:
+			chunk = output_file.read(DOWNLOAD_CHUNK_SIZE)
+			if chunk:
+				yield chunk
+				continue
+			job = queue.get(job_id)
+			if job is None or job.is_finished() or time.time() > deadline:
+				break
+			time.sleep(DOWNLOAD_POLL_INTERVAL)
+		if job is not None and job.status == jobs.JOB_DONE:
+			for chunk in iter(lambda: output_file.read(DOWNLOAD_CHUNK_SIZE), ''): # whatever was written between the last read and the end of the job
+				yield chunk
+
+
+def format_event(event, data): # a single server sent event
+	return "event: "+event+"\ndata: "+json.dumps(data)+"\n\n"
+
+# yield a progress event every time the job reports progress, then a done or failed event once it is finished
+# the stream ends after EVENT_STREAM_SECONDS so that it never holds a worker for long, EventSource reconnects on its own and gets the latest progress again
+def generate_job_events(queue, job_id):
+	deadline = time.time() + EVENT_STREAM_SECONDS
+	last_progress = None
+	while time.time() < deadline:
+		job = queue.get(job_id)
+		if job is None or job.status == jobs.JOB_FAILED:
+			yield format_event('failed', {'job_id': job_id})
+			return
+		if job.status == jobs.JOB_DONE:
+			yield format_event('done', {'job_id': job_id, 'url': url_for('serve_file', output_filename=job.result)})
+			return
+		if job.progress is not None and job.progress != last_progress:
+			last_progress = job.progress
+			yield format_event('progress', dict(job.progress, job_id=job_id, status=job.status))
+		time.sleep(PROGRESS_POLL_INTERVAL)
+
+
+#progress of a job as server sent events, the status page shows them as a progress bar
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+	queue = get_job_queue()
+	if queue.get(job_id) is None:
+		abort(404)
+	response = Response(stream_with_context(generate_job_events(queue, job_id)), mimetype='text/event-stream')
+	response.headers['Cache-Control'] = 'no-cache'
+	response.headers['X-Accel-Buffering'] = 'no' # otherwise a proxy in front of the app holds events back until the stream ends
+	return response
+
+
+#download the output while it is still being written, time to first byte does not depend on the page count
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id):
+	queue = get_job_queue()
+	job = queue.get(job_id)
+	if job is None:
+		abort(404)
+	if job.status == jobs.JOB_DONE:
+		return redirect(url_for('serve_file', output_filename=job.result))
+	if job.status == jobs.JOB_FAILED:
 		flash("Your file might be too many pages long.")
 		return redirect(url_for('unsuccesful'))
+	if not STREAM_DOWNLOADS or job.status == jobs.JOB_QUEUED: # nothing to send yet, waiting in the queue would hold a worker
+		return redirect(url_for('job_status', job_id=job_id))
+	output_filename = get_output_path(job.args[0]) # named like call_pdf_splitter's output
+	response = Response(generate_job_output(queue, job_id, file_output_location_absolute+output_filename), mimetype='application/pdf', direct_passthrough=True)
+	response.headers['Content-Disposition'] = 'attachment; filename="'+os.path.basename(output_filename)+'"'
+	return response
+
+
+#stage timing histograms and job counts, in the prometheus text format
+@app.route('/metrics')
+def metrics_endpoint():
+	return Response(get_metrics_store().render(), mimetype='text/plain; version=0.0.4')
+
+
+#split many pdfs in one request, every file becomes its own job, the answer says where to follow each of them
+@app.route('/api/batch', methods=['POST'])
+def batch_upload():
+	retry_after = check_rate_limit() # a batch counts as a single upload
+	if retry_after:
+		return jsonify({'error': 'too many uploads, please wait before trying again'}), 429, {'Retry-After': str(retry_after)}
+	try:
+		splitting_mode = request.form.get('mode', str(split_pdf.AUTO_MODE)) # parsing the form streams the uploads to disk
+	except uploads.UploadRejected as err:
+		return jsonify({'error': str(err)}), 400
+	if not splitting_mode.isdigit():
+		return jsonify({'error': 'mode must be a number'}), 400
+	pdf_files = [pdf_file for pdf_file in request.files.getlist('pdf') if pdf_file.filename]
+	if not pdf_files:
+		return jsonify({'error': 'no files uploaded'}), 400
+	queue = get_job_queue()
+	if queue.queued_count() + len(pdf_files) > MAX_QUEUED_JOBS: # all or nothing, half a batch is of no use to anyone
+		logger.warning("job queue can not take a batch of "+str(len(pdf_files))+" files, turning it away")
+		return jsonify({'error': 'the server is busy right now, please try again in a few minutes'}), 503, {'Retry-After': str(get_retry_after(queue))}
+
+	split_options = get_split_options(request.form)
+	files = []
+	job_ids = []
+	cached_outputs = []
+	for pdf_file in pdf_files:
+		filename = secure_filename(pdf_file.filename)
+		if not filename or not allowed_filename(filename):
+			files.append({'filename': pdf_file.filename, 'status': 'rejected', 'error': 'only pdf files with a safe name are split'})
+			continue
+		upload_path = make_upload_path(filename)
+		try:
+			content_hash = save_upload(pdf_file, upload_path)
+		except uploads.UploadRejected:
+			files.append({'filename': filename, 'status': 'rejected', 'error': 'this file is not a pdf'})
+			continue
+		output_filename = get_cached_result(upload_path, splitting_mode, split_options, content_hash)
+		if output_filename:
+			cached_outputs.append(output_filename)
+			files.append({'filename': filename, 'status': jobs.JOB_DONE, 'url': url_for('serve_file', output_filename=output_filename)})
+			continue
+		page_count, error = check_uploaded_pdf(upload_path, split_options)
+		if error:
+			files.append({'filename': filename, 'status': 'rejected', 'error': error})
+			continue
+		try:
+			job_id = submit_split(queue, upload_path, splitting_mode, split_options, page_count, content_hash)
+		except jobs.QueueFullError: # another upload took the room that was left
+			files.append({'filename': filename, 'status': 'rejected', 'error': 'the server is busy right now'})
+			continue
+		job_ids.append(job_id)
+		files.append({'filename': filename, 'status': jobs.JOB_QUEUED, 'job_id': job_id, 'status_url': url_for('job_status_json', job_id=job_id)})
+	return jsonify({'files': files, 'zip_url': url_for('batch_zip', jobs=','.join(job_ids), files=','.join(cached_outputs))})
+
 
-	output_filename = "new_"+filename
-	return redirect(url_for('serve_file', output_filename=output_filename))
+#every output of a batch in one zip, 202 until all of its jobs are finished
+@app.route('/api/batch/zip')
+def batch_zip():
+	output_filenames = [filename for filename in request.args.get('files', '').split(',') if is_output_path(filename)]
+	for job_id in [job_id for job_id in request.args.get('jobs', '').split(',') if job_id]:
+		job = get_job_queue().get(job_id)
+		if job is None:
+			return jsonify({'job_id': job_id, 'status': 'unknown'}), 404
+		if not job.is_finished():
+			return jsonify({'job_id': job_id, 'status': job.status}), 202
+		if job.status == jobs.JOB_DONE: # failed files are left out, their status_url says why
+			output_filenames.append(job.result)
+	output_paths = [file_output_location_absolute+filename for filename in output_filenames if os.path.isfile(file_output_location_absolute+filename)]
+	if not output_paths:
+		return jsonify({'error': 'no file of this batch was split'}), 404
+	zip_filename = "batch_"+hashlib.sha1(','.join(sorted(output_filenames))).hexdigest()+".zip"
+	partial_zip_path = file_output_location_absolute+zip_filename+"."+workspaces.new_workspace_id()+split_pdf.PARTIAL_OUTPUT_SUFFIX # the same batch can be zipped by two requests at once
+	batch.write_zip(output_paths, partial_zip_path)
+	os.rename(partial_zip_path, file_output_location_absolute+zip_filename)
+	return send_from_directory(file_output_location_absolute, zip_filename, as_attachment=True)
 
 
-#serve the file with the new name as part of the url for
-@app.route('/fixed/<output_filename>')
+#serve the file with the new name as part of the url for, output_filename is its path in its workspace
+@app.route('/fixed/<path:output_filename>')
 def serve_file(output_filename):
-	uploaded_filename = output_filename[4:]
-	ending_char_index = len(uploaded_filename) -1
 	return send_from_directory(file_output_location_absolute, output_filename) 
 
 
@@ -0,0 +1,51 @@
+## Admission control in front of the job queue: what a split costs, and per client token buckets shared by every app process
+## the job queue turns splits away once the cost of what is queued or running would go over its budget
+
+import math
+import sqlite3
+import time
+
+import split_pdf
+
+VECTOR_PAGE_COST = 0.25 # vector splits crop the pdf pages without rendering them
+
+
+def split_cost(page_count, split_options): # cost of a split in pages rendered at the default dpi, rendering grows with the square of the dpi
+	if split_options.get('vector'):
+		return page_count * VECTOR_PAGE_COST
+	dpi = split_options.get('dpi', split_pdf.RENDER_DPI)
+	return page_count * (float(dpi) / split_pdf.RENDER_DPI) ** 2
+
+
+# a token bucket per client, refilled with rate tokens a second up to burst tokens, kept in a sqlite database
+# so that a client gets the same limit whichever app process its requests land on
+class RateLimiter(object):
+	def __init__(self, database_path, rate, burst):
+		self.database_path = database_path
+		self.rate = rate
+		self.burst = burst
+		connection = self._connect()
+		try:
+			connection.execute("CREATE TABLE IF NOT EXISTS rate_limits (client TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+		finally:
+			connection.close()
+
+	def _connect(self):
+		return sqlite3.connect(self.database_path, timeout=30, isolation_level=None) # transactions are started explicitly
+
+	def acquire(self, client, tokens=1): # take tokens from the client's bucket, returns 0 if it had them, else the seconds until it will
+		now = time.time()
+		connection = self._connect()
+		try:
+			connection.execute("BEGIN IMMEDIATE") # read and update atomically across processes
+			row = connection.execute("SELECT tokens, updated_at FROM rate_limits WHERE client = ?", (client,)).fetchone()
+			available = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+			if available < tokens:
+				connection.execute("ROLLBACK")
+				return int(math.ceil((tokens - available) / self.rate))
+			connection.execute("INSERT OR REPLACE INTO rate_limits (client, tokens, updated_at) VALUES (?, ?, ?)", (client, available - tokens, now))
+			connection.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - self.burst / self.rate,)) # full again, same as not being there
+			connection.execute("COMMIT")
+		finally:
+			connection.close()
+		return 0
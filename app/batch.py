@@ -0,0 +1,115 @@
+## Split many pdfs in one run, every file goes through the same pool of warm worker processes
+
+import argparse
+import glob
+import os
+import sys
+import zipfile
+import multiprocessing
+import logging
+
+import split_pdf
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+
+class BatchResult(object):
+	def __init__(self, pdf_path, output_filename, error):
+		self.pdf_path = pdf_path
+		self.output_filename = output_filename # None if the split failed
+		self.error = error
+
+	def succeeded(self):
+		return self.output_filename is not None
+
+
+def collect_pdfs(inputs): # expand directories and glob patterns into pdf paths, in the order given, every file once
+	pdf_paths = []
+	for pattern in inputs:
+		if os.path.isdir(pattern):
+			matches = [os.path.join(pattern, filename) for filename in sorted(os.listdir(pattern)) if filename.lower().endswith('.pdf')]
+		else:
+			matches = sorted(glob.glob(pattern)) or [pattern] # a path that does not exist is reported as a failed split, not dropped silently
+		for pdf_path in matches:
+			pdf_path = os.path.abspath(pdf_path)
+			if pdf_path not in pdf_paths:
+				pdf_paths.append(pdf_path)
+	return pdf_paths
+
+def split_one(task): # pool worker: split a single pdf, failures are returned so that one bad file does not stop the batch
+	pdf_path, output_destination, splitting_mode, split_options = task
+	try:
+		output_filename = split_pdf.split_document(os.path.basename(pdf_path), os.path.dirname(pdf_path)+"/", output_destination, splitting_mode, **split_options)
+	except Exception as err:
+		logger.error("Failed to split "+pdf_path)
+		logger.error(err)
+		return BatchResult(pdf_path, None, str(err))
+	return BatchResult(pdf_path, output_filename, None)
+
+# split every pdf into output_destination, returns a BatchResult per pdf in the same order
+# split_options are split_document keyword arguments, shared by every file
+def split_batch(pdf_paths, output_destination, splitting_mode, workers=1, **split_options):
+	filenames = [os.path.basename(pdf_path) for pdf_path in pdf_paths]
+	if len(set(filenames)) < len(filenames): # outputs are named after the input file, they would overwrite each other
+		logger.error("Batch has more than one pdf with the same filename")
+		raise Exception("Batch has more than one pdf with the same filename")
+	tasks = [(pdf_path, output_destination, splitting_mode, split_options) for pdf_path in pdf_paths]
+	if workers <= 1:
+		return [split_one(task) for task in tasks]
+	pool = multiprocessing.Pool(processes=workers) # forked once for the whole batch, imports are paid for here and not per file
+	try:
+		results = pool.map(split_one, tasks, chunksize=1) # pdfs vary a lot in length, hand them out one at a time
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+	return results
+
+def write_zip(output_paths, zip_path): # put the split pdfs in a single zip, stored as they are since pdf streams are already compressed
+	zip_file = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+	try:
+		for output_path in output_paths:
+			zip_file.write(output_path, os.path.basename(output_path))
+	finally:
+		zip_file.close()
+	return zip_path
+
+def get_args(args_list):
+	parser = argparse.ArgumentParser(description='split every pdf in the given files, directories and glob patterns')
+	parser.add_argument('inputs', nargs='+', help='pdf files, directories of pdfs or glob patterns like "handouts/*.pdf"')
+	parser.add_argument('-o', '--output_location', type=str, required=True)
+	parser.add_argument('-m', '--mode', type=int, default=split_pdf.AUTO_MODE, help='splitting mode of every pdf, finds out from each first page by default')
+	parser.add_argument('-w', '--workers', type=int, default=1, help='pdfs split at the same time')
+	parser.add_argument('-z', '--zip', type=str, help='also put every split pdf in this zip file')
+	parser.add_argument('--on_disk', action='store_true', help='write pages to temporary directories like split_pdf.py does by default, instead of keeping them in memory')
+	parser.add_argument('--vector', action='store_true', help='crop the original pdf pages instead of rasterizing them, keeps text sharp')
+	parser.add_argument('--layout_cache', type=str, help='sqlite database of slide layouts found on earlier documents, shared by every worker')
+	parser.add_argument('--grid', type=split_pdf.parse_grid, help='ROWSxCOLUMNS grid of slides on every page, overrides --mode')
+	parser.add_argument('-d', '--dpi', type=int, default=split_pdf.RENDER_DPI, choices=split_pdf.ALLOWED_DPIS)
+	parser.add_argument('--image_format', type=str, default=split_pdf.pdf_writer.DEFAULT_IMAGE_FORMAT, choices=split_pdf.pdf_writer.IMAGE_FORMATS)
+	parser.add_argument('-q', '--jpeg_quality', type=int, default=split_pdf.pdf_writer.DEFAULT_JPEG_QUALITY)
+	parser.add_argument('--pages', type=split_pdf.parse_page_ranges, help='only split these pages of every pdf, like 1-3,7,10-')
+	parser.add_argument('--slides', type=split_pdf.parse_slide_indexes, help='only keep these slides of every page, like 1,3')
+	parser.add_argument('--resize_width', type=int, help='width in pixels slides are resized to, 500 at 200 dpi by default')
+	parser.add_argument('--resize_filter', type=str, default=split_pdf.DEFAULT_RESIZE_FILTER, choices=split_pdf.RESIZE_FILTERS)
+	return parser.parse_args(args_list)
+
+def main(args):
+	args = get_args(args)
+	output_destination = os.path.join(args.output_location, '') # split_document expects the trailing slash
+	pdf_paths = collect_pdfs(args.inputs)
+	results = split_batch(pdf_paths, output_destination, args.mode, args.workers, in_memory=not args.on_disk, vector=args.vector, dpi=args.dpi, layout_cache_path=args.layout_cache, grid=args.grid, image_format=args.image_format, jpeg_quality=args.jpeg_quality, pages=args.pages, slides=args.slides, resize_width=args.resize_width, resize_filter=args.resize_filter)
+	for result in results:
+		logger.info(result.pdf_path+": "+(result.output_filename if result.succeeded() else "failed, "+result.error))
+	output_paths = [output_destination+result.output_filename for result in results if result.succeeded()]
+	if args.zip and output_paths:
+		write_zip(output_paths, args.zip)
+		logger.info("Wrote "+str(len(output_paths))+" pdfs to "+args.zip)
+	if len(output_paths) < len(results):
+		logger.error(str(len(results) - len(output_paths))+" of "+str(len(results))+" pdfs failed")
+		exit(-1)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,220 @@
+import threading
+import sqlite3
+import json
+import uuid
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+STALE_JOB_ERROR = "The job was abandoned, the process running it stopped before it finished"
+PROGRESS_WRITE_INTERVAL = 0.5 # seconds between progress writes of a job, unless it moves on to another stage
+
+
+class QueueFullError(Exception): # raised when a job is submitted and there is no room left in the queue
+	pass
+
+
+class Job(object):
+	def __init__(self, job_id, args, status, result, error, created_at, finished_at, progress=None):
+		self.job_id = job_id
+		self.args = args
+		self.status = status
+		self.result = result # whatever the job function returned, only set once the job is done
+		self.error = error
+		self.created_at = created_at
+		self.finished_at = finished_at
+		self.progress = progress # last {'stage', 'done', 'total'} the job reported, None if it never did
+
+	def is_finished(self):
+		return self.status == JOB_DONE or self.status == JOB_FAILED
+
+
+# progress callback of a single job, writes what the job reports to the job database
+# it only holds the database path and the job id, so that it can be sent to the process that does the work
+class JobProgress(object):
+	def __init__(self, database_path, job_id):
+		self.database_path = database_path
+		self.job_id = job_id
+		self.last_stage = None
+		self.last_write = 0
+
+	def __call__(self, stage, done, total=None):
+		now = time.time()
+		if stage == self.last_stage and done != total and now - self.last_write < PROGRESS_WRITE_INTERVAL:
+			return # pages can be done faster than it makes sense to write them down
+		self.last_stage = stage
+		self.last_write = now
+		try:
+			connection = sqlite3.connect(self.database_path, timeout=30)
+			try:
+				with connection:
+					connection.execute("UPDATE jobs SET progress = ? WHERE job_id = ? AND status = ?", (json.dumps({'stage': stage, 'done': done, 'total': total}), self.job_id, JOB_RUNNING))
+			finally:
+				connection.close()
+		except sqlite3.Error as err: # progress is only informative, the job goes on
+			logger.warning("Failed to write the progress of job "+self.job_id+": "+str(err))
+
+
+# bounded queue of jobs kept in a sqlite database, consumed by a fixed number of worker threads
+# every app process sharing the database can submit jobs, run them and report on any of them
+# with report_progress, job functions are also given a progress_callback keyword argument, a JobProgress for their job
+# jobs can be submitted with a cost, with max_queued_cost the queue turns jobs away once the cost of what is queued or running would go over it,
+# with max_running_cost no worker of any process starts a job while it would take the cost of the running jobs over it,
+# jobs started more than max_running_seconds ago are not counted, their process is assumed to have died with them, and they are marked failed
+class JobQueue(object):
+	def __init__(self, job_function, workers, max_queued_jobs, database_path, max_finished_jobs=1000, poll_interval=0.2, report_progress=False, max_queued_cost=None, max_running_cost=None, max_running_seconds=3600):
+		self.job_function = job_function
+		self.report_progress = report_progress
+		self.max_queued_jobs = max_queued_jobs
+		self.max_queued_cost = max_queued_cost
+		self.max_running_cost = max_running_cost
+		self.max_running_seconds = max_running_seconds
+		self.database_path = database_path
+		self.max_finished_jobs = max_finished_jobs
+		self.poll_interval = poll_interval
+		self.stopped = threading.Event()
+		connection = self._connect()
+		connection.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, args TEXT, status TEXT, result TEXT, error TEXT, created_at REAL, finished_at REAL, progress TEXT, dedup_key TEXT, cost REAL, started_at REAL)")
+		for column in ["progress TEXT", "dedup_key TEXT", "cost REAL", "started_at REAL"]: # job databases created before progress was reported, jobs were deduplicated or had a cost
+			try:
+				connection.execute("ALTER TABLE jobs ADD COLUMN "+column)
+			except sqlite3.OperationalError:
+				pass # the column is already there
+		connection.execute("CREATE INDEX IF NOT EXISTS jobs_dedup_key ON jobs (dedup_key, status)")
+		connection.close()
+		self.threads = []
+		for i in range(0, workers):
+			thread = threading.Thread(target=self._work)
+			thread.daemon = True
+			thread.start()
+			self.threads.append(thread)
+
+	def stop(self): # let the worker threads finish their current job and exit
+		self.stopped.set()
+		for thread in self.threads:
+			thread.join()
+
+	def _connect(self):
+		return sqlite3.connect(self.database_path, timeout=30, isolation_level=None) # transactions are started explicitly
+
+	def submit(self, *args): # queue a job and return its id right away, raise QueueFullError if the queue is full
+		return self.submit_unique(None, *args)
+
+	# like submit, but while a job submitted with the same dedup_key is queued or running (and not stale), return its id instead of queueing another one
+	# takes a cost keyword argument, 1 by default
+	def submit_unique(self, dedup_key, *args, **options):
+		cost = options.get('cost', 1)
+		job_id = str(uuid.uuid4())
+		connection = self._connect()
+		try:
+			connection.execute("BEGIN IMMEDIATE") # look up, count and insert atomically across processes
+			self._fail_stale_jobs(connection)
+			if dedup_key is not None:
+				# never onto a stale running job, its process died and it will not finish
+				row = connection.execute("SELECT job_id FROM jobs WHERE dedup_key = ? AND (status = ? OR (status = ? AND started_at > ?)) ORDER BY created_at LIMIT 1", (dedup_key, JOB_QUEUED, JOB_RUNNING, self._stale_before())).fetchone()
+				if row is not None:
+					connection.execute("COMMIT")
+					logger.info("Job "+row[0]+" is already doing the same work")
+					return row[0]
+			if self._count(connection, JOB_QUEUED) >= self.max_queued_jobs:
+				connection.execute("ROLLBACK")
+				logger.warning("Job queue is full, rejecting job")
+				raise QueueFullError("Job queue is full")
+			outstanding_cost = self._outstanding_cost(connection)
+			if self.max_queued_cost is not None and outstanding_cost > 0 and outstanding_cost + cost > self.max_queued_cost: # a job costing more than the budget still runs alone
+				connection.execute("ROLLBACK")
+				logger.warning("Job queue is over its cost budget, rejecting job")
+				raise QueueFullError("Job queue is over its cost budget")
+			connection.execute("INSERT INTO jobs (job_id, args, status, created_at, dedup_key, cost) VALUES (?, ?, ?, ?, ?, ?)", (job_id, json.dumps(args), JOB_QUEUED, time.time(), dedup_key, cost))
+			connection.execute("COMMIT")
+		finally:
+			connection.close()
+		logger.info("Queued job "+job_id)
+		return job_id
+
+	def get(self, job_id): # return the job with the given id, None if it does not exist (or was forgotten)
+		connection = self._connect()
+		try:
+			row = connection.execute("SELECT job_id, args, status, result, error, created_at, finished_at, progress FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+		finally:
+			connection.close()
+		if row is None:
+			return None
+		return Job(row[0], tuple(json.loads(row[1])), row[2], json.loads(row[3]) if row[3] is not None else None, row[4], row[5], row[6], json.loads(row[7]) if row[7] is not None else None)
+
+	def queued_count(self):
+		connection = self._connect()
+		try:
+			return self._count(connection, JOB_QUEUED)
+		finally:
+			connection.close()
+
+	def outstanding_cost(self): # cost of the queued and running jobs
+		connection = self._connect()
+		try:
+			return self._outstanding_cost(connection)
+		finally:
+			connection.close()
+
+	def _count(self, connection, status):
+		return connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+	def _outstanding_cost(self, connection):
+		return connection.execute("SELECT TOTAL(COALESCE(cost, 1)) FROM jobs WHERE status = ? OR (status = ? AND started_at > ?)", (JOB_QUEUED, JOB_RUNNING, self._stale_before())).fetchone()[0]
+
+	def _stale_before(self): # running jobs started before this time are stale
+		return time.time() - self.max_running_seconds
+
+	def _fail_stale_jobs(self, connection): # running jobs whose process died never finish on their own, fail them so that nobody waits on them
+		stale_count = connection.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND (started_at IS NULL OR started_at <= ?)", (JOB_FAILED, STALE_JOB_ERROR, time.time(), JOB_RUNNING, self._stale_before())).rowcount
+		if stale_count:
+			logger.warning("Marked "+str(stale_count)+" stale running jobs failed")
+
+	def _claim(self, connection): # mark the oldest queued job as running and return its id and args, None if there is nothing to do
+		connection.execute("BEGIN IMMEDIATE") # so that two processes never claim the same job
+		self._fail_stale_jobs(connection)
+		row = connection.execute("SELECT job_id, args, COALESCE(cost, 1) FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)).fetchone()
+		if row is not None and self.max_running_cost is not None:
+			running_cost = connection.execute("SELECT TOTAL(COALESCE(cost, 1)) FROM jobs WHERE status = ? AND started_at > ?", (JOB_RUNNING, self._stale_before())).fetchone()[0]
+			if running_cost > 0 and running_cost + row[2] > self.max_running_cost: # the oldest job waits for room, later cheaper ones do not overtake it
+				row = None
+		if row is not None:
+			connection.execute("UPDATE jobs SET status = ?, started_at = ? WHERE job_id = ?", (JOB_RUNNING, time.time(), row[0]))
+		connection.execute("COMMIT")
+		return row
+
+	def _finish(self, connection, job_id, status, result, error):
+		connection.execute("BEGIN IMMEDIATE")
+		connection.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE job_id = ?", (status, json.dumps(result), error, time.time(), job_id))
+		# forget the oldest finished jobs so that the job table does not grow forever
+		connection.execute("DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY finished_at DESC LIMIT -1 OFFSET ?)", (JOB_DONE, JOB_FAILED, self.max_finished_jobs))
+		connection.execute("COMMIT")
+
+	def _work(self):
+		connection = self._connect()
+		while not self.stopped.is_set():
+			row = self._claim(connection)
+			if row is None:
+				self.stopped.wait(self.poll_interval)
+				continue
+			job_id = row[0]
+			logger.info("Running job "+job_id)
+			try:
+				if self.report_progress:
+					result = self.job_function(*json.loads(row[1]), progress_callback=JobProgress(self.database_path, job_id))
+				else:
+					result = self.job_function(*json.loads(row[1]))
+			except Exception as err:
+				logger.error("Job "+job_id+" failed")
+				self._finish(connection, job_id, JOB_FAILED, None, str(err))
+			else:
+				logger.info("Job "+job_id+" done")
+				self._finish(connection, job_id, JOB_DONE, result, None)
+		connection.close()
@@ -0,0 +1,55 @@
+import sqlite3
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+
+# slide rectangles found on earlier documents, most decks come from a handful of handout templates
+# a layout is only a candidate, callers check that the slides really are where it says before using it
+class LayoutCache(object):
+	def __init__(self, database_path, max_layouts=1000, max_candidates=5):
+		self.database_path = database_path
+		self.max_layouts = max_layouts
+		self.max_candidates = max_candidates
+		try:
+			connection = self._connect()
+			try:
+				connection.execute("CREATE TABLE IF NOT EXISTS layouts (page_width INTEGER, page_height INTEGER, splitting_mode INTEGER, slide_rects TEXT, fingerprint TEXT, last_used REAL, PRIMARY KEY (page_width, page_height, splitting_mode, slide_rects))")
+			finally:
+				connection.close()
+		except sqlite3.Error as err: # every later read and write fails the same way, splits just run without the cache
+			logger.warning("Failed to open the layout cache: "+str(err))
+
+	def _connect(self):
+		return sqlite3.connect(self.database_path, timeout=30)
+
+	# layouts found on pages of the same size and mode, the ones with the same fingerprint and the most recently used first
+	def candidates(self, page_size, splitting_mode, fingerprint):
+		try:
+			connection = self._connect()
+			try:
+				rows = connection.execute("SELECT slide_rects FROM layouts WHERE page_width = ? AND page_height = ? AND splitting_mode = ? ORDER BY fingerprint = ? DESC, last_used DESC LIMIT ?", (page_size[0], page_size[1], splitting_mode, fingerprint, self.max_candidates)).fetchall()
+			finally:
+				connection.close()
+		except sqlite3.Error as err: # a broken cache only costs a full detection
+			logger.warning("Failed to read the layout cache: "+str(err))
+			return []
+		return [json.loads(row[0]) for row in rows]
+
+	def add(self, page_size, splitting_mode, fingerprint, slide_rects): # remember a layout, or mark it as just used if it is already known
+		slide_rects = [[int(value) for value in rect] for rect in slide_rects] # detection returns numpy integers
+		try:
+			connection = self._connect()
+			try:
+				with connection:
+					connection.execute("INSERT OR REPLACE INTO layouts (page_width, page_height, splitting_mode, slide_rects, fingerprint, last_used) VALUES (?, ?, ?, ?, ?, ?)", (page_size[0], page_size[1], splitting_mode, json.dumps(slide_rects), fingerprint, time.time()))
+					# forget the least recently used layouts so that the table does not grow forever
+					connection.execute("DELETE FROM layouts WHERE rowid IN (SELECT rowid FROM layouts ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_layouts,))
+			finally:
+				connection.close()
+		except sqlite3.Error as err:
+			logger.warning("Failed to write the layout cache: "+str(err))
@@ -0,0 +1,87 @@
+## Stage timings of splits, and histograms of them kept in a sqlite database shared by every app process
+## rendered in the prometheus text format for /metrics
+
+import contextlib
+import resource
+import sqlite3
+import time
+
+STAGE_SECONDS_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300] # upper bounds of the stage duration histograms, the last one is the webapp's SPLITTER_TIMEOUT
+METRIC_PREFIX = 'pdf_splitter_'
+
+
+def max_rss_bytes(): # memory high-water mark of this process and of its waited for children (pdftoppm, pool workers), linux reports it in kilobytes
+	return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * 1024
+
+# time the block and append a span for it to timings, a list, nothing is appended if timings is None or the block raises
+# the block gets the span and fills in its pages and bytes once it knows them
+@contextlib.contextmanager
+def timed_stage(timings, stage, pages=None):
+	span = {'stage': stage, 'pages': pages, 'bytes': None}
+	start = time.time()
+	yield span
+	span['seconds'] = time.time() - start
+	span['max_rss_bytes'] = max_rss_bytes()
+	if timings is not None:
+		timings.append(span)
+
+def count_pages(items, span): # yield every item, counting them as the pages of the span
+	span['pages'] = 0
+	for item in items:
+		yield item
+		span['pages'] += 1
+
+
+# per stage histograms of the durations of every span recorded, with their pages, bytes and memory high-water mark
+# every method opens its own connection, so a single store can be used from any thread
+class MetricsStore(object):
+	def __init__(self, database_path, buckets=STAGE_SECONDS_BUCKETS):
+		self.database_path = database_path
+		self.buckets = buckets
+		connection = self._connect()
+		try:
+			with connection:
+				connection.execute("CREATE TABLE IF NOT EXISTS stages (stage TEXT PRIMARY KEY, count INTEGER, seconds REAL, pages INTEGER, bytes INTEGER, max_rss_bytes INTEGER)")
+				connection.execute("CREATE TABLE IF NOT EXISTS stage_buckets (stage TEXT, le REAL, count INTEGER, PRIMARY KEY (stage, le))") # cumulative, like prometheus buckets
+				connection.execute("CREATE TABLE IF NOT EXISTS jobs (status TEXT PRIMARY KEY, count INTEGER)")
+		finally:
+			connection.close()
+
+	def _connect(self):
+		return sqlite3.connect(self.database_path, timeout=30)
+
+	def record_job(self, status, timings): # count a finished job and add its spans to the histograms, in a single transaction
+		connection = self._connect()
+		try:
+			with connection:
+				connection.execute("INSERT OR IGNORE INTO jobs (status, count) VALUES (?, 0)", (status,))
+				connection.execute("UPDATE jobs SET count = count + 1 WHERE status = ?", (status,))
+				for span in timings:
+					connection.execute("INSERT OR IGNORE INTO stages (stage, count, seconds, pages, bytes, max_rss_bytes) VALUES (?, 0, 0, 0, 0, 0)", (span['stage'],))
+					connection.execute("UPDATE stages SET count = count + 1, seconds = seconds + ?, pages = pages + ?, bytes = bytes + ?, max_rss_bytes = MAX(max_rss_bytes, ?) WHERE stage = ?",
+						(span['seconds'], span['pages'] or 0, span['bytes'] or 0, span['max_rss_bytes'], span['stage']))
+					connection.executemany("INSERT OR IGNORE INTO stage_buckets (stage, le, count) VALUES (?, ?, 0)", [(span['stage'], le) for le in self.buckets])
+					connection.execute("UPDATE stage_buckets SET count = count + 1 WHERE stage = ? AND le >= ?", (span['stage'], span['seconds']))
+		finally:
+			connection.close()
+
+	def render(self): # every metric in the prometheus text exposition format
+		connection = self._connect()
+		try:
+			stages = connection.execute("SELECT stage, count, seconds, pages, bytes, max_rss_bytes FROM stages ORDER BY stage").fetchall()
+			buckets = connection.execute("SELECT stage, le, count FROM stage_buckets ORDER BY stage, le").fetchall()
+			job_counts = connection.execute("SELECT status, count FROM jobs ORDER BY status").fetchall()
+		finally:
+			connection.close()
+		lines = ["# HELP "+METRIC_PREFIX+"jobs_total Splits finished, by outcome", "# TYPE "+METRIC_PREFIX+"jobs_total counter"]
+		lines += [METRIC_PREFIX+'jobs_total{status="%s"} %d' % (status, count) for status, count in job_counts]
+		lines += ["# HELP "+METRIC_PREFIX+"stage_seconds Time spent in each stage of a split", "# TYPE "+METRIC_PREFIX+"stage_seconds histogram"]
+		for stage, count, seconds, pages, byte_count, stage_max_rss_bytes in stages:
+			lines += [METRIC_PREFIX+'stage_seconds_bucket{stage="%s",le="%g"} %d' % (stage, le, bucket_count) for bucket_stage, le, bucket_count in buckets if bucket_stage == stage]
+			lines.append(METRIC_PREFIX+'stage_seconds_bucket{stage="%s",le="+Inf"} %d' % (stage, count))
+			lines.append(METRIC_PREFIX+'stage_seconds_sum{stage="%s"} %r' % (stage, seconds))
+			lines.append(METRIC_PREFIX+'stage_seconds_count{stage="%s"} %d' % (stage, count))
+		for name, column, metric_type, description in [('stage_pages_total', 3, 'counter', 'Pages or slides handled by each stage'), ('stage_bytes_total', 4, 'counter', 'Bytes read or written by each stage'), ('stage_max_rss_bytes', 5, 'gauge', 'Highest memory high-water mark seen at the end of each stage')]:
+			lines += ["# HELP "+METRIC_PREFIX+name+" "+description, "# TYPE "+METRIC_PREFIX+name+" "+metric_type]
+			lines += [METRIC_PREFIX+name+'{stage="%s"} %d' % (row[0], row[column]) for row in stages]
+		return "\n".join(lines)+"\n"
@@ -0,0 +1,61 @@
+## Pages and slides kept on disk as binary PPM files (PGM for grayscale), which are a short header followed by the raw pixels
+## pages are read as numpy.memmap arrays, so cropping a slide out of a page is a view into the page cache, nothing is decoded or copied
+## until the slide is written
+
+import os
+import re
+import numpy
+
+PPM_CHANNELS = {'P5': 1, 'P6': 3} # magic number -> channels per pixel
+PPM_HEADER = re.compile(r'(P[56])(?:\s+|#[^\n]*\n)+(\d+)(?:\s+|#[^\n]*\n)+(\d+)(?:\s+|#[^\n]*\n)+(\d+)\s') # magic, width, height and maximum value, a single whitespace byte ends the header
+PPM_HEADER_MAX_BYTES = 512
+
+
+def read_ppm_header(path): # (width, height, channels, offset of the first pixel byte) of a PPM file
+	with open(path, 'rb') as ppm_file:
+		header = ppm_file.read(PPM_HEADER_MAX_BYTES)
+	match = PPM_HEADER.match(header)
+	if match is None:
+		raise Exception("Not a binary PPM file: "+path)
+	if int(match.group(4)) != 255:
+		raise Exception("Only 8 bit PPM files are supported: "+path)
+	return int(match.group(2)), int(match.group(3)), PPM_CHANNELS[match.group(1)], match.end()
+
+def map_ppm(path): # the pixels of a PPM file as a read only rows x columns (x channels) array backed by the file
+	width, height, channels, offset = read_ppm_header(path)
+	shape = (height, width, channels) if channels > 1 else (height, width)
+	return numpy.memmap(path, dtype=numpy.uint8, mode='r', offset=offset, shape=shape)
+
+def write_ppm(path, pixels): # write a rows x columns (x channels) uint8 array, like the ones map_ppm returns, as a PPM file
+	magic = 'P6' if pixels.ndim == 3 else 'P5'
+	with open(path, 'wb') as ppm_file:
+		ppm_file.write("%s\n%d %d\n255\n" % (magic, pixels.shape[1], pixels.shape[0]))
+		numpy.ascontiguousarray(pixels).tofile(ppm_file) # crops are views with the page's row stride, this is their only copy
+
+def gray_pixels(pixels): # rows x columns x 3 pixels to grayscale, with the same fixed point weights as PIL's convert('L')
+	if pixels.ndim == 2:
+		return pixels
+	pixels = pixels.astype(numpy.uint32)
+	return ((pixels[..., 0] * 19595 + pixels[..., 1] * 38470 + pixels[..., 2] * 7471) >> 16).astype(numpy.uint8)
+
+def crop_pixels(pixels, rect): # view of a [x, y, width, height] rectangle of the pixels, clipped to them
+	return pixels[max(rect[1], 0):rect[1] + rect[3], max(rect[0], 0):rect[0] + rect[2]]
+
+
+# the PPM files of a directory, like the pages pdf2image writes or the slides cropped out of them
+class PageStore(object):
+	def __init__(self, dir_path):
+		self.dir_path = dir_path
+
+	def filenames(self):
+		return [filename for filename in os.listdir(self.dir_path) if os.path.isfile(os.path.join(self.dir_path, filename))]
+
+	def map(self, filename):
+		return map_ppm(os.path.join(self.dir_path, filename))
+
+	def generate_pages(self, filenames): # map every file in the given order, one at a time
+		for filename in filenames:
+			yield self.map(filename)
+
+	def write(self, filename, pixels):
+		write_ppm(os.path.join(self.dir_path, filename), pixels)
@@ -0,0 +1,84 @@
+## Minimal pdf writer for split outputs, every page shows a single image
+## images are compressed once, by the process that resized them, and their bytes go straight into the file as a pdf image stream
+
+import collections
+import hashlib
+import zlib
+import StringIO
+
+IMAGE_FORMATS = ['flate', 'jpeg'] # flate is lossless like the png images reportlab used to embed, jpeg is much smaller for photos and gradients
+DEFAULT_IMAGE_FORMAT = 'flate'
+DEFAULT_JPEG_QUALITY = 85
+FLATE_LEVEL = 6 # zlib's default, higher levels take much longer for a few percent
+
+# compressed pixels of one image and what a pdf reader needs to decode them, small enough to send between processes
+EncodedImage = collections.namedtuple('EncodedImage', ['width', 'height', 'color_space', 'filter_name', 'data'])
+
+
+def encode_image(image, image_format=DEFAULT_IMAGE_FORMAT, jpeg_quality=DEFAULT_JPEG_QUALITY): # compress a PIL image for a pdf image stream
+	if image.mode not in ['RGB', 'L']:
+		image = image.convert('RGB')
+	color_space = '/DeviceGray' if image.mode == 'L' else '/DeviceRGB'
+	if image_format == 'jpeg':
+		jpeg_data = StringIO.StringIO()
+		image.save(jpeg_data, format='jpeg', quality=jpeg_quality)
+		return EncodedImage(image.size[0], image.size[1], color_space, '/DCTDecode', jpeg_data.getvalue())
+	if image_format == 'flate':
+		return EncodedImage(image.size[0], image.size[1], color_space, '/FlateDecode', zlib.compress(image.tobytes(), FLATE_LEVEL))
+	raise Exception("Unknown image format "+str(image_format))
+
+
+# writes a pdf one object at a time, pages are written as soon as they are added and only the page tree is kept until close
+# identical images (blank slides, repeated title slides) are written once and shared by every page that shows them
+class PdfWriter(object):
+	def __init__(self, output_file, page_size):
+		self.output_file = output_file
+		self.page_size = page_size
+		self.offsets = [None] # byte offset of every object, by object number, object 0 is not a real object
+		self.page_ids = []
+		self.image_ids = {} # sha1 of the compressed image data, to the object number of its image stream
+		self.output_file.write("%PDF-1.4\n%\xe2\xe3\xcf\xd3\n") # binary comment, tells transfer programs the file is not text
+		self.pages_id = self._reserve() # every page points to the page tree, which is only written once all pages are known
+
+	def _reserve(self): # pick the number of an object that is written later
+		self.offsets.append(None)
+		return len(self.offsets) - 1
+
+	def _write_object(self, object_id, body):
+		self.offsets[object_id] = self.output_file.tell()
+		self.output_file.write("%d 0 obj\n%s\nendobj\n" % (object_id, body))
+
+	def _write_stream(self, object_id, dictionary, data):
+		self._write_object(object_id, "<< %s /Length %d >>\nstream\n%s\nendstream" % (dictionary, len(data), data))
+
+	def _add_image(self, encoded_image):
+		digest = hashlib.sha1(encoded_image.data).digest()
+		image_id = self.image_ids.get(digest)
+		if image_id is None:
+			image_id = self._reserve()
+			dictionary = "/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 /Filter %s" % (encoded_image.width, encoded_image.height, encoded_image.color_space, encoded_image.filter_name)
+			self._write_stream(image_id, dictionary, encoded_image.data)
+			self.image_ids[digest] = image_id
+		return image_id
+
+	def add_image_page(self, encoded_image, x, y, width): # a page showing the image with its lower left corner at x, y points, scaled to width points
+		image_id = self._add_image(encoded_image)
+		height = width * encoded_image.height / float(encoded_image.width)
+		contents = "q %.4f 0 0 %.4f %.4f %.4f cm /Im0 Do Q" % (width, height, x, y)
+		contents_id = self._reserve()
+		self._write_stream(contents_id, "", contents)
+		page_id = self._reserve()
+		self._write_object(page_id, "<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>" % (self.pages_id, self.page_size[0], self.page_size[1], image_id, contents_id))
+		self.page_ids.append(page_id)
+
+	def page_count(self):
+		return len(self.page_ids)
+
+	def close(self): # write the page tree, the catalog and the cross reference table, the output file is left open
+		self._write_object(self.pages_id, "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join("%d 0 R" % page_id for page_id in self.page_ids), len(self.page_ids)))
+		catalog_id = self._reserve()
+		self._write_object(catalog_id, "<< /Type /Catalog /Pages %d 0 R >>" % self.pages_id)
+		xref_offset = self.output_file.tell()
+		self.output_file.write("xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+		self.output_file.write("".join("%010d 00000 n \n" % offset for offset in self.offsets[1:]))
+		self.output_file.write("trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(self.offsets), catalog_id, xref_offset))
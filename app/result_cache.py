@@ -0,0 +1,87 @@
+import threading
+import hashlib
+import json
+import uuid
+import shutil
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+HASH_CHUNK_SIZE = 1024 * 1024 # bytes read at a time when hashing uploads
+
+
+def hash_file(file_path): # sha256 of a file's contents, read in chunks so big uploads are never fully in memory
+	content_hash = hashlib.sha256()
+	with open(file_path, 'rb') as input_file:
+		for chunk in iter(lambda: input_file.read(HASH_CHUNK_SIZE), b''):
+			content_hash.update(chunk)
+	return content_hash.hexdigest()
+
+
+def make_key(content_hash, splitting_mode, split_options): # same pdf bytes, mode and options always give the same output
+	key_fields = json.dumps([content_hash, int(splitting_mode), split_options or {}], sort_keys=True)
+	return hashlib.sha256(key_fields.encode('utf-8')).hexdigest()
+
+
+# split outputs kept on disk, one file per key, the least recently used ones are deleted once the cache grows past max_size bytes
+# the modification time of an entry is its last use, so every app process sharing the directory agrees on what to evict
+class ResultCache(object):
+	def __init__(self, cache_dir, max_size):
+		self.cache_dir = cache_dir
+		self.max_size = max_size
+		self.hits = 0 # counted per app process
+		self.misses = 0
+		self.lock = threading.Lock()
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+
+	def _path(self, key):
+		return os.path.join(self.cache_dir, key + ".pdf")
+
+	def get(self, key, destination_path): # copy the cached output for key to destination_path, returns False if there is none
+		entry_path = self._path(key)
+		try:
+			shutil.copyfile(entry_path, destination_path)
+			os.utime(entry_path, None) # mark as recently used
+		except (IOError, OSError):
+			with self.lock:
+				self.misses += 1
+			return False
+		with self.lock:
+			self.hits += 1
+		return True
+
+	def put(self, key, source_path): # keep a copy of source_path as the output for key
+		entry_path = self._path(key)
+		temp_path = entry_path + "." + str(uuid.uuid4()) + ".tmp"
+		shutil.copyfile(source_path, temp_path)
+		os.rename(temp_path, entry_path) # atomic, other processes never see a half written entry
+		self._evict()
+
+	def _evict(self):
+		entries = []
+		for filename in os.listdir(self.cache_dir):
+			if not filename.endswith(".pdf"):
+				continue
+			try:
+				entry_stat = os.stat(os.path.join(self.cache_dir, filename))
+			except OSError: # evicted by another process in the meantime
+				continue
+			entries.append((entry_stat.st_mtime, entry_stat.st_size, filename))
+		cache_size = sum(entry[1] for entry in entries)
+		for mtime, size, filename in sorted(entries): # oldest use first
+			if cache_size <= self.max_size:
+				break
+			try:
+				os.remove(os.path.join(self.cache_dir, filename))
+			except OSError:
+				pass
+			cache_size -= size
+			logger.info("Evicted "+filename+" from the result cache")
+
+	def stats(self):
+		with self.lock:
+			return {'hits': self.hits, 'misses': self.misses}
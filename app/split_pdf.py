@@ -6,8 +6,8 @@ from PIL import Image, ImageDraw
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus.flowables import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.generic import RectangleObject
 from backports import tempfile
 import systemd
 import StringIO
@@ -16,42 +16,73 @@ import numpy
 import sys
 import os
 import shutil
+import copy
+import collections
+import itertools
+import multiprocessing
+import subprocess
+import re
+import math
+import binascii
 import logging
 import argparse
+import layout_cache
+import pdf_writer
+import metrics
+import page_store
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
-
-def find_box_using_opencv(image, min_width, min_height, max_width, max_height, debug):	#find a slide/box in an image (should only pass images that contain a single slide)
-	lower_bound_pixel = 0 #values used in colour thresholding
-	upper_bound_pixel = 5
-	opencv_image = numpy.array(image) # convert to open cv image
-
-	#open cv tings start
-	grayscale_img = cv2.cvtColor(opencv_image, cv2.COLOR_RGB2GRAY)
-
-	mask = cv2.inRange(grayscale_img, lower_bound_pixel,upper_bound_pixel) #find black elements (assuming black boxes)
-	contours = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]#find contours in mask
-
-	if len(contours) > 0:
-		slide_coords = max(contours, key = cv2.contourArea) #get the biggest contour
-		if len(slide_coords) == 4: #ensure precisely 4 coords, slides are squares
-
-				if debug:
-					cv2.drawContours(opencv_image, slide_coords, -1, (0,255,0), 3)
-					cv2.imwrite("contour.png", opencv_image)
-
-				slide_found_width = (slide_coords[2][0])[0] - (slide_coords[0][0])[0] #get width and heihgt
-				slide_found_height = (slide_coords[2][0])[1] - (slide_coords[0][0])[1]
-
-				#ensure found width and height is between allowed bounds
-				if(slide_found_width > min_width and slide_found_width < max_width and 
-					slide_found_height > min_height and slide_found_height < max_height):
-					return slide_coords
-	else:
+RENDER_DPI = 200 # dpi pages are rendered at unless the user picks another one
+ALLOWED_DPIS = [100, 150, 200, 300]
+DETECTION_DPI = 100 # the first page is rendered at this dpi to find the slides, only their black borders need to show
+REFERENCE_PAGE_LENGTH = 2200 # long side of a letter page rendered at 200 dpi, the slide bounds in pixels were picked for it
+LETTER_ASPECT_RATIO = 8.5 / 11
+BLACK_PIXEL_MAX = 5 # greys up to this value count as the black border of a slide
+FINGERPRINT_SIZE = 16 # rows and columns sampled to fingerprint a page, and cells each of them is reduced to
+RASTER_WINDOW_PAGES = 4 # pages rendered per pdftoppm call when streaming, and checked together for moved slides
+GRID_MIN_SLIDE_FRACTION = 0.25 # smallest slide, as a fraction of its grid cell, that grid detection accepts
+AUTO_MODE = 4 # splitting mode that picks one of the others by looking at the first page
+AUTO_LAYOUTS = [((3, 2), 2), ((2, 2), 0), ((2, 1), 3)] # (rows, columns) of each layout auto mode tells apart, most slides first, and the mode that splits it, 6 slides are read row by row
+AUTO_SLIDE_SIZE_TOLERANCE = 0.1 # slides of one layout are the same size, give or take this fraction
+
+def get_black_mask(image): # mask that is white wherever the image is black, like the slide borders
+	grayscale_img = cv2.cvtColor(numpy.asarray(image), cv2.COLOR_RGB2GRAY)
+	return cv2.inRange(grayscale_img, 0, BLACK_PIXEL_MAX)
+
+# [x, y, width, height] of every 4 point contour whose size is inside the bounds, largest first
+# the bounding rects and areas of all contours are computed once, as numpy arrays, and filtered together
+def select_slide_rects(contours, min_width, min_height, max_width, max_height):
+	box_contours = [contour for contour in contours if len(contour) == 4] # slides are rectangles, anything with more corners is not a slide
+	if len(box_contours) == 0:
+		return numpy.zeros((0, 4), dtype=int)
+	corners = numpy.array(box_contours).reshape(-1, 4, 2)
+	top_left = corners.min(axis=1)
+	sizes = corners.max(axis=1) - top_left
+	in_bounds = (sizes[:, 0] > min_width) & (sizes[:, 0] < max_width) & (sizes[:, 1] > min_height) & (sizes[:, 1] < max_height)
+	slide_rects = numpy.column_stack([top_left, sizes])[in_bounds]
+	return slide_rects[numpy.argsort(-(slide_rects[:, 2] * slide_rects[:, 3]), kind='mergesort')]
+
+def find_slide_candidates(image, min_width, min_height, max_width, max_height): # every black box in the image that could be a slide, largest first
+	contours = cv2.findContours(get_black_mask(image), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2] # find contours in mask
+	return select_slide_rects(contours, min_width, min_height, max_width, max_height)
+
+def find_slides_inside(slide_rects, area): # the slide rectangles that lie completely inside area, a (left, upper, right, lower) box
+	inside = (slide_rects[:, 0] >= area[0]) & (slide_rects[:, 1] >= area[1]) & (slide_rects[:, 0] + slide_rects[:, 2] < area[2]) & (slide_rects[:, 1] + slide_rects[:, 3] < area[3])
+	return slide_rects[inside]
+
+def find_box_using_opencv(image, min_width, min_height, max_width, max_height, debug):	#find a slide/box in an image (should only pass images that contain a single slide), returns its [x, y, width, height]
+	slide_rects = find_slide_candidates(image, min_width, min_height, max_width, max_height)
+	if len(slide_rects) == 0:
 		return None
+	x, y, width, height = slide_rects[0].tolist() # the biggest box
+	if debug:
+		opencv_image = numpy.array(image)
+		cv2.rectangle(opencv_image, (x, y), (x + width, y + height), (0,255,0), 3)
+		cv2.imwrite("contour.png", opencv_image)
+	return [x, y, width, height]
 
 #used when finding 4 slides
 def find_upper_left_slide(image, pdf_name, min_width, min_height, max_width, max_height):	#use the upper left quarter of an image to find the coordinates of a single slide/box
@@ -69,64 +100,12 @@ def find_upper_left_slide(image, pdf_name, min_width, min_height, max_width, max
 		return slide_box_coordinates
 
 
-#return the three biggest 4-point contours given a list of contours
-def get_three_largest_contours(contours):
-	
-	three_largest_contours = []
-	indexes_with_more_than_four_points = []
-
-	# get the indexes of contours with more than 4 points, since they are not slides! 
-	for i in range(0,len(contours)-1):
-		if len(contours[i]) > 4:
-			indexes_with_more_than_four_points.append(i)
-
-
-	#delete the indexes of the contours
-	for index in indexes_with_more_than_four_points:
-		if index < len(contours):
-			del contours[index]
-
-	#sort the remaining list by area and append the first three contours
-	sorted_contours = sorted(contours, key=lambda x: cv2.contourArea(x))
-	three_largest_contours.append(sorted_contours[0])
-	three_largest_contours.append(sorted_contours[1])
-	three_largest_contours.append(sorted_contours[2])	
-
-	return three_largest_contours
-
-
-#return the contour coordinates of all 3 slides in the left half of the image
+#return the rectangles of all 3 slides in the left half of the image, the biggest one first
 def find_left_slides_using_opencv(image, min_width, min_height, max_width, max_height):
-	
-	lower_bound_pixel = 0 #values used in colour thresholding
-	upper_bound_pixel = 5
-	opencv_image = numpy.array(image) # convert to open cv image
-	second_image = opencv_image.copy()
-
-	min_slide_area = min_width * min_height
-	max_slide_area = max_width * max_height
-
-	#open cv tings start
-	grayscale_img = cv2.cvtColor(opencv_image, cv2.COLOR_RGB2GRAY)
-
-	mask = cv2.inRange(grayscale_img, lower_bound_pixel,upper_bound_pixel) #find black elements (assuming black boxes)
-	contours = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]#find contours in mask
-
-	if len(contours) > 2: #make sure at least 3 contours were found in the image
-		three_largest_contours = get_three_largest_contours(contours)  #get the three largest contours
-		
-
-		#check that the returned contours are inside the allowed bounds UGLY HACK
-		slides_inside_bounds = (cv2.contourArea(three_largest_contours[0]) > min_slide_area and cv2.contourArea(three_largest_contours[0]) < max_slide_area)
-		slides_inside_bounds = slides_inside_bounds and (cv2.contourArea(three_largest_contours[1]) > min_slide_area and cv2.contourArea(three_largest_contours[1]) < max_slide_area)
-		slides_inside_bounds = slides_inside_bounds and (cv2.contourArea(three_largest_contours[2]) > min_slide_area and cv2.contourArea(three_largest_contours[2]) < max_slide_area)
-		
-		if slides_inside_bounds:
-			return three_largest_contours
-		else:
-			return None
-	else:
-		return None #return empty list
+	slide_rects = find_slide_candidates(image, min_width, min_height, max_width, max_height)
+	if len(slide_rects) < 3: #make sure at least 3 slides were found in the image
+		return None
+	return slide_rects[:3].tolist()
 
 
 #used when finding 6 slides total, returns the coordinates of all slides in the left half of the image
@@ -137,25 +116,51 @@ def find_left_slides(image, pdf_name, min_width, min_height, max_width, max_heig
 	return left_slide_coordinates
 
 
-
-
-
-def calculate_all_slides_coords(upper_left_coords, pdf_size): #calculate one pair of coordinates for all boxes AND width and height of each box
+# find every slide of a rows x columns grid in a single pass over the page, returns their rectangles row by row
+def find_grid_slide_rects(reference_img, pdf_name, rows, columns):
+	cell_width = reference_img.size[0] / columns
+	cell_height = reference_img.size[1] / rows
+	slide_count = rows * columns
+	slide_rects = find_slide_candidates(reference_img, cell_width * GRID_MIN_SLIDE_FRACTION, cell_height * GRID_MIN_SLIDE_FRACTION, cell_width, cell_height)[:slide_count] # no slide is bigger than its cell
+	if len(slide_rects) < slide_count:
+		logger.error("Failed to find "+str(slide_count)+" slides in "+pdf_name)
+		raise Exception("Failed to find "+str(slide_count)+" slides in "+pdf_name)
+	grid_rows = slide_rects[numpy.argsort(slide_rects[:, 1], kind='mergesort')].reshape(rows, columns, 4) # top to bottom, then each row left to right
+	return numpy.concatenate([grid_row[numpy.argsort(grid_row[:, 0], kind='mergesort')] for grid_row in grid_rows]).tolist()
+
+# pick the splitting mode of a page from the grid its slides are laid out in, contours are only searched for once, whatever the dpi of the page
+# a layout matches when its grid cells hold as many equally sized boxes as it has slides, layouts with more slides are tried first
+def classify_layout(reference_img, pdf_name):
+	page_width, page_height = reference_img.size
+	smallest_cell = (page_width / max(columns for (rows, columns), mode in AUTO_LAYOUTS), page_height / max(rows for (rows, columns), mode in AUTO_LAYOUTS))
+	candidates = find_slide_candidates(reference_img, smallest_cell[0] * GRID_MIN_SLIDE_FRACTION, smallest_cell[1] * GRID_MIN_SLIDE_FRACTION, page_width, page_height)
+	for (rows, columns), splitting_mode in AUTO_LAYOUTS:
+		cell_width = page_width / columns
+		cell_height = page_height / rows
+		fits_cell = (candidates[:, 2] >= cell_width * GRID_MIN_SLIDE_FRACTION) & (candidates[:, 2] <= cell_width) & (candidates[:, 3] >= cell_height * GRID_MIN_SLIDE_FRACTION) & (candidates[:, 3] <= cell_height)
+		slide_rects = candidates[fits_cell][:rows * columns]
+		if len(slide_rects) == rows * columns and (slide_rects[:, 2:].min(axis=0) >= slide_rects[:, 2:].max(axis=0) * (1 - AUTO_SLIDE_SIZE_TOLERANCE)).all():
+			logger.info("Found "+str(rows * columns)+" slides per page in "+pdf_name+", using mode "+str(splitting_mode))
+			return splitting_mode
+	logger.error("Failed to recognize the slide layout of "+pdf_name)
+	raise Exception("Failed to recognize the slide layout of "+pdf_name)
+
+
+def calculate_all_slides_coords(upper_left_rect, pdf_size): #calculate one pair of coordinates for all boxes AND width and height of each box
 
 	quadrant_size = (pdf_size[0]/2, pdf_size[1]/2)	
-	box_width = upper_left_coords[2][0][0] - upper_left_coords[0][0][0]
-	box_height = upper_left_coords[2][0][1] - upper_left_coords[0][0][1]
+	box_width = upper_left_rect[2]
+	box_height = upper_left_rect[3]
 
 	#first get measurements relative to the distance of the found box and the edges of the quadrants
-	left_x_distance = upper_left_coords[0][0][0]#(x coordinate of left edge)
-	right_x_distance = quadrant_size[0] - upper_left_coords[2][0][0]# difference between x corordinate of right edge and edge of quadrant
+	right_x_distance = quadrant_size[0] - (upper_left_rect[0] + box_width)# difference between x corordinate of right edge and edge of quadrant
 
-	y_top_distance = upper_left_coords[0][0][1]# distance from top of box to upper edge of quadrant
-	y_lower_distance = quadrant_size[1] - upper_left_coords[2][0][1] # difference between y coordinate of lower edge and the height of the quadrany
+	y_top_distance = upper_left_rect[1]# distance from top of box to upper edge of quadrant
+	y_lower_distance = quadrant_size[1] - (upper_left_rect[1] + box_height) # difference between y coordinate of lower edge and the height of the quadrany
 
 	# coordinates of upper left box
-	upper_left_quadrant_x = upper_left_coords[0][0][0] #upper left box first
-	upper_left_quadrant_y = upper_left_coords[0][0][1]
+	upper_left_quadrant_x = upper_left_rect[0] #upper left box first
+	upper_left_quadrant_y = upper_left_rect[1]
 	
 	boxes_coords = [[upper_left_quadrant_x, upper_left_quadrant_y]] # add upper left box
 
@@ -177,57 +182,36 @@ def calculate_all_slides_coords(upper_left_coords, pdf_size): #calculate one pai
 	return boxes_coords, (box_width, box_height)
 
 
-#calculate the rest of the coordinates using the coordinates already acquired
-def calculate_remaining_slides_coordinates(left_half_slides_coords, pdf_size):
-
-	left_boxes_coords = None # stores the top left corner of all 6 slides in the document
-	right_boxes_coords = None
+#calculate the rest of the coordinates using the rectangles already acquired, the biggest one sets the size of every slide
+def calculate_remaining_slides_coordinates(left_half_slide_rects, pdf_size):
 
 	quadrant_size = (pdf_size[0]/2, pdf_size[1])
 
 	#calculate the width and height for all slides
-	box_width = left_half_slides_coords[0][3][0][0] - left_half_slides_coords[0][0][0][0]
-	box_height = left_half_slides_coords[0][2][0][1] - left_half_slides_coords[0][0][0][1]
+	box_width = left_half_slide_rects[0][2]
+	box_height = left_half_slide_rects[0][3]
 
 	#calculate the distance from each slide to right borders of the document
-	box_distance_right_border = quadrant_size[0] - left_half_slides_coords[0][3][0][0]
-
+	box_distance_right_border = quadrant_size[0] - (left_half_slide_rects[0][0] + box_width)
 
 	#first dump all top left coords of the 3 slides that have been found already
-	left_boxes_coords = [[ left_half_slides_coords[0][0][0][0], left_half_slides_coords[0][0][0][1]]]
-	left_boxes_coords.insert(1, [left_half_slides_coords[1][0][0][0], left_half_slides_coords[1][0][0][1]])
-	left_boxes_coords.insert(2, [left_half_slides_coords[2][0][0][0], left_half_slides_coords[2][0][0][1]])
-
-
 	#sort coordinates in ascending order depending on their y coordinate! ; very important
-	left_boxes_coords = sorted(left_boxes_coords,key=lambda l:l[1])
+	left_boxes_coords = sorted([[rect[0], rect[1]] for rect in left_half_slide_rects], key=lambda l:l[1])
 
-	
-	#now calculate the coordinates on the other half of the image
-
-	#first top right slide, only need to calculate the x once!
-	
-	#top_right_slide_x = left_boxes_coords[0][0] + box_width +(2 * box_distance_right_border) 
+	#now calculate the coordinates on the other half of the image, only need to calculate the x once!
 	top_right_slide_x = pdf_size[0]/2 + box_distance_right_border
-	top_right_slide_y = left_boxes_coords[0][1]
-	right_boxes_coords = [[top_right_slide_x, top_right_slide_y]]
-
-	#middle right slide
-	middle_right_slide_y = left_boxes_coords[1][1]
-	right_boxes_coords.insert(1, [top_right_slide_x, middle_right_slide_y])
-
-	#bottom right slide
-	bottom_right_slide_y = left_boxes_coords[2][1]
-	right_boxes_coords.insert(2, [top_right_slide_x, bottom_right_slide_y])	
+	right_boxes_coords = [[top_right_slide_x, left_box_coords[1]] for left_box_coords in left_boxes_coords]
 
 	return left_boxes_coords, right_boxes_coords, (box_width, box_height)
 
 
-def extract_images_from_pdf(pdf_file_path, dir_path):	# use the pdf2image library to convert every page in the pdf to an image
+def extract_images_from_pdf(pdf_file_path, dir_path, dpi=RENDER_DPI, page_ranges=None):	# use the pdf2image library to convert every page in the pdf (or in page_ranges) to an image
 	try:
-		images = convert_from_path(pdf_file_path, output_folder=dir_path)
+		images = []
+		for first_page, last_page in page_ranges or [(None, None)]: # pdftoppm names the files after their page numbers, so they still sort in document order
+			images += convert_from_path(pdf_file_path, dpi=dpi, output_folder=dir_path, first_page=first_page, last_page=last_page)
 	except Exception as err:
-		logger.error("exceptio is "+err)
+		logger.error("exception is "+str(err))
 		logger.error("Error on pdf \""+pdf_file_path+"\",pdf2 img failed to convert pdf to images") #catch exception
 		raise Exception("Error on pdf \""+pdf_file_path+"\",pdf2 img failed to convert pdf to images")
 	return images
@@ -235,15 +219,14 @@ def extract_images_from_pdf(pdf_file_path, dir_path):	# use the pdf2image librar
 
 def verify_slide(pdf_image,slide_coords,slide_size, slide_number): #verify the pixels found with open cv and ensure these have black pixels at coordinates
 
-	opencv_image = numpy.array(pdf_image) # convert to open cv image
-	grayscale_img = cv2.cvtColor(opencv_image, cv2.COLOR_RGB2GRAY)
 	correct_coords = [False, False, False, False] #represents if the coords of each slide truly represent its location
 
 	#check that all coordinates have a black pixel in the image
 	#black pixel means that the black edge of a slide is at the coordinates
+	#only these pixels are converted to grayscale, a mapped page is read in place
 	for i in range(0,slide_number):
-		if(grayscale_img.item(slide_coords[i][1],slide_coords[i][0]) == 0) :   #check left top corner
-			if(grayscale_img.item((slide_coords[i][1] + slide_size[1]) -1,(slide_coords[i][0] + slide_size[0] -1 )) == 0):
+		if pixel_is_black(pdf_image, slide_coords[i][0], slide_coords[i][1]):   #check left top corner
+			if pixel_is_black(pdf_image, slide_coords[i][0] + slide_size[0] - 1, slide_coords[i][1] + slide_size[1] - 1):
 				correct_coords[i] = True
 
 
@@ -261,63 +244,256 @@ def verify_slide(pdf_image,slide_coords,slide_size, slide_number): #verify the p
 		return correct_coords
 
 
-	
-def crop_images(images_dir, cropped_imgs_dir_dst, coords, size):  # crop all images once the coordinates are known, crop only the "individual slides"
-	assert len(list_files_in_dir(images_dir)) > 0
+def get_page_size(page_img): # (width, height) of a PIL page, or of a page mapped by page_store
+	if isinstance(page_img, numpy.ndarray):
+		return (page_img.shape[1], page_img.shape[0])
+	return page_img.size
+
+def crop_gray(page_img, box): # a (left, upper, right, lower) box of a PIL page, or of a page mapped by page_store, as a grayscale array
+	if isinstance(page_img, numpy.ndarray):
+		return page_store.gray_pixels(page_img[box[1]:box[3], box[0]:box[2]])
+	return numpy.asarray(page_img.crop(box).convert('L'))
+
+def as_pil_image(page_img): # slide detection works on PIL images, mapped pages are copied into one
+	if isinstance(page_img, numpy.ndarray):
+		return PIL.Image.fromarray(numpy.asarray(page_img))
+	return page_img
+
+def pixel_is_black(page_img, x, y):
+	return crop_gray(page_img, (x, y, x + 1, y + 1))[0, 0] == 0
+
+def get_edge_boxes(slide_rect, tolerance): # (left, upper, right, lower) strips around the 4 edges of a slide, without the corners, tolerance pixels to each side of the edge
+	x, y, width, height = slide_rect
+	return [(x + tolerance, y - tolerance, x + width - tolerance + 1, y + tolerance + 1), (x + tolerance, y + height - tolerance, x + width - tolerance + 1, y + height + tolerance + 1), # top and bottom edges
+		(x - tolerance, y + tolerance, x + tolerance + 1, y + height - tolerance + 1), (x + width - tolerance, y + tolerance, x + width + tolerance + 1, y + height - tolerance + 1)] # left and right edges
+
+def edges_are_black(page_imgs, box): # for every page, whether the slide edge inside box is black, box is a (left, upper, right, lower) strip and the edge runs along its longer side
+	strips = numpy.stack([crop_gray(page_img, box) for page_img in page_imgs]) # pages x strip rows x strip columns
+	if strips.shape[1] > strips.shape[2]:
+		strips = strips.transpose(0, 2, 1)
+	return (strips.min(axis=1) <= BLACK_PIXEL_MAX).all(axis=1) # every pixel along the edge is black, give or take tolerance pixels across it
+
+# check that every slide rectangle is drawn in black on each page of a window, returns one boolean per page
+# only the pixels around the rectangle edges are looked at, pages that are not as large as the first one fail
+def verify_pages(page_imgs, slide_rects, tolerance=1):
+	page_width, page_height = get_page_size(page_imgs[0])
+	valid_pages = numpy.array([get_page_size(page_img) == (page_width, page_height) for page_img in page_imgs])
+	for slide_rect in slide_rects:
+		x, y, width, height = slide_rect
+		if x < 0 or y < 0 or x + width >= page_width or y + height >= page_height:
+			return numpy.zeros(len(page_imgs), dtype=bool)
+		for left, upper, right, lower in get_edge_boxes(slide_rect, tolerance):
+			if not valid_pages.any():
+				return valid_pages
+			valid_pages &= edges_are_black(page_imgs, (max(left, 0), max(upper, 0), min(right, page_width), min(lower, page_height)))
+	return valid_pages
+
+def verify_slide_rects(page_img, slide_rects, tolerance=1): # check that every slide rectangle is drawn in black on a single page
+	return bool(verify_pages([page_img], slide_rects, tolerance)[0])
+
+def get_drawn_slide_rects(page_img, slide_rects): # the slide rectangles whose borders really are on the page, the lower slide of 2 slide mode only copies the upper one's size
+	return [rect for rect in slide_rects if verify_slide_rects(page_img, [rect])]
+
+# black pixels on a few evenly spaced rows and columns of the page, in coarse cells, pages of the same handout template usually share them
+def get_layout_fingerprint(page_img):
+	scan_rows = numpy.asarray(page_img.resize((page_img.size[0], FINGERPRINT_SIZE), PIL.Image.NEAREST).convert('L')) <= BLACK_PIXEL_MAX
+	scan_columns = numpy.asarray(page_img.resize((FINGERPRINT_SIZE, page_img.size[1]), PIL.Image.NEAREST).convert('L')).T <= BLACK_PIXEL_MAX
+	cells = []
+	for scan_lines in [scan_rows, scan_columns]:
+		cell_length = scan_lines.shape[1] / FINGERPRINT_SIZE
+		cells.append(scan_lines[:, :cell_length * FINGERPRINT_SIZE].reshape(FINGERPRINT_SIZE, FINGERPRINT_SIZE, cell_length).any(axis=2))
+	return binascii.hexlify(numpy.packbits(numpy.concatenate(cells)).tostring())
+
+def slide_rects_from_coords(coords, size): # turn a list of top left corners plus a shared slide size into [x, y, width, height] rectangles
+	return [[coord[0], coord[1], size[0], size[1]] for coord in coords]
+
+# progress_callback(stage, done, total) is called as the split goes, stages come in this order, in memory and vector splits skip the ones they do not have
+# total is what the stage has to get through (pages, or slides once pages are cropped), None if it is not known
+PROGRESS_STAGES = ['rasterize', 'detect', 'crop', 'resize', 'render']
+
+def report_progress(progress_callback, stage, done, total=None): # tell the caller how far the split is, stage is one of PROGRESS_STAGES
+	if progress_callback is None:
+		return
+	try:
+		progress_callback(stage, done, total)
+	except Exception as err: # progress is only informative, never fail a split over it
+		logger.warning("Progress callback failed: "+str(err))
+
+def generate_with_progress(items, progress_callback, stage, total=None): # yield every item, reporting each one once the consumer is done with it
+	done = 0
+	for item in items:
+		yield item
+		done += 1
+		report_progress(progress_callback, stage, done, total)
+
+# page ranges are (first, last) tuples, 1 based and inclusive, a last page of None runs to the end of the document
+# slide indexes are 1 based and count the slides of a page in the order the splitting mode puts them in the output
+def merge_page_ranges(page_ranges): # sorted page ranges without overlaps, ranges that overlap or touch are merged
+	merged_ranges = []
+	for first_page, last_page in sorted(page_ranges):
+		if merged_ranges and (merged_ranges[-1][1] is None or first_page <= merged_ranges[-1][1] + 1):
+			previous_first_page, previous_last_page = merged_ranges[-1]
+			merged_ranges[-1] = (previous_first_page, None if previous_last_page is None or last_page is None else max(previous_last_page, last_page))
+		else:
+			merged_ranges.append((first_page, last_page))
+	return merged_ranges
+
+def parse_page_ranges(pages): # "1-3,7,10-" from the command line or the upload form, as merged page ranges
+	page_ranges = []
+	try:
+		for part in pages.replace(' ', '').split(','):
+			first_page, separator, last_page = part.partition('-')
+			first_page = int(first_page)
+			last_page = first_page if not separator else (int(last_page) if last_page else None)
+			if first_page < 1 or (last_page is not None and last_page < first_page):
+				raise ValueError(part)
+			page_ranges.append((first_page, last_page))
+	except ValueError:
+		raise argparse.ArgumentTypeError("pages must look like 1-3,7,10- (first page is 1, 10- runs to the last page)")
+	return merge_page_ranges(page_ranges)
+
+def parse_slide_indexes(slides): # "1,3" from the command line or the upload form, as sorted slide indexes
+	try:
+		slide_indexes = sorted(set(int(index) for index in slides.replace(' ', '').split(',')))
+	except ValueError:
+		raise argparse.ArgumentTypeError("slides must look like 1,3 (first slide of a page is 1)")
+	if slide_indexes[0] < 1:
+		raise argparse.ArgumentTypeError("slides must look like 1,3 (first slide of a page is 1)")
+	return slide_indexes
+
+def resolve_page_ranges(page_ranges, page_count): # the page ranges clamped to a document of page_count pages, every page if page_ranges is None
+	if page_ranges is None:
+		return [(1, page_count)] if page_count > 0 else []
+	return [(first_page, page_count if last_page is None else min(last_page, page_count)) for first_page, last_page in page_ranges if first_page <= page_count]
+
+def count_selected_pages(page_ranges, page_count): # pages of a document of page_count pages that are split
+	return sum(last_page - first_page + 1 for first_page, last_page in resolve_page_ranges(page_ranges, page_count))
+
+def get_first_selected_page(page_ranges): # the page slides are detected on
+	return page_ranges[0][0] if page_ranges else 1
+
+def select_slides(slide_rects, slides): # the rectangles of the selected slides of a page, all of them if slides is None
+	if slides is None:
+		return slide_rects
+	return [slide_rects[index - 1] for index in slides if index <= len(slide_rects)]
+
+def crop_slides(image, slide_rects): # crop the "individual slides" out of a single page image
+	cropped_images = []
+	for rect in slide_rects:
+		crop_area = (rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3]) # area is xy coords, plus width and height
+		cropped_images.append(image.crop(crop_area))
+	return cropped_images
+
+def crop_images(images_dir, cropped_imgs_dir_dst, slide_rects, validator=None, progress_callback=None, slides=None):  # crop all images once the coordinates are known, crop only the "individual slides", and only the selected ones
+	pages = page_store.PageStore(images_dir)
+	cropped_slides = page_store.PageStore(cropped_imgs_dir_dst)
+	images_files = pages.filenames()
+	assert len(images_files) > 0
 	filename_counter = 0
-	images_files = list_files_in_dir(images_dir)
-	for image_filename in sort_file_list_uuid(images_files):
-		image = PIL.Image.open(os.path.join(images_dir, image_filename))
-		for i in range(0, len(coords)):
-			crop_area = (coords[i][0], coords[i][1], coords[i][0] + size[0], coords[i][1] + size[1]) # area is xy coords, plus width and height
-			cropped_image = image.crop(crop_area)
-			cropped_image.save(os.path.join(cropped_imgs_dir_dst, str(filename_counter)+".ppm"), 'PPM')
+	# pages are mapped instead of decoded, every slide is a view into its page until it is written
+	for page_pixels, image_slide_rects in generate_with_progress(generate_validated_pages(pages.generate_pages(sort_file_list_uuid(images_files)), slide_rects, validator, slides), progress_callback, 'crop', len(images_files)):
+		for rect in image_slide_rects:
+			cropped_slides.write(str(filename_counter)+".ppm", page_store.crop_pixels(page_pixels, rect))
 			filename_counter+=1
 
 
 
-def create_new_document(filename, slides_imgs_dir, output_destination): #create the output document
+def create_new_document(filename, slides_imgs_dir, output_destination, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None): #create the output document
 	assert len(list_files_in_dir(slides_imgs_dir)) > 0
-	output_filename = "new_"+filename
-	working_dir_path = output_destination+output_filename # get full path of file
-	c = canvas.Canvas(working_dir_path, pagesize=letter) # create pdf document
-
 	slide_imgs_files = list_files_in_dir(slides_imgs_dir)
 	# save all images into pdf, one page at a time
-	for slide_filename in sort_file_list_indexed_ppm(slide_imgs_files):
-		slide = PIL.Image.open(os.path.join(slides_imgs_dir, slide_filename))
-		side_im = slide
-		side_im_data = StringIO.StringIO()
-		side_im.save(side_im_data, format='png')
-		side_im_data.seek(0)
-		side_out = ImageReader(side_im_data)
-		c.drawImage(side_out,50,250)
-		c.showPage()
-	c.save() # save the output!
-	return output_filename
+	slides = (PIL.Image.open(os.path.join(slides_imgs_dir, slide_filename)) for slide_filename in sort_file_list_indexed_ppm(slide_imgs_files))
+	slides = generate_with_progress(slides, progress_callback, 'render', len(slide_imgs_files))
+	return create_new_document_from_images(filename, slides, output_destination, image_format, jpeg_quality)
+
+def encode_slide(slide, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY): # compress a slide image for the output pdf, the result can be sent between processes
+	return pdf_writer.encode_image(slide, image_format, jpeg_quality)
+
+def draw_encoded_slide(writer, encoded_slide): # draw a single encoded slide on its own page of the output pdf
+	writer.add_image_page(encoded_slide, 50, 250, RESIZE_BASEWIDTH) # same size on the page whatever dpi the slide was resized for
+
+PARTIAL_OUTPUT_SUFFIX = ".part" # outputs are written under this suffix and renamed once complete, downloads can follow the partial file meanwhile
+
+def open_partial_output(output_path): # output file that only shows up under output_path once it is complete
+	return open(output_path+PARTIAL_OUTPUT_SUFFIX, 'wb')
 
-def resize_images(cropped_imgs_dir, resized_imgs_dst_dir): #resize all images before they are included in the output	
-	assert len(list_files_in_dir(cropped_imgs_dir)) > 0
-	basewidth = 500   #moidy this value to change image size!
-	ref_img = get_reference_image(cropped_imgs_dir)
-	width = (basewidth/float(ref_img.size[0]))
-	height = int((float(ref_img.size[1]) * float(width)))
+def finish_partial_output(output_path, succeeded): # move a finished output in place, or get rid of a failed one so that nobody follows it
+	if succeeded:
+		os.rename(output_path+PARTIAL_OUTPUT_SUFFIX, output_path)
+	elif os.path.exists(output_path+PARTIAL_OUTPUT_SUFFIX):
+		os.remove(output_path+PARTIAL_OUTPUT_SUFFIX)
 
-	cropped_imgs_files = list_files_in_dir(cropped_imgs_dir)
+def create_new_document_from_encoded_slides(filename, encoded_slides, output_destination): # create the output document from encoded slides
+	output_filename = "new_"+filename
+	working_dir_path = output_destination+output_filename # get full path of file
+	succeeded = False
+	try:
+		with open_partial_output(working_dir_path) as output_file:
+			writer = pdf_writer.PdfWriter(output_file, letter)
+			for encoded_slide in encoded_slides: # encoded_slides can be a generator, slides are written as soon as they are produced
+				draw_encoded_slide(writer, encoded_slide)
+				output_file.flush() # so that a streamed download gets every page as soon as it is written
+			assert writer.page_count() > 0
+			writer.close() # save the output!
+		succeeded = True
+	finally:
+		finish_partial_output(working_dir_path, succeeded)
+	return output_filename
 
-	for image_filename in sort_file_list_indexed_ppm(cropped_imgs_files):
-		image = PIL.Image.open(os.path.join(cropped_imgs_dir, image_filename))
-		image = image.resize((basewidth, height), PIL.Image.ANTIALIAS)
+def create_new_document_from_images(filename, slide_imgs, output_destination, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY): # create the output document straight from in memory slide images
+	return create_new_document_from_encoded_slides(filename, (encode_slide(slide, image_format, jpeg_quality) for slide in slide_imgs), output_destination)
+
+RESIZE_BASEWIDTH = 500   #moidy this value to change image size! width in points of the slides on the output pages, and in pixels at 200 dpi
+
+# filters slides can be resized with, from the fastest to the sharpest, see benchmarks/bench_resize.py for what each one costs
+# nearest, bilinear and area go through cv2
+# lanczos goes through PIL, its kernel widens with the downscaling factor so it does not alias, cv2's lanczos does not widen
+RESIZE_FILTERS = ['nearest', 'bilinear', 'area', 'lanczos']
+DEFAULT_RESIZE_FILTER = 'lanczos' # what every slide was resized with before the filter could be picked
+CV2_RESIZE_FILTERS = {'nearest': cv2.INTER_NEAREST, 'bilinear': cv2.INTER_LINEAR, 'area': cv2.INTER_AREA}
+
+def get_resized_size(size, dpi=RENDER_DPI, resize_width=None): # width and height a slide of the given size is resized to, every slide keeps its own aspect ratio
+	basewidth = resize_width or int(RESIZE_BASEWIDTH * dpi / float(RENDER_DPI)) # the slide is drawn RESIZE_BASEWIDTH points wide whatever its pixel width
+	width = (basewidth/float(size[0]))
+	height = max(1, int((float(size[1]) * float(width))))
+	return (basewidth, height)
+
+def resize_slide_pixels(slide_pixels, dpi=RENDER_DPI, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER): # resize a slide given as a numpy array, returns a PIL image
+	resized_size = get_resized_size((slide_pixels.shape[1], slide_pixels.shape[0]), dpi, resize_width)
+	if resize_filter in CV2_RESIZE_FILTERS:
+		return PIL.Image.fromarray(cv2.resize(slide_pixels, resized_size, interpolation=CV2_RESIZE_FILTERS[resize_filter]))
+	return PIL.Image.fromarray(slide_pixels).resize(resized_size, PIL.Image.ANTIALIAS)
+
+def resize_slide_image(slide_img, dpi=RENDER_DPI, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER): # resize a slide given as a PIL image
+	if resize_filter in CV2_RESIZE_FILTERS:
+		return resize_slide_pixels(numpy.asarray(slide_img), dpi, resize_width, resize_filter)
+	return slide_img.resize(get_resized_size(slide_img.size, dpi, resize_width), PIL.Image.ANTIALIAS)
+
+# crop and resize every slide of a page in one call
+# slides are cropped out of the PIL page, only they are copied to numpy arrays for cv2, copying the whole page costs more than cv2 saves
+def resize_page_slides(page_img, slide_rects, dpi=RENDER_DPI, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	return [resize_slide_image(slide, dpi, resize_width, resize_filter) for slide in crop_slides(page_img, slide_rects)]
+
+def resize_images(cropped_imgs_dir, resized_imgs_dst_dir, dpi=RENDER_DPI, progress_callback=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER): #resize all images before they are included in the output
+	cropped_slides = page_store.PageStore(cropped_imgs_dir)
+	cropped_imgs_files = cropped_slides.filenames()
+	assert len(cropped_imgs_files) > 0
+
+	for image_filename in generate_with_progress(sort_file_list_indexed_ppm(cropped_imgs_files), progress_callback, 'resize', len(cropped_imgs_files)):
+		image = resize_slide_pixels(numpy.asarray(cropped_slides.map(image_filename)), dpi, resize_width, resize_filter) # resized straight from the mapped file
 		image.save(os.path.join(resized_imgs_dst_dir, image_filename), 'PPM')
 
 
-def assert_document_dimensions(width, height):
-	orientation = False
-	if( width == 1700 and height == 2200):
-		orientation = True
-	elif( width == 2200 or height == 1700):
-		orientation = True
-	return orientation
+def assert_document_dimensions(width, height): # letter pages in either orientation, rendered at any dpi
+	aspect_ratio = min(width, height) / float(max(width, height))
+	return abs(aspect_ratio - LETTER_ASPECT_RATIO) < 0.01
+
+def scale_slide_bounds(page_size, min_width, min_height, max_width, max_height): # scale slide bounds picked for a 200 dpi letter page to the dpi the page was rendered at
+	scale = max(page_size) / float(REFERENCE_PAGE_LENGTH)
+	return int(min_width * scale), int(min_height * scale), int(max_width * scale), int(max_height * scale)
+
+def scale_slide_rects(slide_rects, scale): # scale slide rectangles found on a page rendered at one dpi to a page rendered at another
+	return [[int(round(value * scale)) for value in rect] for rect in slide_rects]
 
 #merge list of coordinates
 def merge_slides_from_halves(left_side, right_side, mode):
@@ -338,105 +514,341 @@ def merge_images(list_one, list_two):
 		merged_list.append(list_two[i])
 	return merged_list
 
-#=============================================================
-# MAIN PROCESSING FOR EACH KIND OF PDF
-#=============================================================
-def process_2_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, half_imgs_dir_path, img_crop_dir_path, img_resize_dir_path):
-	min_slide_width = 200
-	min_slide_height = 200
-	max_slide_width = 1050
-	max_slide_height = 840
-
-	#first crop the image in the two halves
-	area_upper_half= (0,0,reference_img.size[0], reference_img.size[1]/2) # coordinates of upper left quadrant of image)
-	area_lower_half = (0, reference_img.size[1]/2, reference_img.size[0], reference_img.size[1])
-	
-	upper_image_half = reference_img.crop(area_upper_half)
-	lower_image_half = reference_img.crop(area_lower_half) 	
-
-	upper_box_coordinates = find_box_using_opencv(upper_image_half, min_slide_width, min_slide_height, max_slide_width, max_slide_height, False) # attempt to find an individual slides so that slides can be centered in their own page
-	lower_box_coordinates = find_box_using_opencv(lower_image_half, min_slide_width, min_slide_height, max_slide_width, max_slide_height, False) # attempt to find an individual slides so that slides can be centered in their own page
-
-	if upper_box_coordinates is not None and lower_box_coordinates is not None:
-
-		#calculate width and height for both slides
-		upper_slide_width = upper_box_coordinates[2][0][0] - upper_box_coordinates[0][0][0]
-		upper_slide_height = upper_box_coordinates[2][0][1] - upper_box_coordinates[0][0][1]
+def find_2_slide_rects(reference_img, pdf_name): # find the upper and lower slide, returns their rectangles in page coordinates
+	min_slide_width, min_slide_height, max_slide_width, max_slide_height = scale_slide_bounds(reference_img.size, 200, 200, 1050, 840)
 
-		lower_slide_width = lower_box_coordinates[2][0][0] - lower_box_coordinates[0][0][0]
-		lower_slide_height = lower_box_coordinates[2][0][1] - lower_box_coordinates[0][0][1]
-
-
-		#get the top left coordinate of the slide for both upper and lower
-		upper_slide_x = upper_box_coordinates[0][0][0]  
-		upper_slide_y = upper_box_coordinates[0][0][1]
-
-		lower_slide_x = lower_box_coordinates[0][0][0]  
-		lower_slide_y = lower_box_coordinates[0][0][1]
-
-		#crop all images in half, save each of these halves to a temporary directory
-		filename_counter = 0
-		assert len(list_files_in_dir(pdf_as_img_dir_path)) > 0
-		pdf_as_img_filenames = list_files_in_dir(pdf_as_img_dir_path) 
-		for image_filename in sort_file_list_uuid(pdf_as_img_filenames):
-			image = PIL.Image.open(os.path.join(pdf_as_img_dir_path, image_filename)) #open the image from the temp dir containing the whole doc as a imgs
-			
-			#crop the top and save it to the temp dir
-			upper_img_half = image.crop(area_upper_half)
-			upper_img_half.save(os.path.join(half_imgs_dir_path, 'a-b-c-d-e-'+str(filename_counter)+'.ppm'), 'PPM') #a-b-c.. is an ugly hack for filenames to look as crop_images expects them
-			filename_counter+=1
-			#crop the bottom and save it to the temp dir
-			lower_img_half = image.crop(area_lower_half)
-			lower_img_half.save(os.path.join(half_imgs_dir_path, 'a-b-c-d-e-'+str(filename_counter)+'.ppm'), 'PPM')
-			filename_counter+=1
+	#find the slides on the whole page once, then pick the biggest one in each half
+	area_upper_half= (0,0,reference_img.size[0], reference_img.size[1]/2) # coordinates of upper half of image
+	area_lower_half = (0, reference_img.size[1]/2, reference_img.size[0], reference_img.size[1])
+	slide_rects = find_slide_candidates(reference_img, min_slide_width, min_slide_height, max_slide_width, max_slide_height)
+	upper_slide_rects = find_slides_inside(slide_rects, area_upper_half)
+	lower_slide_rects = find_slides_inside(slide_rects, area_lower_half)
 
-		#crop and resize, seperately , merge in the end
-		crop_images(half_imgs_dir_path, img_crop_dir_path,[[upper_slide_x, upper_slide_y]], (upper_slide_width, upper_slide_height))
-		resize_images(img_crop_dir_path, img_resize_dir_path)
-		output_document_name = create_new_document(pdf_name, img_resize_dir_path, output_destination)
-		return output_document_name
-	else:
+	if len(upper_slide_rects) == 0 or len(lower_slide_rects) == 0:
 		logger.error("Failed to find slides in document.")
 		raise Exception("Failed to find slides in document.")
 
+	return [upper_slide_rects[0].tolist(), lower_slide_rects[0].tolist()]
 
-
-def process_6_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, splitting_mode, reference_img, img_crop_dir_path, img_resize_dir_path):
-	min_slide_width = 50
-	min_slide_height = 50
-	max_slide_width = 1050
-	max_slide_height = 840
-	logger.info("Doing 6 slides, mode "+str(splitting_mode))
+def find_6_slide_rects(reference_img, pdf_name, splitting_mode): # find all 6 slides, ordered as the splitting mode asks for
+	min_slide_width, min_slide_height, max_slide_width, max_slide_height = scale_slide_bounds(reference_img.size, 50, 50, 1050, 840)
 	#get the coordinates for all of the slides in the left half of the iamge
 	left_slides_coords = find_left_slides(reference_img, pdf_name, min_slide_width, min_slide_height, max_slide_width, max_slide_height)	
-	if left_slides_coords:
-		left_side_slide_coords, right_side_slide_coords, slide_size = calculate_remaining_slides_coordinates(left_slides_coords, reference_img.size)
-		combined_slides = merge_slides_from_halves(left_side_slide_coords, right_side_slide_coords, splitting_mode)	
-		crop_images(pdf_as_img_dir_path, img_crop_dir_path, combined_slides, slide_size)
-		resize_images(img_crop_dir_path, img_resize_dir_path)
-		output_document_name = create_new_document(pdf_name, img_resize_dir_path, output_destination) 
-		return output_document_name
-	else:
+	if not left_slides_coords:
 		logger.error("Failed to find 3 slides on the image.")
 		raise Exception("Failed to find 3 slides on the image.")
+	left_side_slide_coords, right_side_slide_coords, slide_size = calculate_remaining_slides_coordinates(left_slides_coords, reference_img.size)
+	combined_slides = merge_slides_from_halves(left_side_slide_coords, right_side_slide_coords, splitting_mode)	
+	return slide_rects_from_coords(combined_slides, slide_size)
 
-def process_4_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, img_crop_dir_path, img_resize_dir_path):
-	min_slide_width = 200
-	min_slide_height = 200
-	max_slide_width = 1050
-	max_slide_height = 840
-	logger.info("Doing 4 slides")
+def find_4_slide_rects(reference_img, pdf_name): # find all 4 slides, ordered left to right and top to bottom
+	min_slide_width, min_slide_height, max_slide_width, max_slide_height = scale_slide_bounds(reference_img.size, 200, 200, 1050, 840)
 	upper_left_box_coordinates = find_upper_left_slide(reference_img, pdf_name, min_slide_width, min_slide_height, max_slide_width, max_slide_height) # attempt to find an individual slides so that slides can be centered in their own page
-	if(upper_left_box_coordinates is not None): #only proceed if coordinates were found
-		slide_coordinates, slide_dimentions = calculate_all_slides_coords(upper_left_box_coordinates, reference_img.size) #get all cords from all slides per image
-		logger.info("All slides found successfully in " + pdf_name)
-		crop_images(pdf_as_img_dir_path, img_crop_dir_path, slide_coordinates, slide_dimentions)
-		resize_images(img_crop_dir_path, img_resize_dir_path)
-		output_document_name = create_new_document(pdf_name, img_resize_dir_path, output_destination) # DOCUMENT PROCESSED SUCCESFULLY!
-		return output_document_name
-	else:
+	if upper_left_box_coordinates is None: #only proceed if coordinates were found
 		logger.error("Failed to find individual slide.")
 		raise Exception("Failed to find individual slide.")
+	slide_coordinates, slide_dimentions = calculate_all_slides_coords(upper_left_box_coordinates, reference_img.size) #get all cords from all slides per image
+	logger.info("All slides found successfully in " + pdf_name)
+	return slide_rects_from_coords(slide_coordinates, slide_dimentions)
+
+def find_layout_rects(reference_img, pdf_name, splitting_mode): # the slides as opencv finds them on the page, for any splitting mode
+	if splitting_mode == 0:
+		return find_4_slide_rects(reference_img, pdf_name)
+	if splitting_mode == 1 or splitting_mode == 2:
+		return find_6_slide_rects(reference_img, pdf_name, splitting_mode)
+	if splitting_mode == 3:
+		return find_2_slide_rects(reference_img, pdf_name)
+	logger.error("Incorrect dimensions or incorrect mode")
+	raise Exception("Incorrect dimensions or incorrect mode")
+
+def find_cached_layout_rects(reference_img, pdf_name, splitting_mode, layouts): # reuse a known layout if the slides really are there, otherwise detect them and remember the layout
+	fingerprint = get_layout_fingerprint(reference_img)
+	for layout_rects in layouts.candidates(reference_img.size, splitting_mode, fingerprint):
+		if verify_slide_rects(reference_img, layout_rects):
+			logger.info("Reusing a known slide layout for "+pdf_name)
+			layouts.add(reference_img.size, splitting_mode, fingerprint, layout_rects) # mark it as used
+			return layout_rects
+	layout_rects = find_layout_rects(reference_img, pdf_name, splitting_mode)
+	layouts.add(reference_img.size, splitting_mode, fingerprint, layout_rects)
+	return layout_rects
+
+# find the rectangles of every slide in a page for any splitting mode, layouts is an optional LayoutCache
+# grid is an optional (rows, columns) that replaces the splitting mode, for handouts that none of the modes describe
+def find_slide_rects(reference_img, pdf_name, splitting_mode, layouts=None, grid=None):
+	correct_dimensions = assert_document_dimensions(reference_img.size[0], reference_img.size[1]) # get size of document
+	if not correct_dimensions or (grid is None and splitting_mode not in [0, 1, 2, 3, AUTO_MODE]):
+		logger.error("Incorrect dimensions or incorrect mode")
+		raise Exception("Incorrect dimensions or incorrect mode")
+	if grid is not None: # already a single pass over the page, not worth caching
+		return find_grid_slide_rects(reference_img, pdf_name, grid[0], grid[1])
+	if splitting_mode == AUTO_MODE: # every page that gets its own detection is classified again, so decks that mix layouts split too
+		splitting_mode = classify_layout(reference_img, pdf_name)
+	if layouts is None:
+		layout_rects = find_layout_rects(reference_img, pdf_name, splitting_mode)
+	else:
+		layout_rects = find_cached_layout_rects(reference_img, pdf_name, splitting_mode, layouts)
+	if splitting_mode == 3:
+		# only the upper slide is detected, the lower one has its size and offset from the centre of the page
+		upper_slide_rect = layout_rects[0]
+		return [upper_slide_rect, [upper_slide_rect[0], upper_slide_rect[1] + reference_img.size[1]/2, upper_slide_rect[2], upper_slide_rect[3]]]
+	return layout_rects
+
+def make_page_validator(reference_img, slide_rects, pdf_name, splitting_mode, layouts=None, grid=None): # validator for pages rendered like reference_img, the page slide_rects were found on
+	return PageValidator(slide_rects, get_drawn_slide_rects(reference_img, slide_rects), pdf_name, splitting_mode, 1, layouts, grid)
+
+# picks the slide rectangles each page is cropped with: the ones found on the first page, unless a page's slide borders are not where they say
+# only drawn_rects, the rectangles whose borders were found on the first page, are checked, the others can not fail any better on later pages
+class PageValidator(object):
+	def __init__(self, slide_rects, drawn_rects, pdf_name, splitting_mode, tolerance=1, layouts=None, grid=None):
+		self.slide_rects = slide_rects
+		self.drawn_rects = drawn_rects
+		self.pdf_name = pdf_name
+		self.splitting_mode = splitting_mode
+		self.tolerance = tolerance # pixels the borders can be off by, rectangles scaled from a lower dpi are off by up to the scale
+		self.layouts = layouts
+		self.grid = grid
+
+	def page_slide_rects(self, page_imgs): # the slide rectangles of every page in a window of pages, pages that fail the check get their own detection
+		if not self.drawn_rects:
+			return [self.slide_rects] * len(page_imgs)
+		valid_pages = verify_pages(page_imgs, self.drawn_rects, self.tolerance)
+		return [self.slide_rects if page_valid else self.find_page_slide_rects(page_img) for page_img, page_valid in zip(page_imgs, valid_pages)]
+
+	def find_page_slide_rects(self, page_img):
+		logger.info("Slides moved on a page of "+self.pdf_name+", finding them again")
+		try:
+			return find_slide_rects(as_pil_image(page_img), self.pdf_name, self.splitting_mode, self.layouts, self.grid)
+		except Exception:
+			logger.warning("Failed to find the slides of a page of "+self.pdf_name+", cropping it like the first page")
+			return self.slide_rects
+
+# pair every page with the slide rectangles to crop it with, pages are checked a window at a time
+# with slides, only the rectangles of the selected slides are kept, once each page is checked, so that slides that moved are still picked right
+def generate_validated_pages(page_imgs, slide_rects, validator=None, slides=None, window_size=RASTER_WINDOW_PAGES):
+	page_imgs = iter(page_imgs)
+	while True:
+		window = list(itertools.islice(page_imgs, window_size))
+		if not window:
+			return
+		window_slide_rects = validator.page_slide_rects(window) if validator is not None else [slide_rects] * len(window)
+		for page_img, page_slide_rects in zip(window, window_slide_rects):
+			yield page_img, select_slides(page_slide_rects, slides)
+
+#=============================================================
+# MAIN PROCESSING FOR EACH KIND OF PDF
+#=============================================================
+def process_2_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, img_crop_dir_path, img_resize_dir_path, dpi=RENDER_DPI, layouts=None, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	logger.info("Doing 2 slides")
+	with metrics.timed_stage(timings, 'detect'):
+		slide_rects = find_slide_rects(reference_img, pdf_name, 3, layouts) # both slides, on the full page
+	report_progress(progress_callback, 'detect', 1, 1)
+	validator = make_page_validator(reference_img, slide_rects, pdf_name, 3, layouts)
+	return crop_resize_and_create_document(pdf_name, pdf_as_img_dir_path, output_destination, slide_rects, validator, img_crop_dir_path, img_resize_dir_path, dpi, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter)
+
+def process_6_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, splitting_mode, reference_img, img_crop_dir_path, img_resize_dir_path, dpi=RENDER_DPI, layouts=None, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	logger.info("Doing 6 slides, mode "+str(splitting_mode))
+	with metrics.timed_stage(timings, 'detect'):
+		slide_rects = find_slide_rects(reference_img, pdf_name, splitting_mode, layouts)
+	report_progress(progress_callback, 'detect', 1, 1)
+	validator = make_page_validator(reference_img, slide_rects, pdf_name, splitting_mode, layouts)
+	return crop_resize_and_create_document(pdf_name, pdf_as_img_dir_path, output_destination, slide_rects, validator, img_crop_dir_path, img_resize_dir_path, dpi, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter)
+
+def process_grid_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, grid, img_crop_dir_path, img_resize_dir_path, dpi=RENDER_DPI, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	logger.info("Doing a "+str(grid[0])+"x"+str(grid[1])+" grid of slides")
+	with metrics.timed_stage(timings, 'detect'):
+		slide_rects = find_slide_rects(reference_img, pdf_name, None, grid=grid)
+	report_progress(progress_callback, 'detect', 1, 1)
+	validator = make_page_validator(reference_img, slide_rects, pdf_name, None, grid=grid)
+	return crop_resize_and_create_document(pdf_name, pdf_as_img_dir_path, output_destination, slide_rects, validator, img_crop_dir_path, img_resize_dir_path, dpi, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter)
+
+def process_4_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, img_crop_dir_path, img_resize_dir_path, dpi=RENDER_DPI, layouts=None, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	logger.info("Doing 4 slides")
+	with metrics.timed_stage(timings, 'detect'):
+		slide_rects = find_slide_rects(reference_img, pdf_name, 0, layouts)
+	report_progress(progress_callback, 'detect', 1, 1)
+	validator = make_page_validator(reference_img, slide_rects, pdf_name, 0, layouts)
+	return crop_resize_and_create_document(pdf_name, pdf_as_img_dir_path, output_destination, slide_rects, validator, img_crop_dir_path, img_resize_dir_path, dpi, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter) # DOCUMENT PROCESSED SUCCESFULLY!
+
+# the rest of the disk path once the slides are found, every stage reads the images the previous one wrote
+def crop_resize_and_create_document(pdf_name, pages_dir_path, output_destination, slide_rects, validator, img_crop_dir_path, img_resize_dir_path, dpi=RENDER_DPI, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	with metrics.timed_stage(timings, 'crop', len(list_files_in_dir(pages_dir_path))):
+		crop_images(pages_dir_path, img_crop_dir_path, slide_rects, validator, progress_callback, slides)
+	with metrics.timed_stage(timings, 'resize', len(list_files_in_dir(img_crop_dir_path))):
+		resize_images(img_crop_dir_path, img_resize_dir_path, dpi, progress_callback, resize_width, resize_filter)
+	with metrics.timed_stage(timings, 'render', len(list_files_in_dir(img_resize_dir_path))) as span:
+		output_document_name = create_new_document(pdf_name, img_resize_dir_path, output_destination, image_format, jpeg_quality, progress_callback)
+		span['bytes'] = os.path.getsize(output_destination+output_document_name)
+	return output_document_name
+
+#=============================================================
+# IN MEMORY PROCESSING, NO TEMPORARY FILES
+#=============================================================
+def generate_resized_slides(page_imgs, slide_rects, dpi=RENDER_DPI, validator=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER): # crop and resize the (selected) slides of every page, yielding them in document order
+	for page_img, page_slide_rects in generate_validated_pages(page_imgs, slide_rects, validator, slides):
+		for slide in resize_page_slides(page_img, page_slide_rects, dpi, resize_width, resize_filter):
+			yield slide
+
+def get_pdf_page_count(pdf_file_path): # ask poppler's pdfinfo how many pages the pdf has
+	try:
+		pdf_info = subprocess.check_output(['pdfinfo', pdf_file_path], stderr=subprocess.STDOUT)
+		return int(re.search(r'Pages:\s+(\d+)', pdf_info).group(1))
+	except Exception as err:
+		logger.error("exception is "+str(err))
+		logger.error("Error on pdf \""+pdf_file_path+"\",pdfinfo failed to count the pages")
+		raise Exception("Error on pdf \""+pdf_file_path+"\",pdfinfo failed to count the pages")
+
+def convert_page_window(pdf_file_path, first_page, last_page, raster_threads=1, dpi=RENDER_DPI): # rasterize a range of pages (1 based, inclusive) straight into memory
+	try:
+		return convert_from_path(pdf_file_path, first_page=first_page, last_page=last_page, thread_count=raster_threads, dpi=dpi) # no output_folder, pdf2image reads the pages from pdftoppm's stdout
+	except Exception as err:
+		logger.error("exception is "+str(err))
+		logger.error("Error on pdf \""+pdf_file_path+"\",pdf2 img failed to convert pdf to images")
+		raise Exception("Error on pdf \""+pdf_file_path+"\",pdf2 img failed to convert pdf to images")
+
+def render_first_page(pdf_file_path, dpi, page=1): # rasterize only the first page (or the given one), at the given dpi
+	first_page_img = next(iter(convert_page_window(pdf_file_path, page, page, dpi=dpi)), None)
+	if first_page_img is None:
+		logger.error("Failed to extract images from pdf")
+		raise Exception("Failed to extract images from pdf")
+	return first_page_img
+
+# find the slides on a low dpi render of the first page, returns their rectangles scaled to pages rendered at dpi, the size of such a page
+# and the rectangles whose borders were found on the first page, for make_scaled_page_validator
+# thin slide borders can get lost when rendering at a low dpi, in which case the slides are searched for again at the output dpi
+def detect_slide_rects(pdf_file_path, pdf_name, splitting_mode, dpi=RENDER_DPI, layouts=None, grid=None, first_page=1): # slides are looked for on first_page, the first page that is split
+	detection_dpi = min(DETECTION_DPI, dpi)
+	detection_img = render_first_page(pdf_file_path, detection_dpi, first_page)
+	try:
+		slide_rects = find_slide_rects(detection_img, pdf_name, splitting_mode, layouts, grid)
+	except Exception:
+		if detection_dpi == dpi:
+			raise
+		logger.warning("Failed to find slides at "+str(detection_dpi)+" dpi in "+pdf_name+", trying again at "+str(dpi)+" dpi")
+		reference_img = render_first_page(pdf_file_path, dpi, first_page)
+		slide_rects = find_slide_rects(reference_img, pdf_name, splitting_mode, layouts, grid)
+		return slide_rects, reference_img.size, get_drawn_slide_rects(reference_img, slide_rects)
+	scale = dpi / float(detection_dpi)
+	page_size = (int(round(detection_img.size[0] * scale)), int(round(detection_img.size[1] * scale)))
+	return scale_slide_rects(slide_rects, scale), page_size, scale_slide_rects(get_drawn_slide_rects(detection_img, slide_rects), scale)
+
+def make_scaled_page_validator(slide_rects, drawn_rects, pdf_name, splitting_mode, dpi=RENDER_DPI, layouts=None, grid=None): # validator for rectangles from detect_slide_rects, they can be off by up to the detection scale
+	tolerance = int(math.ceil(dpi / float(min(DETECTION_DPI, dpi))))
+	return PageValidator(slide_rects, drawn_rects, pdf_name, splitting_mode, tolerance, layouts, grid)
+
+# yield every page of the pdf (or of page_ranges) in order, only window_size pages are rendered at a time
+def generate_pdf_pages(pdf_file_path, window_size=RASTER_WINDOW_PAGES, raster_threads=1, dpi=RENDER_DPI, page_ranges=None):
+	for range_first_page, range_last_page in page_ranges or [(1, None)]:
+		first_page = range_first_page
+		while range_last_page is None or first_page <= range_last_page:
+			last_page = first_page + window_size - 1 if range_last_page is None else min(first_page + window_size - 1, range_last_page)
+			page_imgs = convert_page_window(pdf_file_path, first_page, last_page, raster_threads, dpi)
+			for page_img in page_imgs:
+				yield page_img
+			if len(page_imgs) < last_page - first_page + 1: # pdf2image clamps the window to the last page
+				return
+			first_page += window_size
+
+def render_window_slides(window): # pool worker: rasterize a window of pages, then crop, resize and png encode all of its (selected) slides
+	pdf_file_path, first_page, last_page, slide_rects, raster_threads, dpi, validator, image_format, jpeg_quality, slides, resize_width, resize_filter = window
+	page_imgs = convert_page_window(pdf_file_path, first_page, last_page, raster_threads, dpi)
+	return [encode_slide(slide, image_format, jpeg_quality) for slide in generate_resized_slides(page_imgs, slide_rects, dpi, validator, slides, resize_width, resize_filter)]
+
+# fan page windows out over a process pool, slides come back in document order, only pages from first_page on (or in page_ranges) are rendered
+def generate_encoded_slides_in_parallel(pdf_file_path, first_page, slide_rects, workers, window_size=RASTER_WINDOW_PAGES, raster_threads=1, dpi=RENDER_DPI, validator=None, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, page_ranges=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	if multiprocessing.current_process().daemon:
+		# pool workers (like the webapp's splitter pool) are daemonic and can not start a pool of their own
+		logger.error("More than 1 worker requested from inside a daemonic process")
+		raise Exception("More than 1 worker requested from inside a daemonic process")
+	page_count = get_pdf_page_count(pdf_file_path)
+	page_ranges = resolve_page_ranges(page_ranges if page_ranges is not None else [(first_page, None)], page_count)
+	windows = [(pdf_file_path, window_first_page, min(window_first_page + window_size - 1, range_last_page), slide_rects, raster_threads, dpi, validator, image_format, jpeg_quality, slides, resize_width, resize_filter)
+		for range_first_page, range_last_page in page_ranges for window_first_page in range(range_first_page, range_last_page + 1, window_size)]
+	selected_page_count = count_selected_pages(page_ranges, page_count)
+	max_windows_in_flight = workers * 2 # finished windows wait here until the writer takes them, so keep their number bounded
+	pool = multiprocessing.Pool(processes=workers)
+	try:
+		pending_results = collections.deque() # (pages done once the window is, result) of every window in flight
+		pages_done = 0
+		for window in windows:
+			pages_done += window[2] - window[1] + 1
+			pending_results.append((pages_done, pool.apply_async(render_window_slides, (window,))))
+			if len(pending_results) >= max_windows_in_flight:
+				window_pages_done, window_result = pending_results.popleft() # oldest window first, keeps document order
+				for encoded_slide in window_result.get():
+					yield encoded_slide
+				report_progress(progress_callback, 'render', window_pages_done, selected_page_count)
+		while pending_results:
+			window_pages_done, window_result = pending_results.popleft()
+			for encoded_slide in window_result.get():
+				yield encoded_slide
+			report_progress(progress_callback, 'render', window_pages_done, selected_page_count)
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+def process_pdf_in_memory(pdf_name, input_location, output_destination, splitting_mode, workers=1, raster_threads=1, dpi=RENDER_DPI, layouts=None, grid=None, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, page_ranges=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER): # same output as process_pdf, pages stay as PIL images from rasterization to the writer
+	pdf_file_path = input_location+pdf_name
+	with metrics.timed_stage(timings, 'detect'):
+		slide_rects, page_size, drawn_rects = detect_slide_rects(pdf_file_path, pdf_name, splitting_mode, dpi, layouts, grid, get_first_selected_page(page_ranges))
+	report_progress(progress_callback, 'detect', 1, 1)
+	validator = make_scaled_page_validator(slide_rects, drawn_rects, pdf_name, splitting_mode, dpi, layouts, grid)
+	with metrics.timed_stage(timings, 'render') as span: # rasterizing, cropping, resizing and drawing are interleaved here, so they are timed as one stage
+		if workers > 1:
+			encoded_slides = generate_encoded_slides_in_parallel(pdf_file_path, 1, slide_rects, workers, raster_threads=raster_threads, dpi=dpi, validator=validator, image_format=image_format, jpeg_quality=jpeg_quality, progress_callback=progress_callback, page_ranges=page_ranges, slides=slides, resize_width=resize_width, resize_filter=resize_filter)
+			output_filename = create_new_document_from_encoded_slides(pdf_name, metrics.count_pages(encoded_slides, span), output_destination)
+		else:
+			# pages are rendered, cropped, resized and drawn one window at a time, so memory does not grow with the page count
+			page_count = count_selected_pages(page_ranges, get_pdf_page_count(pdf_file_path)) if progress_callback is not None else None
+			page_imgs = generate_with_progress(generate_pdf_pages(pdf_file_path, raster_threads=raster_threads, dpi=dpi, page_ranges=page_ranges), progress_callback, 'render', page_count)
+			output_filename = create_new_document_from_images(pdf_name, metrics.count_pages(generate_resized_slides(page_imgs, slide_rects, dpi, validator, slides, resize_width, resize_filter), span), output_destination, image_format, jpeg_quality)
+		span['bytes'] = os.path.getsize(output_destination+output_filename)
+	return output_filename
+
+#=============================================================
+# VECTOR PROCESSING, SLIDES KEEP THE ORIGINAL PDF CONTENT
+#=============================================================
+def slide_rect_to_pdf_box(rect, image_size, media_box): # scale a [x, y, width, height] pixel rectangle to a [left, bottom, right, top] pdf box in points
+	scale_x = float(media_box.getWidth()) / image_size[0]
+	scale_y = float(media_box.getHeight()) / image_size[1]
+	left = float(media_box.getLowerLeft_x()) + rect[0] * scale_x
+	top = float(media_box.getUpperRight_y()) - rect[1] * scale_y # pdf y coordinates grow upwards, pixel ones downwards
+	return [left, top - rect[3] * scale_y, left + rect[2] * scale_x, top]
+
+def create_vector_document(filename, pdf_file_path, slide_rects, image_size, output_destination, progress_callback=None, page_ranges=None): # every slide becomes a page that shows a window into the original page content
+	output_filename = "new_"+filename
+	with open(pdf_file_path, 'rb') as pdf_file:
+		reader = PdfFileReader(pdf_file, strict=False)
+		writer = PdfFileWriter()
+		page_numbers = [page_number for first_page, last_page in resolve_page_ranges(page_ranges, reader.getNumPages()) for page_number in range(first_page, last_page + 1)]
+		for page in generate_with_progress((reader.getPage(page_number - 1) for page_number in page_numbers), progress_callback, 'render', len(page_numbers)):
+			if page.get('/Rotate', 0) % 360 != 0:
+				logger.error("Rotated pages are not supported in vector mode")
+				raise Exception("Rotated pages are not supported in vector mode")
+			for rect in slide_rects:
+				slide_page = copy.copy(page) # shallow copy, the content stream is shared by all slides of the page
+				slide_box = RectangleObject(slide_rect_to_pdf_box(rect, image_size, page.mediaBox))
+				slide_page.mediaBox = slide_box
+				slide_page.cropBox = slide_box
+				writer.addPage(slide_page)
+		succeeded = False
+		try:
+			with open_partial_output(output_destination+output_filename) as output_file:
+				writer.write(output_file)
+			succeeded = True
+		finally:
+			finish_partial_output(output_destination+output_filename, succeeded)
+	return output_filename
+
+def process_pdf_vector(pdf_name, input_location, output_destination, splitting_mode, layouts=None, grid=None, progress_callback=None, timings=None, page_ranges=None, slides=None): # only the first page is rasterized, to find the slides
+	pdf_file_path = input_location+pdf_name
+	with metrics.timed_stage(timings, 'detect'):
+		slide_rects, image_size = detect_slide_rects(pdf_file_path, pdf_name, splitting_mode, layouts=layouts, grid=grid, first_page=get_first_selected_page(page_ranges))[:2] # later pages are not rasterized, so they can not be checked
+	report_progress(progress_callback, 'detect', 1, 1)
+	with metrics.timed_stage(timings, 'render') as span:
+		output_filename = create_vector_document(pdf_name, pdf_file_path, select_slides(slide_rects, slides), image_size, output_destination, progress_callback, page_ranges)
+		span['bytes'] = os.path.getsize(output_destination+output_filename)
+	return output_filename
 
 def get_filename_int_identifier_from_uuid(filename):
 	dash_separated_filename = filename.split("-")
@@ -465,22 +877,32 @@ def img_extraction_success(dir_path):
 	extracted_img_filenames = list_files_in_dir(dir_path)
 	return len(extracted_img_filenames) > 0
 
-def get_reference_image(dir_path):
-	first_img_path = os.path.join(dir_path, list_files_in_dir(dir_path)[0])
+def get_reference_image(dir_path): # the first page, os.listdir returns the files in any order
+	first_img_path = os.path.join(dir_path, sort_file_list_uuid(list_files_in_dir(dir_path))[0])
 	first_img = PIL.Image.open(first_img_path)
 	return first_img
 
-def process_pdf(pdf_name, input_location, output_destination, splitting_mode, pdf_as_img_dir_path, half_imgs_dir_path, img_crop_dir_path, img_resize_dir_path):
-	extract_images_from_pdf(input_location+pdf_name, pdf_as_img_dir_path) # get all pages in pdf as images
+def process_pdf(pdf_name, input_location, output_destination, splitting_mode, pdf_as_img_dir_path, img_crop_dir_path, img_resize_dir_path, dpi=RENDER_DPI, layouts=None, grid=None, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, page_ranges=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER):
+	report_progress(progress_callback, 'rasterize', 0, 1)
+	with metrics.timed_stage(timings, 'rasterize') as span:
+		extract_images_from_pdf(input_location+pdf_name, pdf_as_img_dir_path, dpi, page_ranges) # get all (selected) pages in pdf as images, slides are found on the first of them
+		span['pages'] = len(list_files_in_dir(pdf_as_img_dir_path))
+		span['bytes'] = os.path.getsize(input_location+pdf_name)
+	report_progress(progress_callback, 'rasterize', 1, 1)
 	if img_extraction_success(pdf_as_img_dir_path) is True: #verify that the image extraction was successful
 		reference_img = get_reference_image(pdf_as_img_dir_path)
 		correct_dimensions = assert_document_dimensions(reference_img.size[0], reference_img.size[1]) # get size of document
+		if correct_dimensions and grid is not None:
+			return process_grid_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, grid, img_crop_dir_path, img_resize_dir_path, dpi, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter)
+		if correct_dimensions and splitting_mode == AUTO_MODE:
+			with metrics.timed_stage(timings, 'classify'):
+				splitting_mode = classify_layout(reference_img, pdf_name)
 		if correct_dimensions and splitting_mode ==0:
-			return process_4_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, img_crop_dir_path, img_resize_dir_path)
-		if correct_dimensions and (splitting_mode == 1) or (splitting_mode == 2):
-			return process_6_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, splitting_mode, reference_img, img_crop_dir_path, img_resize_dir_path)
+			return process_4_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, img_crop_dir_path, img_resize_dir_path, dpi, layouts, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter)
+		if correct_dimensions and (splitting_mode == 1 or splitting_mode == 2):
+			return process_6_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, splitting_mode, reference_img, img_crop_dir_path, img_resize_dir_path, dpi, layouts, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter)
 		if correct_dimensions and splitting_mode == 3:
-			return process_2_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, half_imgs_dir_path, img_crop_dir_path, img_resize_dir_path)
+			return process_2_slide_pdf(pdf_as_img_dir_path, pdf_name, input_location, output_destination, reference_img, img_crop_dir_path, img_resize_dir_path, dpi, layouts, image_format, jpeg_quality, progress_callback, timings, slides, resize_width, resize_filter)
 		else:
 			logger.error("Incorrect dimensions or incorrect mode")
 			raise Exception("Incorrect dimensions or incorrect mode")
@@ -490,35 +912,70 @@ def process_pdf(pdf_name, input_location, output_destination, splitting_mode, pd
 	logger.error("could not find any imatges")
 	raise Exception("could not find any imatges")
 
+def parse_grid(grid): # "ROWSxCOLUMNS" from the command line, as a (rows, columns) tuple
+	try:
+		rows, columns = [int(value) for value in grid.lower().split('x')]
+	except ValueError:
+		raise argparse.ArgumentTypeError("grid must look like 3x2 (rows x columns)")
+	if rows < 1 or columns < 1:
+		raise argparse.ArgumentTypeError("grid must have at least one row and one column")
+	return (rows, columns)
+
 def get_args(args_list):
 	parser = argparse.ArgumentParser()
 	parser.add_argument('-f', '--filename', type=str)
 	parser.add_argument('-i', '--input_location', type=str)
 	parser.add_argument('-o', '--output_location', type=str)
-	parser.add_argument('-m', '--mode', type=int)
+	parser.add_argument('-m', '--mode', type=int, help='0: 4 slides, 1: 6 slides column by column, 2: 6 slides row by row, 3: 2 slides, 4: find out from the first page')
+	parser.add_argument('--in_memory', action='store_true', help='keep pages in memory instead of temporary directories')
+	parser.add_argument('-w', '--workers', type=int, default=1, help='processes that rasterize, crop, resize and encode pages, more than 1 implies --in_memory and is not available inside the webapp')
+	parser.add_argument('--vector', action='store_true', help='crop the original pdf pages instead of rasterizing them, keeps text sharp')
+	parser.add_argument('-t', '--raster_threads', type=int, default=1, help='pdftoppm processes used to rasterize each window of pages')
+	parser.add_argument('--layout_cache', type=str, help='sqlite database of slide layouts found on earlier documents, reused when the slides are in the same place')
+	parser.add_argument('--grid', type=parse_grid, help='ROWSxCOLUMNS grid of slides on every page, overrides --mode')
+	parser.add_argument('-d', '--dpi', type=int, default=RENDER_DPI, choices=ALLOWED_DPIS, help='resolution the slides are rendered at, slides are found on a lower resolution render either way')
+	parser.add_argument('--image_format', type=str, default=pdf_writer.DEFAULT_IMAGE_FORMAT, choices=pdf_writer.IMAGE_FORMATS, help='compression of the slide images in the output, flate is lossless and jpeg is smaller')
+	parser.add_argument('-q', '--jpeg_quality', type=int, default=pdf_writer.DEFAULT_JPEG_QUALITY, help='1 to 95, only used with --image_format jpeg')
+	parser.add_argument('--pages', type=parse_page_ranges, help='only split these pages, like 1-3,7,10- (first page is 1), slides are found on the first of them')
+	parser.add_argument('--slides', type=parse_slide_indexes, help='only keep these slides of every page, like 1,3 (numbered in the order the mode puts them in the output)')
+	parser.add_argument('--resize_width', type=int, help='width in pixels slides are resized to, 500 at 200 dpi by default, slides are drawn the same size on the page either way')
+	parser.add_argument('--resize_filter', type=str, default=DEFAULT_RESIZE_FILTER, choices=RESIZE_FILTERS, help='from the fastest to the sharpest')
 	return parser.parse_args()
 	
-def main(args):
-	args = get_args(args)
-	failed = False
+# timings, if given, is a list that gets a metrics.timed_stage span for every stage of the split
+# pages, if given, are the page ranges to split and slides the slides to keep of every page, see parse_page_ranges and parse_slide_indexes
+def split_document(pdf_name, input_location, output_destination, splitting_mode, in_memory=False, workers=1, raster_threads=1, vector=False, dpi=RENDER_DPI, layout_cache_path=None, grid=None, image_format=pdf_writer.DEFAULT_IMAGE_FORMAT, jpeg_quality=pdf_writer.DEFAULT_JPEG_QUALITY, progress_callback=None, timings=None, pages=None, slides=None, resize_width=None, resize_filter=DEFAULT_RESIZE_FILTER): # library entry point, runs the whole split inside the calling process
+	layouts = None
+	if layout_cache_path:
+		layouts = layout_cache.LayoutCache(layout_cache_path)
+	if vector:
+		return process_pdf_vector(pdf_name, input_location, output_destination, splitting_mode, layouts, grid, progress_callback, timings, pages, slides)
+	if in_memory or workers > 1:
+		return process_pdf_in_memory(pdf_name, input_location, output_destination, splitting_mode, workers, raster_threads, dpi, layouts, grid, image_format, jpeg_quality, progress_callback, timings, pages, slides, resize_width, resize_filter)
+	pdf_as_img_dir_path = tempfile.mkdtemp()
+	img_crop_dir_path = tempfile.mkdtemp()
+	img_resize_dir_path  = tempfile.mkdtemp()
 	try:
-		pdf_as_img_dir_path = tempfile.mkdtemp()
-		half_imgs_dir_path = tempfile.mkdtemp()
-		img_crop_dir_path = tempfile.mkdtemp()
-		img_resize_dir_path  = tempfile.mkdtemp()
-		return process_pdf(args.filename, args.input_location, args.output_location, args.mode, pdf_as_img_dir_path, half_imgs_dir_path, img_crop_dir_path, img_resize_dir_path)
-	except Exception as err:
-		logger.error("split_pdf.py failed!")
-		logger.error(err)
-		failed = True
+		return process_pdf(pdf_name, input_location, output_destination, splitting_mode, pdf_as_img_dir_path, img_crop_dir_path, img_resize_dir_path, dpi, layouts, grid, image_format, jpeg_quality, progress_callback, timings, pages, slides, resize_width, resize_filter)
 	finally:
 		# delete all the temp files before leaving
 		shutil.rmtree(pdf_as_img_dir_path)
-		shutil.rmtree(half_imgs_dir_path)
 		shutil.rmtree(img_crop_dir_path)
 		shutil.rmtree(img_resize_dir_path)
-		if failed:
-			exit(-1)
+
+def split_document_with_timings(*args, **kwargs): # split_document for callers in another process, returns the output filename and the stage timings of the split
+	timings = []
+	output_filename = split_document(*args, timings=timings, **kwargs)
+	return output_filename, timings
+
+def main(args):
+	args = get_args(args)
+	try:
+		return split_document(args.filename, args.input_location, args.output_location, args.mode, args.in_memory, args.workers, args.raster_threads, args.vector, args.dpi, args.layout_cache, args.grid, args.image_format, args.jpeg_quality, pages=args.pages, slides=args.slides, resize_width=args.resize_width, resize_filter=args.resize_filter)
+	except Exception as err:
+		logger.error("split_pdf.py failed!")
+		logger.error(err)
+		exit(-1)
 
 	
 if __name__ == '__main__':
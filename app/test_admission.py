@@ -0,0 +1,20 @@
+import admission
+
+
+def test_split_cost_grows_with_the_square_of_the_dpi():
+    assert admission.split_cost(10, {}) == 10
+    assert admission.split_cost(10, {'dpi': 100}) == 2.5
+    assert admission.split_cost(10, {'dpi': 300}) == 22.5
+    assert admission.split_cost(10, {'vector': True, 'dpi': 300}) == 10 * admission.VECTOR_PAGE_COST
+
+
+def test_token_bucket_allows_a_burst_then_the_rate(tmpdir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "time", lambda: now[0])
+    limiter = admission.RateLimiter(str(tmpdir.join("rate_limits.sqlite")), 0.5, 3)
+    assert [limiter.acquire("1.2.3.4") for i in range(0, 3)] == [0, 0, 0]
+    assert limiter.acquire("1.2.3.4") == 2
+    assert limiter.acquire("5.6.7.8") == 0 # every client has its own bucket
+    now[0] += 2
+    assert limiter.acquire("1.2.3.4") == 0
+    assert limiter.acquire("1.2.3.4") == 2
@@ -0,0 +1,36 @@
+import pytest
+import os
+import zipfile
+import batch
+import split_pdf
+
+
+def test_collect_pdfs(tmpdir):
+    handouts = tmpdir.mkdir("handouts")
+    for filename in ["b.pdf", "a.PDF", "notes.txt"]:
+        handouts.join(filename).write("%PDF-1.4")
+    tmpdir.join("c.pdf").write("%PDF-1.4")
+    pdf_paths = batch.collect_pdfs([str(handouts), str(tmpdir.join("*.pdf")), str(handouts.join("b.pdf")), str(tmpdir.join("missing.pdf"))])
+    assert pdf_paths == [str(handouts.join("a.PDF")), str(handouts.join("b.pdf")), str(tmpdir.join("c.pdf")), str(tmpdir.join("missing.pdf"))]
+
+
+def test_split_batch_reports_every_file(tmpdir, monkeypatch):
+    def fake_split_document(pdf_name, input_location, output_destination, splitting_mode, **split_options):
+        if pdf_name == "broken.pdf":
+            raise Exception("Failed to extract images from pdf")
+        assert split_options == {'dpi': 100}
+        return "new_"+pdf_name
+    monkeypatch.setattr(split_pdf, "split_document", fake_split_document)
+    results = batch.split_batch([str(tmpdir.join("a.pdf")), str(tmpdir.join("broken.pdf"))], str(tmpdir)+"/", 4, dpi=100)
+    assert [(result.output_filename, result.error) for result in results] == [("new_a.pdf", None), (None, "Failed to extract images from pdf")]
+    with pytest.raises(Exception):
+        batch.split_batch([str(tmpdir.join("a.pdf")), str(tmpdir.join("other", "a.pdf"))], str(tmpdir)+"/", 4)
+
+
+def test_write_zip(tmpdir):
+    tmpdir.join("new_a.pdf").write("first")
+    tmpdir.join("new_b.pdf").write("second")
+    zip_path = batch.write_zip([str(tmpdir.join("new_a.pdf")), str(tmpdir.join("new_b.pdf"))], str(tmpdir.join("batch.zip")))
+    zip_file = zipfile.ZipFile(zip_path)
+    assert sorted(zip_file.namelist()) == ["new_a.pdf", "new_b.pdf"]
+    assert zip_file.read("new_b.pdf") == "second"
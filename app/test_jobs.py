@@ -0,0 +1,173 @@
+import pytest
+import threading
+import time
+import jobs
+
+
+def wait_for_job(job_queue, job_id):
+    for i in range(0, 200):
+        if job_queue.get(job_id).is_finished():
+            return job_queue.get(job_id)
+        time.sleep(0.01)
+    raise Exception("job did not finish")
+
+
+@pytest.fixture
+def database_path(tmpdir):
+    return str(tmpdir.join("jobs.sqlite"))
+
+
+@pytest.fixture
+def job_queues():
+    started_job_queues = []
+    yield started_job_queues
+    for job_queue in started_job_queues:
+        job_queue.stop()
+
+
+def failing_job(value):
+    raise Exception("failed on " + str(value))
+
+
+def insert_running_job(database_path, job_id, started_at, cost=1, dedup_key=None): # a job marked running since started_at, like a worker that claimed it would
+    import sqlite3
+    connection = sqlite3.connect(database_path)
+    with connection:
+        connection.execute("INSERT INTO jobs (job_id, args, status, created_at, started_at, cost, dedup_key) VALUES (?, ?, ?, ?, ?, ?, ?)", (job_id, "[1]", jobs.JOB_RUNNING, started_at, started_at, cost, dedup_key))
+    connection.close()
+
+
+def test_job_done(database_path, job_queues):
+    job_queue = jobs.JobQueue(lambda value: value * 2, 1, 5, database_path, poll_interval=0.01)
+    job_queues.append(job_queue)
+    job = wait_for_job(job_queue, job_queue.submit(21))
+    assert job.status == jobs.JOB_DONE
+    assert job.result == 42
+
+
+def test_job_failed(database_path, job_queues):
+    job_queue = jobs.JobQueue(failing_job, 1, 5, database_path, poll_interval=0.01)
+    job_queues.append(job_queue)
+    job = wait_for_job(job_queue, job_queue.submit(1))
+    assert job.status == jobs.JOB_FAILED
+    assert job.error == "failed on 1"
+
+
+def test_queue_full(database_path, job_queues):
+    release = threading.Event()
+    job_queue = jobs.JobQueue(lambda: release.wait(), 1, 1, database_path, poll_interval=0.01)
+    job_queues.append(job_queue)
+    running_job_id = job_queue.submit()
+    while job_queue.get(running_job_id).status != jobs.JOB_RUNNING:
+        time.sleep(0.01)
+    job_queue.submit() # fills the only free slot
+    with pytest.raises(jobs.QueueFullError):
+        job_queue.submit()
+    release.set()
+
+
+def test_unknown_job(database_path, job_queues):
+    job_queue = jobs.JobQueue(lambda: None, 1, 5, database_path, poll_interval=0.01)
+    job_queues.append(job_queue)
+    assert job_queue.get("does-not-exist") is None
+
+
+def test_job_visible_from_another_process_queue(database_path, job_queues):
+    job_queue = jobs.JobQueue(lambda value: value * 2, 1, 5, database_path, poll_interval=0.01)
+    job_queues.append(job_queue)
+    other_process_queue = jobs.JobQueue(None, 0, 5, database_path) # no workers, like an app process that only serves status pages
+    job_queues.append(other_process_queue)
+    job = wait_for_job(other_process_queue, job_queue.submit(21))
+    assert job.status == jobs.JOB_DONE
+    assert job.result == 42
+
+
+def test_job_progress(database_path, job_queues):
+    release = threading.Event()
+    def job(value, progress_callback):
+        progress_callback("crop", 3, 4)
+        release.wait()
+        return value
+    job_queue = jobs.JobQueue(job, 1, 5, database_path, poll_interval=0.01, report_progress=True)
+    job_queues.append(job_queue)
+    job_id = job_queue.submit(1)
+    for i in range(0, 200):
+        if job_queue.get(job_id).progress is not None:
+            break
+        time.sleep(0.01)
+    assert job_queue.get(job_id).progress == {'stage': 'crop', 'done': 3, 'total': 4}
+    release.set()
+    assert wait_for_job(job_queue, job_id).status == jobs.JOB_DONE
+
+
+def test_job_progress_is_throttled_within_a_stage(database_path, job_queues):
+    job_queue = jobs.JobQueue(None, 0, 5, database_path)
+    job_queues.append(job_queue)
+    job_id = job_queue.submit()
+    job_queue._claim(job_queue._connect())
+    progress = jobs.JobProgress(database_path, job_id)
+    progress("crop", 1, 10)
+    progress("crop", 2, 10) # too soon after the last write
+    assert job_queue.get(job_id).progress == {'stage': 'crop', 'done': 1, 'total': 10}
+    progress("resize", 1, 10) # a new stage is always written
+    assert job_queue.get(job_id).progress == {'stage': 'resize', 'done': 1, 'total': 10}
+
+
+def test_identical_jobs_share_a_job_while_it_runs(database_path, job_queues):
+    release = threading.Event()
+    job_queue = jobs.JobQueue(lambda value: release.wait() and value, 1, 5, database_path, poll_interval=0.01)
+    job_queues.append(job_queue)
+    job_id = job_queue.submit_unique("key", 1)
+    assert job_queue.submit_unique("key", 1) == job_id
+    assert job_queue.submit_unique("other key", 1) != job_id
+    assert job_queue.submit(1) != job_id
+    release.set()
+    wait_for_job(job_queue, job_id)
+    assert job_queue.submit_unique("key", 1) != job_id
+
+
+def test_identical_jobs_are_not_attached_to_a_stale_job(database_path, job_queues):
+    job_queue = jobs.JobQueue(lambda value: value, 0, 10, database_path, max_running_seconds=60)
+    job_queues.append(job_queue)
+    insert_running_job(database_path, "live", time.time(), dedup_key="live key")
+    insert_running_job(database_path, "stale", time.time() - 120, dedup_key="stale key")
+    assert job_queue.submit_unique("live key", 1) == "live"
+    job_id = job_queue.submit_unique("stale key", 1)
+    assert job_id != "stale"
+    assert job_queue.get(job_id).status == jobs.JOB_QUEUED
+
+
+def test_jobs_over_the_cost_budget_are_turned_away(database_path, job_queues):
+    release = threading.Event()
+    job_queue = jobs.JobQueue(lambda: release.wait(), 1, 10, database_path, poll_interval=0.01, max_queued_cost=10)
+    job_queues.append(job_queue)
+    job_queue.submit_unique(None, cost=6)
+    job_queue.submit_unique(None, cost=4)
+    assert job_queue.outstanding_cost() == 10
+    with pytest.raises(jobs.QueueFullError):
+        job_queue.submit_unique(None, cost=1)
+    release.set()
+
+
+def test_stale_running_jobs_do_not_use_up_the_cost_budget(database_path, job_queues):
+    job_queue = jobs.JobQueue(lambda value: value, 0, 10, database_path, max_queued_cost=100, max_running_seconds=60)
+    job_queues.append(job_queue)
+    insert_running_job(database_path, "stale", time.time() - 120, cost=90)
+    assert job_queue.outstanding_cost() == 0
+    job_queue.submit_unique(None, 1, cost=20)
+    assert job_queue.get("stale").status == jobs.JOB_FAILED
+    assert job_queue.get("stale").error == jobs.STALE_JOB_ERROR
+
+
+def test_jobs_wait_for_room_under_the_running_cost(database_path, job_queues):
+    release = threading.Event()
+    job_queue = jobs.JobQueue(lambda: release.wait(), 2, 10, database_path, poll_interval=0.01, max_running_cost=5)
+    job_queues.append(job_queue)
+    first_job_id = job_queue.submit_unique(None, cost=4)
+    second_job_id = job_queue.submit_unique(None, cost=4)
+    while job_queue.get(first_job_id).status != jobs.JOB_RUNNING:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert job_queue.get(second_job_id).status == jobs.JOB_QUEUED # a free worker is not enough, the running cost would be 8
+    release.set()
+    assert wait_for_job(job_queue, second_job_id).status == jobs.JOB_DONE
@@ -0,0 +1,32 @@
+import pytest
+import layout_cache
+
+
+@pytest.fixture
+def database_path(tmpdir):
+    return str(tmpdir.join("layouts.sqlite"))
+
+
+def test_candidates_prefer_same_fingerprint(database_path):
+    layouts = layout_cache.LayoutCache(database_path)
+    layouts.add((850, 1100), 0, "aa", [[1, 2, 3, 4]])
+    layouts.add((850, 1100), 0, "bb", [[5, 6, 7, 8]])
+    layouts.add((1700, 2200), 0, "aa", [[9, 9, 9, 9]])
+    layouts.add((850, 1100), 3, "aa", [[9, 9, 9, 9]])
+    assert layouts.candidates((850, 1100), 0, "aa") == [[[1, 2, 3, 4]], [[5, 6, 7, 8]]]
+    assert layouts.candidates((850, 1100), 0, "bb") == [[[5, 6, 7, 8]], [[1, 2, 3, 4]]]
+
+
+def test_least_recently_used_layouts_are_forgotten(database_path):
+    layouts = layout_cache.LayoutCache(database_path, max_layouts=2)
+    layouts.add((850, 1100), 0, "aa", [[1, 1, 1, 1]])
+    layouts.add((850, 1100), 0, "aa", [[2, 2, 2, 2]])
+    layouts.add((850, 1100), 0, "aa", [[1, 1, 1, 1]]) # used again
+    layouts.add((850, 1100), 0, "aa", [[3, 3, 3, 3]])
+    assert sorted(layouts.candidates((850, 1100), 0, "aa")) == [[[1, 1, 1, 1]], [[3, 3, 3, 3]]]
+
+
+def test_unusable_database_is_ignored(tmpdir):
+    layouts = layout_cache.LayoutCache(str(tmpdir.join("missing_dir", "layouts.sqlite")))
+    layouts.add((850, 1100), 0, "aa", [[1, 2, 3, 4]])
+    assert layouts.candidates((850, 1100), 0, "aa") == []
@@ -0,0 +1,37 @@
+import pytest
+import metrics
+
+
+def test_timed_stage_records_a_span():
+    timings = []
+    with metrics.timed_stage(timings, "render", 3) as span:
+        span['bytes'] = 1024
+    assert len(timings) == 1
+    assert timings[0]['stage'] == "render"
+    assert (timings[0]['pages'], timings[0]['bytes']) == (3, 1024)
+    assert timings[0]['seconds'] >= 0
+    assert timings[0]['max_rss_bytes'] > 0
+
+
+def test_timed_stage_skips_failed_blocks():
+    timings = []
+    with pytest.raises(ValueError):
+        with metrics.timed_stage(timings, "crop"):
+            raise ValueError("bad page")
+    assert timings == []
+
+
+def test_metrics_store_renders_cumulative_histograms(tmpdir):
+    store = metrics.MetricsStore(str(tmpdir.join("metrics.sqlite")), buckets=[1, 10])
+    store.record_job("done", [{'stage': "crop", 'seconds': 0.5, 'pages': 4, 'bytes': None, 'max_rss_bytes': 100}])
+    store.record_job("done", [{'stage': "crop", 'seconds': 5, 'pages': 2, 'bytes': None, 'max_rss_bytes': 50}])
+    store.record_job("failed", [])
+    lines = store.render().splitlines()
+    assert 'pdf_splitter_jobs_total{status="done"} 2' in lines
+    assert 'pdf_splitter_jobs_total{status="failed"} 1' in lines
+    assert 'pdf_splitter_stage_seconds_bucket{stage="crop",le="1"} 1' in lines
+    assert 'pdf_splitter_stage_seconds_bucket{stage="crop",le="10"} 2' in lines
+    assert 'pdf_splitter_stage_seconds_bucket{stage="crop",le="+Inf"} 2' in lines
+    assert 'pdf_splitter_stage_seconds_sum{stage="crop"} 5.5' in lines
+    assert 'pdf_splitter_stage_pages_total{stage="crop"} 6' in lines
+    assert 'pdf_splitter_stage_max_rss_bytes{stage="crop"} 100' in lines
@@ -0,0 +1,34 @@
+import numpy
+import pytest
+from PIL import Image
+import page_store
+
+
+@pytest.fixture
+def page_img():
+    return Image.fromarray(numpy.random.RandomState(0).randint(0, 256, (40, 30, 3)).astype(numpy.uint8))
+
+
+def test_mapped_page_matches_pil(page_img, tmpdir):
+    path = str(tmpdir.join("page.ppm"))
+    page_img.save(path, 'PPM')
+    pixels = page_store.map_ppm(path)
+    assert pixels.shape == (40, 30, 3)
+    assert (pixels == numpy.asarray(page_img)).all()
+
+
+def test_header_comments_and_grayscale(tmpdir):
+    path = str(tmpdir.join("page.pgm"))
+    with open(path, 'wb') as ppm_file:
+        ppm_file.write("P5\n# made by hand\n3 2\n255\n" + "".join(chr(value) for value in range(6)))
+    assert page_store.map_ppm(path).tolist() == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_written_crop_opens_in_pil(page_img, tmpdir):
+    path = str(tmpdir.join("slide.ppm"))
+    page_store.write_ppm(path, page_store.crop_pixels(numpy.asarray(page_img), [5, 10, 20, 15]))
+    assert (numpy.asarray(Image.open(path)) == numpy.asarray(page_img.crop((5, 10, 25, 25)))).all()
+
+
+def test_gray_pixels_match_pil(page_img):
+    assert (page_store.gray_pixels(numpy.asarray(page_img)) == numpy.asarray(page_img.convert('L'))).all()
@@ -0,0 +1,44 @@
+import pytest
+import os
+import PIL
+import PIL.ImageDraw
+from PyPDF2 import PdfFileReader
+import pdf_writer
+
+
+def draw_slide(label):
+    image = PIL.Image.new('RGB', (500, 374), (255, 255, 255))
+    PIL.ImageDraw.Draw(image).rectangle([20, 20, 20 + 40 * label, 60], fill=(200, 30, 30))
+    return image
+
+
+def write_pdf(path, encoded_images):
+    with open(path, 'wb') as output_file:
+        writer = pdf_writer.PdfWriter(output_file, (612, 792))
+        for encoded_image in encoded_images:
+            writer.add_image_page(encoded_image, 50, 250, 500)
+        writer.close()
+    return PdfFileReader(open(path, 'rb'))
+
+
+def test_pages_show_their_image(tmpdir):
+    reader = write_pdf(str(tmpdir.join("out.pdf")), [pdf_writer.encode_image(draw_slide(label)) for label in [1, 2]])
+    assert reader.getNumPages() == 2
+    page = reader.getPage(1)
+    assert [float(value) for value in page.mediaBox] == [0, 0, 612, 792]
+    image = page['/Resources']['/XObject']['/Im0'].getObject()
+    assert (image['/Width'], image['/Height'], image['/Filter']) == (500, 374, '/FlateDecode')
+    assert image.getData() == draw_slide(2).tobytes()
+
+
+def test_identical_images_are_written_once(tmpdir):
+    encoded_images = [pdf_writer.encode_image(draw_slide(label), 'jpeg') for label in [1, 1, 2]]
+    reader = write_pdf(str(tmpdir.join("out.pdf")), encoded_images)
+    image_ids = [reader.getPage(i)['/Resources']['/XObject'].raw_get('/Im0').idnum for i in range(0, 3)]
+    assert image_ids[0] == image_ids[1] != image_ids[2]
+    assert reader.getPage(0)['/Resources']['/XObject']['/Im0']['/Filter'] == '/DCTDecode'
+
+
+def test_unknown_image_format():
+    with pytest.raises(Exception):
+        pdf_writer.encode_image(draw_slide(1), 'png')
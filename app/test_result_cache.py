@@ -0,0 +1,54 @@
+import pytest
+import os
+import result_cache
+
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    return str(tmpdir.join("result_cache"))
+
+
+def write_file(path, contents):
+    with open(path, 'wb') as output_file:
+        output_file.write(contents)
+    return path
+
+
+def test_make_key_depends_on_mode_and_options():
+    key = result_cache.make_key("abc", 3, {'vector': True})
+    assert key == result_cache.make_key("abc", "3", {'vector': True})
+    assert key != result_cache.make_key("abc", 0, {'vector': True})
+    assert key != result_cache.make_key("abc", 3, {})
+    assert key != result_cache.make_key("abd", 3, {'vector': True})
+
+
+def test_hash_file(tmpdir):
+    first_path = write_file(str(tmpdir.join("a.pdf")), b"%PDF-1.4 same bytes")
+    second_path = write_file(str(tmpdir.join("b.pdf")), b"%PDF-1.4 same bytes")
+    assert result_cache.hash_file(first_path) == result_cache.hash_file(second_path)
+
+
+def test_get_and_put_count_hits_and_misses(cache_dir, tmpdir):
+    cache = result_cache.ResultCache(cache_dir, 1024)
+    output_path = write_file(str(tmpdir.join("new_a.pdf")), b"output")
+    served_path = str(tmpdir.join("served.pdf"))
+    assert not cache.get("key", served_path)
+    cache.put("key", output_path)
+    assert cache.get("key", served_path)
+    assert open(served_path, 'rb').read() == b"output"
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir, tmpdir):
+    cache = result_cache.ResultCache(cache_dir, 250)
+    output_path = write_file(str(tmpdir.join("new_a.pdf")), b"x" * 100)
+    served_path = str(tmpdir.join("served.pdf"))
+    cache.put("first", output_path)
+    cache.put("second", output_path)
+    os.utime(os.path.join(cache_dir, "first.pdf"), (1, 1))
+    os.utime(os.path.join(cache_dir, "second.pdf"), (2, 2))
+    cache.get("first", served_path) # first is now the most recently used
+    cache.put("third", output_path)
+    assert cache.get("first", served_path)
+    assert not cache.get("second", served_path)
+    assert cache.get("third", served_path)
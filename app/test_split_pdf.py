@@ -2,7 +2,9 @@ import pytest
 import os
 import shutil
 import split_pdf
+import numpy
 import PIL
+import PIL.ImageDraw
 
 
 @pytest.fixture()
@@ -15,11 +17,6 @@ def test_temp_dir_abs_path_pdf_as_imgs(test_files_dir):
     return os.path.join(test_files_dir, 'test_temp_dir_pdf_as_imgs/')
 
 
-@pytest.fixture()
-def test_temp_dir_abs_path_half_imgs(test_files_dir):
-    return os.path.join(test_files_dir, 'half_imgs/')
-
-
 @pytest.fixture()
 def test_temp_dir_abs_path_img_crop(test_files_dir):
     return os.path.join(test_files_dir, 'cropped_imgs/')
@@ -64,6 +61,24 @@ def uuid_file_list():
 def indexed_ppm_file_list():
     return ['6.ppm', '11.ppm', '5.ppm', '1.ppm', '9.ppm']
 
+@pytest.fixture
+def four_slide_rects():
+    return [[102, 308, 646, 484], [952, 308, 646, 484], [102, 1408, 646, 484], [952, 1408, 646, 484]]
+
+def draw_four_slide_page(four_slide_rects, dpi):
+    # letter page rendered at the given dpi, with black bordered slides like the ones pdf2image returns
+    scale = dpi / 200.0
+    image = PIL.Image.new('RGB', (int(1700 * scale), int(2200 * scale)), (255, 255, 255))
+    draw = PIL.ImageDraw.Draw(image)
+    for rect in four_slide_rects:
+        x, y, width, height = [int(value * scale) for value in rect]
+        draw.rectangle([x, y, x + width, y + height], outline=(0, 0, 0))
+    return image
+
+@pytest.fixture
+def four_slide_page_img(four_slide_rects):
+    return draw_four_slide_page(four_slide_rects, 200)
+
 
 def delete_all_imgs(temp_dir):
     for filename in os.listdir(temp_dir):
@@ -101,18 +116,17 @@ def test_get_reference_image(two_slide_pdf_abs_path, test_temp_dir_abs_path_pdf_
     delete_all_imgs(test_temp_dir_abs_path_pdf_as_imgs)
 
 
-def test_process_2_slides_pdf(two_slide_pdf_abs_path, test_temp_dir_abs_path_pdf_as_imgs, two_slide_pdf_filename, test_files_dir, test_temp_dir_abs_path_half_imgs, test_temp_dir_abs_path_img_crop, test_temp_dir_abs_path_img_resize):
+def test_process_2_slides_pdf(two_slide_pdf_abs_path, test_temp_dir_abs_path_pdf_as_imgs, two_slide_pdf_filename, test_files_dir, test_temp_dir_abs_path_img_crop, test_temp_dir_abs_path_img_resize):
     split_pdf.extract_images_from_pdf(
         two_slide_pdf_abs_path, test_temp_dir_abs_path_pdf_as_imgs)
     first_img = split_pdf.get_reference_image(
         test_temp_dir_abs_path_pdf_as_imgs)
 
     output_document_filename = split_pdf.process_2_slide_pdf(
-        test_temp_dir_abs_path_pdf_as_imgs, two_slide_pdf_filename, test_files_dir, test_files_dir, first_img, test_temp_dir_abs_path_half_imgs, test_temp_dir_abs_path_img_crop, test_temp_dir_abs_path_img_resize)
+        test_temp_dir_abs_path_pdf_as_imgs, two_slide_pdf_filename, test_files_dir, test_files_dir, first_img, test_temp_dir_abs_path_img_crop, test_temp_dir_abs_path_img_resize)
 
     #cleanup
     delete_all_imgs(test_temp_dir_abs_path_pdf_as_imgs)
-    delete_all_imgs(test_temp_dir_abs_path_half_imgs)
     delete_all_imgs(test_temp_dir_abs_path_img_crop)
     delete_all_imgs(test_temp_dir_abs_path_img_resize)
 
@@ -151,4 +165,310 @@ def sort_file_list_indexed_ppm(indexed_ppm_file_list):
 
 def test_get_filename_int_identifier_from_indexed_ppm():
     int_identifier = split_pdf.get_filename_int_identifier_from_indexed_ppm('11.ppm')
-    assert int_identifier == 11
\ No newline at end of file
+    assert int_identifier == 11
+
+def test_split_document_raises_on_failure(test_files_dir, two_slide_mode):
+    with pytest.raises(Exception):
+        split_pdf.split_document("does_not_exist.pdf", test_files_dir, test_files_dir, two_slide_mode)
+
+def test_find_4_slide_rects(four_slide_page_img, four_slide_rects, four_slide_mode):
+    assert split_pdf.find_slide_rects(four_slide_page_img, "test.pdf", four_slide_mode) == four_slide_rects
+
+def test_generate_resized_slides(four_slide_page_img, four_slide_rects):
+    slides = list(split_pdf.generate_resized_slides([four_slide_page_img, four_slide_page_img], four_slide_rects))
+    assert len(slides) == 8
+    assert slides[0].size == (500, 374)
+
+def test_resized_slides_keep_their_own_aspect_ratio(four_slide_page_img):
+    slide_rects = [[100, 100, 1000, 750], [100, 1000, 1000, 500]] # upper and lower slides of different heights
+    for resize_filter in split_pdf.RESIZE_FILTERS:
+        resized_slides = split_pdf.resize_page_slides(four_slide_page_img, slide_rects, resize_filter=resize_filter)
+        assert [slide.size for slide in resized_slides] == [(500, 375), (500, 250)]
+    assert [slide.size for slide in split_pdf.resize_page_slides(four_slide_page_img, slide_rects, resize_width=800)] == [(800, 600), (800, 400)]
+
+def test_mapped_and_pil_slides_are_resized_alike(four_slide_page_img, four_slide_rects):
+    page_pixels = numpy.asarray(four_slide_page_img)
+    for resize_filter in split_pdf.RESIZE_FILTERS:
+        resized_slides = split_pdf.resize_page_slides(four_slide_page_img, four_slide_rects, resize_filter=resize_filter)
+        for slide, rect in zip(resized_slides, four_slide_rects):
+            expected = split_pdf.resize_slide_pixels(split_pdf.page_store.crop_pixels(page_pixels, rect), resize_filter=resize_filter) # how the disk path resizes
+            assert slide.tobytes() == expected.tobytes()
+
+def test_create_new_document_from_images(four_slide_page_img, four_slide_rects, tmpdir):
+    slides = split_pdf.generate_resized_slides([four_slide_page_img], four_slide_rects)
+    output_filename = split_pdf.create_new_document_from_images("test.pdf", slides, str(tmpdir) + "/")
+    assert output_filename == "new_test.pdf"
+    assert os.listdir(str(tmpdir)) == [output_filename]
+
+def test_failed_document_leaves_no_partial_output(tmpdir):
+    with pytest.raises(AssertionError):
+        split_pdf.create_new_document_from_images("test.pdf", [], str(tmpdir) + "/")
+    assert os.listdir(str(tmpdir)) == []
+
+def test_progress_is_reported_per_stage(four_slide_page_img, four_slide_rects, tmpdir):
+    pages_dir, crop_dir, resize_dir = [str(tmpdir.mkdir(name)) for name in ["pages", "crop", "resize"]]
+    for page_number in range(0, 2):
+        four_slide_page_img.save(os.path.join(pages_dir, "page-" + str(page_number) + ".ppm"))
+    events = []
+    progress_callback = lambda stage, done, total: events.append((stage, done, total))
+    split_pdf.crop_images(pages_dir, crop_dir, four_slide_rects, progress_callback=progress_callback)
+    split_pdf.resize_images(crop_dir, resize_dir, progress_callback=progress_callback)
+    split_pdf.create_new_document("test.pdf", resize_dir, str(tmpdir) + "/", progress_callback=progress_callback)
+    assert events == [("crop", 1, 2), ("crop", 2, 2)] + [("resize", done, 8) for done in range(1, 9)] + [("render", done, 8) for done in range(1, 9)]
+
+def test_disk_stages_are_timed(four_slide_page_img, four_slide_rects, tmpdir):
+    pages_dir, crop_dir, resize_dir = [str(tmpdir.mkdir(name)) for name in ["pages", "crop", "resize"]]
+    four_slide_page_img.save(os.path.join(pages_dir, "page-0.ppm"))
+    timings = []
+    output_filename = split_pdf.crop_resize_and_create_document("test.pdf", pages_dir, str(tmpdir) + "/", four_slide_rects, None, crop_dir, resize_dir, timings=timings)
+    assert [(span['stage'], span['pages']) for span in timings] == [("crop", 1), ("resize", 4), ("render", 4)]
+    assert timings[-1]['bytes'] == os.path.getsize(str(tmpdir.join(output_filename)))
+
+def test_failing_progress_callback_does_not_fail_the_split(four_slide_page_img, four_slide_rects, tmpdir):
+    def progress_callback(stage, done, total):
+        raise Exception("progress database is gone")
+    slides = split_pdf.generate_with_progress(split_pdf.generate_resized_slides([four_slide_page_img], four_slide_rects), progress_callback, "render")
+    assert split_pdf.create_new_document_from_images("test.pdf", slides, str(tmpdir) + "/") == "new_test.pdf"
+
+def test_generate_pdf_pages_windows(monkeypatch):
+    rendered_windows = []
+    def fake_convert_from_path(pdf_file_path, first_page, last_page, thread_count=1, dpi=200):
+        rendered_windows.append((first_page, last_page))
+        return list(range(first_page, min(last_page, 10) + 1)) # a 10 page document
+    monkeypatch.setattr(split_pdf, "convert_from_path", fake_convert_from_path)
+    assert list(split_pdf.generate_pdf_pages("test.pdf", 4)) == list(range(1, 11))
+    assert rendered_windows == [(1, 4), (5, 8), (9, 12)]
+
+def test_parallel_slides_keep_page_order(monkeypatch, four_slide_page_img, four_slide_rects):
+    def numbered_page(page_number):
+        page_img = four_slide_page_img.copy()
+        PIL.ImageDraw.Draw(page_img).rectangle([200, 400, 200 + 10 * page_number, 410], fill=(120, 120, 120))
+        return page_img
+    def fake_convert_from_path(pdf_file_path, first_page, last_page, thread_count=1, dpi=200):
+        return [numbered_page(page_number) for page_number in range(first_page, min(last_page, 7) + 1)] # a 7 page document
+    monkeypatch.setattr(split_pdf, "convert_from_path", fake_convert_from_path)
+    monkeypatch.setattr(split_pdf, "get_pdf_page_count", lambda pdf_file_path: 7)
+    parallel_slides = list(split_pdf.generate_encoded_slides_in_parallel("test.pdf", 1, four_slide_rects, 3, 2))
+    serial_slides = [split_pdf.encode_slide(slide) for slide in split_pdf.generate_resized_slides(split_pdf.generate_pdf_pages("test.pdf", 2), four_slide_rects)]
+    assert len(parallel_slides) == 28
+    assert parallel_slides == serial_slides
+
+def test_parse_page_ranges_and_slide_indexes():
+    assert split_pdf.parse_page_ranges("10-, 1-3,7,2-4,5") == [(1, 5), (7, 7), (10, None)]
+    assert split_pdf.parse_page_ranges("3-,5-6") == [(3, None)]
+    assert split_pdf.parse_slide_indexes("3,1,3") == [1, 3]
+    for pages in ["", "0-2", "3-1", "a", "1,,2"]:
+        with pytest.raises(split_pdf.argparse.ArgumentTypeError):
+            split_pdf.parse_page_ranges(pages)
+    with pytest.raises(split_pdf.argparse.ArgumentTypeError):
+        split_pdf.parse_slide_indexes("0,1")
+    assert split_pdf.count_selected_pages([(1, 5), (7, 7), (10, None)], 12) == 9
+    assert split_pdf.count_selected_pages([(20, None)], 12) == 0
+
+def test_generate_pdf_pages_in_page_ranges(monkeypatch):
+    rendered_windows = []
+    def fake_convert_from_path(pdf_file_path, first_page, last_page, thread_count=1, dpi=200):
+        rendered_windows.append((first_page, last_page))
+        return list(range(first_page, min(last_page, 10) + 1)) # a 10 page document
+    monkeypatch.setattr(split_pdf, "convert_from_path", fake_convert_from_path)
+    assert list(split_pdf.generate_pdf_pages("test.pdf", 4, page_ranges=[(2, 3), (5, 7), (9, None)])) == [2, 3, 5, 6, 7, 9, 10]
+    assert rendered_windows == [(2, 3), (5, 7), (9, 12)]
+
+def test_parallel_slides_in_page_ranges(monkeypatch, four_slide_page_img, four_slide_rects):
+    def numbered_page(page_number):
+        page_img = four_slide_page_img.copy()
+        PIL.ImageDraw.Draw(page_img).rectangle([200, 400, 200 + 10 * page_number, 410], fill=(120, 120, 120))
+        return page_img
+    def fake_convert_from_path(pdf_file_path, first_page, last_page, thread_count=1, dpi=200):
+        return [numbered_page(page_number) for page_number in range(first_page, min(last_page, 7) + 1)] # a 7 page document
+    monkeypatch.setattr(split_pdf, "convert_from_path", fake_convert_from_path)
+    monkeypatch.setattr(split_pdf, "get_pdf_page_count", lambda pdf_file_path: 7)
+    page_ranges = [(2, 2), (4, None)]
+    parallel_slides = list(split_pdf.generate_encoded_slides_in_parallel("test.pdf", 1, four_slide_rects, 2, 2, page_ranges=page_ranges, slides=[2, 3]))
+    expected_slides = [split_pdf.encode_slide(slide) for slide in split_pdf.generate_resized_slides([numbered_page(page_number) for page_number in [2, 4, 5, 6, 7]], [four_slide_rects[1], four_slide_rects[2]])]
+    assert len(expected_slides) == 10
+    assert parallel_slides == expected_slides
+
+def test_parallel_slides_rejected_in_daemonic_process(monkeypatch, four_slide_rects):
+    monkeypatch.setattr(split_pdf.multiprocessing.current_process(), "daemon", True)
+    with pytest.raises(Exception):
+        list(split_pdf.generate_encoded_slides_in_parallel("test.pdf", 1, four_slide_rects, 2))
+
+def test_find_2_slide_rects_match_disk_path():
+    # the lower slide is deliberately a different size, both halves are still cropped like the upper one
+    image = PIL.Image.new('RGB', (1700, 2200), (255, 255, 255))
+    draw = PIL.ImageDraw.Draw(image)
+    draw.rectangle([340, 167, 1360, 932], outline=(0, 0, 0))
+    draw.rectangle([400, 1300, 1300, 1975], outline=(0, 0, 0))
+    assert split_pdf.find_slide_rects(image, "test.pdf", 3) == [[340, 167, 1020, 765], [340, 1267, 1020, 765]]
+
+def test_process_2_slides_crops_full_pages(tmpdir):
+    image = PIL.Image.new('RGB', (1700, 2200), (255, 255, 255))
+    draw = PIL.ImageDraw.Draw(image)
+    draw.rectangle([340, 167, 1360, 932], outline=(0, 0, 0))
+    draw.rectangle([340, 1267, 1360, 2032], outline=(0, 0, 0))
+    pages_dir, crop_dir, resize_dir = [str(tmpdir.mkdir(name)) for name in ["pages", "crop", "resize"]]
+    for page_number in range(0, 2):
+        image.save(os.path.join(pages_dir, "page-" + str(page_number) + ".ppm"))
+    timings = []
+    output_filename = split_pdf.process_2_slide_pdf(pages_dir, "test.pdf", str(tmpdir) + "/", str(tmpdir) + "/", image, crop_dir, resize_dir, timings=timings)
+    assert [span['stage'] for span in timings] == ["detect", "crop", "resize", "render"]
+    assert sorted(os.listdir(crop_dir)) == ["0.ppm", "1.ppm", "2.ppm", "3.ppm"]
+    assert (numpy.asarray(PIL.Image.open(os.path.join(crop_dir, "1.ppm"))) == numpy.asarray(image.crop((340, 1267, 1360, 2032)))).all()
+    assert os.path.exists(str(tmpdir.join(output_filename)))
+
+def test_find_slide_rects_rejects_wrong_dimensions(four_slide_page_img):
+    for splitting_mode in [0, 1, 2, 3]:
+        with pytest.raises(Exception):
+            split_pdf.find_slide_rects(four_slide_page_img.resize((1000, 1000)), "test.pdf", splitting_mode)
+
+def test_create_vector_document(four_slide_rects, tmpdir):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from PyPDF2 import PdfFileReader
+    input_path = os.path.join(str(tmpdir), "test.pdf")
+    c = canvas.Canvas(input_path, pagesize=letter)
+    c.showPage()
+    c.showPage()
+    c.save()
+    output_filename = split_pdf.create_vector_document("test.pdf", input_path, four_slide_rects, (1700, 2200), str(tmpdir) + "/")
+    output = PdfFileReader(open(os.path.join(str(tmpdir), output_filename), 'rb'))
+    assert output.getNumPages() == 8
+    # upper left slide of a 1700x2200 image, scaled to a 612x792 point page
+    assert [round(float(value), 2) for value in output.getPage(0).mediaBox] == [36.72, 506.88, 269.28, 681.12]
+
+def test_create_vector_document_selects_pages(four_slide_rects, tmpdir):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from PyPDF2 import PdfFileReader
+    input_path = os.path.join(str(tmpdir), "test.pdf")
+    c = canvas.Canvas(input_path, pagesize=letter)
+    for page_number in range(0, 4):
+        c.showPage()
+    c.save()
+    output_filename = split_pdf.create_vector_document("test.pdf", input_path, split_pdf.select_slides(four_slide_rects, [1, 9]), (1700, 2200), str(tmpdir) + "/", page_ranges=[(2, 2), (4, 9)])
+    output = PdfFileReader(open(os.path.join(str(tmpdir), output_filename), 'rb'))
+    assert output.getNumPages() == 2
+    assert [round(float(value), 2) for value in output.getPage(0).mediaBox] == [36.72, 506.88, 269.28, 681.12]
+
+def test_assert_document_dimensions_any_dpi():
+    assert split_pdf.assert_document_dimensions(1700, 2200)
+    assert split_pdf.assert_document_dimensions(850, 1100)
+    assert split_pdf.assert_document_dimensions(3300, 2550)
+    assert not split_pdf.assert_document_dimensions(1000, 1000)
+
+def test_detect_slide_rects_scales_to_output_dpi(monkeypatch, four_slide_rects, four_slide_mode):
+    rendered_dpis = []
+    def fake_convert_from_path(pdf_file_path, first_page, last_page, thread_count=1, dpi=200):
+        rendered_dpis.append(dpi)
+        return [draw_four_slide_page(four_slide_rects, dpi)]
+    monkeypatch.setattr(split_pdf, "convert_from_path", fake_convert_from_path)
+    slide_rects, page_size, drawn_rects = split_pdf.detect_slide_rects("test.pdf", "test.pdf", four_slide_mode, 300)
+    assert rendered_dpis == [split_pdf.DETECTION_DPI]
+    assert slide_rects == [[value * 3 / 2 for value in rect] for rect in four_slide_rects]
+    assert drawn_rects == slide_rects
+    assert page_size == (2550, 3300)
+
+def test_detect_slide_rects_falls_back_to_output_dpi(monkeypatch, four_slide_rects, four_slide_mode):
+    def fake_convert_from_path(pdf_file_path, first_page, last_page, thread_count=1, dpi=200):
+        if dpi == split_pdf.DETECTION_DPI:
+            return [PIL.Image.new('RGB', (850, 1100), (255, 255, 255))] # slide borders lost at the low dpi
+        return [draw_four_slide_page(four_slide_rects, dpi)]
+    monkeypatch.setattr(split_pdf, "convert_from_path", fake_convert_from_path)
+    assert split_pdf.detect_slide_rects("test.pdf", "test.pdf", four_slide_mode)[0] == four_slide_rects
+
+def test_resized_slides_follow_dpi(four_slide_rects):
+    slides = list(split_pdf.generate_resized_slides([draw_four_slide_page(four_slide_rects, 300)], split_pdf.scale_slide_rects(four_slide_rects, 1.5), 300))
+    assert slides[0].size == (750, 561)
+
+def test_verify_slide_rects(four_slide_page_img, four_slide_rects):
+    assert split_pdf.verify_slide_rects(four_slide_page_img, four_slide_rects)
+    assert split_pdf.verify_slide_rects(four_slide_page_img, [[rect[0] + 1, rect[1], rect[2], rect[3]] for rect in four_slide_rects])
+    assert not split_pdf.verify_slide_rects(four_slide_page_img, [[rect[0] + 10, rect[1], rect[2], rect[3]] for rect in four_slide_rects])
+    assert not split_pdf.verify_slide_rects(four_slide_page_img, [[1600, 2100, 646, 484]])
+
+def test_crop_images_from_mapped_pages_match_pil_crops(four_slide_page_img, four_slide_rects, tmpdir):
+    pages_dir, crop_dir = str(tmpdir.mkdir("pages")), str(tmpdir.mkdir("crop"))
+    four_slide_page_img.save(os.path.join(pages_dir, "page-0.ppm"))
+    split_pdf.crop_images(pages_dir, crop_dir, four_slide_rects, split_pdf.make_page_validator(four_slide_page_img, four_slide_rects, "test.pdf", 0))
+    for i, slide in enumerate(split_pdf.crop_slides(four_slide_page_img, four_slide_rects)):
+        assert (numpy.asarray(PIL.Image.open(os.path.join(crop_dir, str(i) + ".ppm"))) == numpy.asarray(slide)).all()
+
+def test_verify_pages(four_slide_page_img, four_slide_rects):
+    moved_page_img = draw_four_slide_page([[rect[0], rect[1] + 30, rect[2], rect[3]] for rect in four_slide_rects], 200)
+    small_page_img = draw_four_slide_page(four_slide_rects, 100)
+    assert split_pdf.verify_pages([four_slide_page_img, moved_page_img, small_page_img, four_slide_page_img], four_slide_rects).tolist() == [True, False, False, True]
+
+def test_moved_slides_are_found_again(monkeypatch, four_slide_page_img, four_slide_rects, four_slide_mode):
+    moved_rects = [[122, 328, 606, 454], [972, 328, 606, 454], [122, 1418, 606, 454], [972, 1418, 606, 454]]
+    moved_page_img = draw_four_slide_page(moved_rects, 200)
+    validator = split_pdf.make_page_validator(four_slide_page_img, four_slide_rects, "test.pdf", four_slide_mode)
+    detected_pages = []
+    find_slide_rects = split_pdf.find_slide_rects
+    def counting_find_slide_rects(page_img, *args):
+        detected_pages.append(page_img)
+        return find_slide_rects(page_img, *args)
+    monkeypatch.setattr(split_pdf, "find_slide_rects", counting_find_slide_rects)
+    pages = list(split_pdf.generate_validated_pages([four_slide_page_img, moved_page_img, four_slide_page_img], four_slide_rects, validator))
+    assert [page_slide_rects for page_img, page_slide_rects in pages] == [four_slide_rects, moved_rects, four_slide_rects]
+    assert detected_pages == [moved_page_img]
+
+def test_get_reference_image_is_the_first_page(tmpdir):
+    for page_number in [10, 2, 1, 11]:
+        PIL.Image.new('RGB', (100 + page_number, 100)).save(str(tmpdir.join("98d0b582-5b10-4377-8edc-39079905d9f0-"+str(page_number)+".ppm")))
+    assert split_pdf.get_reference_image(str(tmpdir)).size == (101, 100)
+
+def test_find_slide_rects_reuses_cached_layout(monkeypatch, four_slide_page_img, four_slide_rects, four_slide_mode, tmpdir):
+    import layout_cache
+    layouts = layout_cache.LayoutCache(str(tmpdir.join("layouts.sqlite")))
+    assert split_pdf.find_slide_rects(four_slide_page_img, "first.pdf", four_slide_mode, layouts) == four_slide_rects
+    def failing_detection(reference_img, pdf_name):
+        raise Exception("detection should have been skipped")
+    monkeypatch.setattr(split_pdf, "find_4_slide_rects", failing_detection)
+    assert split_pdf.find_slide_rects(four_slide_page_img, "second.pdf", four_slide_mode, layouts) == four_slide_rects
+
+def test_find_slide_rects_detects_when_cached_layout_does_not_match(four_slide_page_img, four_slide_rects, four_slide_mode, tmpdir):
+    import layout_cache
+    layouts = layout_cache.LayoutCache(str(tmpdir.join("layouts.sqlite")))
+    moved_rects = [[rect[0] + 20, rect[1], rect[2], rect[3]] for rect in four_slide_rects]
+    layouts.add(four_slide_page_img.size, four_slide_mode, split_pdf.get_layout_fingerprint(four_slide_page_img), moved_rects)
+    assert split_pdf.find_slide_rects(four_slide_page_img, "test.pdf", four_slide_mode, layouts) == four_slide_rects
+
+def draw_slide_page(slide_rects, noise_boxes=[]):
+    image = PIL.Image.new('RGB', (1700, 2200), (255, 255, 255))
+    draw = PIL.ImageDraw.Draw(image)
+    for rect in slide_rects + noise_boxes:
+        draw.rectangle([rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3]], outline=(0, 0, 0))
+    return image
+
+def test_find_6_slide_rects_picks_the_largest_boxes():
+    left_rects = [[102, 122, 646, 484], [102, 858, 646, 484], [102, 1594, 646, 484]]
+    right_rects = [[952, rect[1], 646, 484] for rect in left_rects]
+    noise_boxes = [[20, 700, 60, 60], [20, 1450, 70, 70], [300, 2120, 80, 60]] # page numbers, logos and the like
+    image = draw_slide_page(left_rects + right_rects, noise_boxes)
+    assert split_pdf.find_slide_rects(image, "test.pdf", 1) == left_rects + right_rects
+    assert split_pdf.find_slide_rects(image, "test.pdf", 2) == [left_rects[0], right_rects[0], left_rects[1], right_rects[1], left_rects[2], right_rects[2]]
+
+def test_find_grid_slide_rects():
+    grid_rects = [[30 + column * 560 + row, 60 + row * 720 + column, 500, 375] for row in range(0, 3) for column in range(0, 3)] # a little crooked
+    image = draw_slide_page(grid_rects, [[1600, 2150, 30, 30]])
+    assert split_pdf.find_slide_rects(image, "test.pdf", None, grid=(3, 3)) == grid_rects
+    with pytest.raises(Exception):
+        split_pdf.find_slide_rects(image, "test.pdf", None, grid=(4, 3))
+
+def test_classify_layout(four_slide_rects):
+    two_slide_rects = [[340, 110, 1020, 765], [340, 1210, 1020, 765]]
+    six_slide_rects = [[102, 122, 646, 484], [102, 858, 646, 484], [102, 1594, 646, 484], [952, 122, 646, 484], [952, 858, 646, 484], [952, 1594, 646, 484]]
+    assert split_pdf.classify_layout(draw_slide_page(two_slide_rects), "test.pdf") == 3
+    assert split_pdf.classify_layout(draw_four_slide_page(four_slide_rects, 100), "test.pdf") == 0
+    assert split_pdf.classify_layout(draw_slide_page(six_slide_rects, [[20, 700, 60, 60]]), "test.pdf") == 2
+    with pytest.raises(Exception):
+        split_pdf.classify_layout(draw_slide_page([]), "test.pdf")
+
+def test_auto_mode_splits_mixed_decks(four_slide_page_img, four_slide_rects):
+    six_slide_rects = [[102, 122, 646, 484], [952, 122, 646, 484], [102, 858, 646, 484], [952, 858, 646, 484], [102, 1594, 646, 484], [952, 1594, 646, 484]]
+    slide_rects = split_pdf.find_slide_rects(four_slide_page_img, "test.pdf", split_pdf.AUTO_MODE)
+    assert slide_rects == four_slide_rects
+    validator = split_pdf.make_page_validator(four_slide_page_img, slide_rects, "test.pdf", split_pdf.AUTO_MODE)
+    pages = split_pdf.generate_validated_pages([four_slide_page_img, draw_slide_page(six_slide_rects)], slide_rects, validator)
+    assert [page_slide_rects for page_img, page_slide_rects in pages] == [four_slide_rects, six_slide_rects]
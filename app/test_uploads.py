@@ -0,0 +1,29 @@
+import pytest
+import os
+import result_cache
+import uploads
+
+
+def test_upload_that_is_not_a_pdf_is_rejected_after_its_first_kilobyte(tmpdir):
+    upload_file = uploads.HashingUploadFile(str(tmpdir), "page.pdf")
+    with pytest.raises(uploads.UploadRejected):
+        upload_file.write(b"<html>" * 1000)
+    assert tmpdir.listdir() == []
+
+
+def test_kept_upload_is_renamed_and_hashed_like_hash_file(tmpdir):
+    upload_file = uploads.HashingUploadFile(str(tmpdir), "notes.pdf")
+    upload_file.write(b"%PDF-1.4 ")
+    upload_file.write(b"x" * 5000)
+    upload_file.keep(str(tmpdir.join("notes.pdf")))
+    upload_file.close()
+    assert [path.basename for path in tmpdir.listdir()] == ["notes.pdf"]
+    assert upload_file.content_hash() == result_cache.hash_file(str(tmpdir.join("notes.pdf")))
+
+
+def test_short_upload_without_pdf_header_is_not_kept(tmpdir):
+    upload_file = uploads.HashingUploadFile(str(tmpdir), "short.pdf")
+    upload_file.write(b"not a pdf")
+    with pytest.raises(uploads.UploadRejected):
+        upload_file.keep(str(tmpdir.join("short.pdf")))
+    assert tmpdir.listdir() == []
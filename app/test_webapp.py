@@ -0,0 +1,286 @@
+import pytest
+import imp
+import os
+import sys
+
+
+@pytest.fixture(scope='module')
+def webapp():
+    repo_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    sys.path.insert(0, repo_dir)
+    webapp = imp.load_source('webapp', os.path.join(repo_dir, '__init__.py'))
+    webapp.app.root_path = repo_dir # templates are rendered from the checkout, not from the production root
+    return webapp
+
+
+@pytest.fixture(autouse=True)
+def rate_limiter(webapp, tmpdir, monkeypatch):
+    limiter = webapp.admission.RateLimiter(str(tmpdir.join("rate_limits.sqlite")), 1, 100)
+    monkeypatch.setattr(webapp, "rate_limiter", limiter)
+    return limiter
+
+
+WORKSPACE_ID = "0123456789abcdef0123456789abcdef"
+
+
+def test_call_pdf_splitter_reraises_worker_failure(webapp, tmpdir, monkeypatch):
+    monkeypatch.setattr(webapp, "file_output_location_absolute", str(tmpdir) + "/")
+    with pytest.raises(Exception) as excinfo:
+        webapp.call_pdf_splitter(WORKSPACE_ID + "/does_not_exist.pdf", "3")
+    assert "splitter failed on " + WORKSPACE_ID + "/does_not_exist.pdf" in str(excinfo.value)
+
+
+def test_call_pdf_splitter_recycles_worker_on_timeout(webapp, tmpdir, monkeypatch):
+    monkeypatch.setattr(webapp, "SPLITTER_TIMEOUT", 0)
+    monkeypatch.setattr(webapp, "file_output_location_absolute", str(tmpdir) + "/")
+    timed_out_pool = webapp.get_splitter_pool()
+    with pytest.raises(Exception) as excinfo:
+        webapp.call_pdf_splitter(WORKSPACE_ID + "/does_not_exist.pdf", "3")
+    assert "splitter timed out on " + WORKSPACE_ID + "/does_not_exist.pdf" in str(excinfo.value)
+    assert webapp.get_splitter_pool() is not timed_out_pool
+
+
+def test_unknown_job_status_is_json_404(webapp, tmpdir, monkeypatch):
+    monkeypatch.setattr(webapp, "jobs_database_path", str(tmpdir.join("jobs.sqlite")))
+    monkeypatch.setattr(webapp, "job_queue", None)
+    response = webapp.app.test_client().get('/jobs/does-not-exist/status')
+    webapp.job_queue.stop()
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 'unknown'
+
+
+def test_get_split_options_only_allows_known_dpis(webapp):
+    from werkzeug.datastructures import MultiDict
+    assert webapp.get_split_options(MultiDict({'dpi': '300', 'vector': '1'})) == {'dpi': 300, 'vector': True}
+    assert webapp.get_split_options(MultiDict({'dpi': '5000'})) == {}
+    assert webapp.get_split_options(MultiDict({'dpi': 'high'})) == {}
+    assert webapp.get_split_options(MultiDict({'image_format': 'jpeg'})) == {'image_format': 'jpeg'}
+    assert webapp.get_split_options(MultiDict({'image_format': 'tiff'})) == {}
+    assert webapp.get_split_options(MultiDict({'resize_filter': 'area'})) == {'resize_filter': 'area'}
+    assert webapp.get_split_options(MultiDict({'resize_filter': 'cubic'})) == {}
+    assert webapp.get_split_options(MultiDict({'pages': '5-, 1-2', 'slides': '1,3'})) == {'pages': [(1, 2), (5, None)], 'slides': [1, 3]}
+    assert webapp.get_split_options(MultiDict({'pages': '2-1', 'slides': 'first', 'dpi': '150'})) == {'dpi': 150}
+
+
+def test_repeated_upload_is_served_from_the_result_cache(webapp, tmpdir, monkeypatch):
+    from io import BytesIO
+    upload_dir = tmpdir.mkdir("uploaded_files")
+    served_dir = tmpdir.mkdir("served_files")
+    monkeypatch.setitem(webapp.app.config, 'UPLOAD_FOLDER', str(upload_dir))
+    monkeypatch.setattr(webapp, "file_input_location_absolute", str(upload_dir) + "/")
+    monkeypatch.setattr(webapp, "file_output_location_absolute", str(served_dir) + "/")
+    monkeypatch.setattr(webapp, "results", webapp.result_cache.ResultCache(str(tmpdir.join("result_cache")), 1024 * 1024))
+    upload_dir.mkdir(WORKSPACE_ID).join("notes.pdf").write("%PDF-1.4 notes")
+    served_dir.join("new_notes.pdf").write("split notes")
+    webapp.get_result_cache().put(webapp.get_result_cache_key(WORKSPACE_ID + "/notes.pdf", "3", {}), str(served_dir.join("new_notes.pdf")))
+    response = webapp.app.test_client().post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 notes"), "other_name.pdf")})
+    output_path = response.headers['Location'].split('/fixed/')[1]
+    assert output_path.endswith('/new_other_name.pdf') and webapp.is_output_path(output_path)
+    assert served_dir.join(output_path).read() == "split notes"
+
+
+class FakeJobQueue(object):
+    def __init__(self):
+        self.submitted = []
+        self.jobs = {}
+
+    def queued_count(self):
+        return 0
+
+    def outstanding_cost(self):
+        return 40
+
+    def submit(self, *args):
+        self.submitted.append(args)
+        return "job-"+str(len(self.submitted))
+
+    def submit_unique(self, dedup_key, *args, **options):
+        return self.submit(*args)
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+
+def test_batch_upload_queues_every_pdf_and_zips_the_outputs(webapp, tmpdir, monkeypatch):
+    from io import BytesIO
+    upload_dir = tmpdir.mkdir("uploaded_files")
+    served_dir = tmpdir.mkdir("served_files")
+    monkeypatch.setitem(webapp.app.config, 'UPLOAD_FOLDER', str(upload_dir))
+    monkeypatch.setattr(webapp, "file_input_location_absolute", str(upload_dir) + "/")
+    monkeypatch.setattr(webapp, "file_output_location_absolute", str(served_dir) + "/")
+    monkeypatch.setattr(webapp, "results", webapp.result_cache.ResultCache(str(tmpdir.join("result_cache")), 1024 * 1024))
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: 3)
+    queue = FakeJobQueue()
+    monkeypatch.setattr(webapp, "job_queue", queue)
+    client = webapp.app.test_client()
+    response = client.post('/api/batch', data={'mode': '0', 'dpi': '100', 'pdf': [(BytesIO(b"%PDF-1.4 a"), "a.pdf"), (BytesIO(b"%PDF-1.4 b"), "b.pdf"), (BytesIO(b"text"), "c.txt")]})
+    files = response.get_json()['files']
+    assert [(entry['filename'], entry['status']) for entry in files] == [("a.pdf", "queued"), ("b.pdf", "queued"), ("c.txt", "rejected")]
+    assert [(os.path.basename(args[0]), args[1], args[2]) for args in queue.submitted] == [("a.pdf", "0", {'dpi': 100}), ("b.pdf", "0", {'dpi': 100})]
+    assert upload_dir.join(queue.submitted[0][0]).read() == "%PDF-1.4 a"
+
+    zip_url = response.get_json()['zip_url']
+    output_path = webapp.get_output_path(queue.submitted[0][0])
+    queue.jobs = {"job-1": webapp.jobs.Job("job-1", (), webapp.jobs.JOB_DONE, output_path, None, 0, 1), "job-2": webapp.jobs.Job("job-2", (), webapp.jobs.JOB_RUNNING, None, None, 0, None)}
+    assert client.get(zip_url).status_code == 202
+    queue.jobs["job-2"] = webapp.jobs.Job("job-2", (), webapp.jobs.JOB_FAILED, None, "splitter failed", 0, 1)
+    served_dir.join(output_path).write("split a", ensure=True)
+    response = client.get(zip_url)
+    assert response.status_code == 200
+    import zipfile
+    assert zipfile.ZipFile(BytesIO(response.data)).namelist() == ["new_a.pdf"]
+
+
+@pytest.fixture
+def upload_dir(webapp, tmpdir, monkeypatch):
+    upload_dir = tmpdir.mkdir("uploaded_files")
+    monkeypatch.setitem(webapp.app.config, 'UPLOAD_FOLDER', str(upload_dir))
+    monkeypatch.setattr(webapp, "file_input_location_absolute", str(upload_dir) + "/")
+    monkeypatch.setattr(webapp, "file_output_location_absolute", str(tmpdir.mkdir("served_files")) + "/")
+    monkeypatch.setattr(webapp, "results", webapp.result_cache.ResultCache(str(tmpdir.join("result_cache")), 1024 * 1024))
+    monkeypatch.setattr(webapp, "job_queue", FakeJobQueue())
+    return upload_dir
+
+
+def test_upload_that_is_not_a_pdf_is_rejected_while_streaming(webapp, upload_dir):
+    from io import BytesIO
+    response = webapp.app.test_client().post('/', data={'mode': '3', 'pdf': (BytesIO(b"<html>" * 1000), "page.pdf")})
+    assert response.headers['Location'].endswith('/unsuccesful')
+    assert upload_dir.listdir() == []
+    assert webapp.job_queue.submitted == []
+
+
+def test_upload_with_too_many_pages_is_not_queued(webapp, upload_dir, monkeypatch):
+    from io import BytesIO
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: webapp.MAX_PAGES + 1)
+    response = webapp.app.test_client().post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 long"), "long.pdf")})
+    assert response.headers['Location'].endswith('/unsuccesful')
+    assert webapp.job_queue.submitted == []
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: 3)
+    response = webapp.app.test_client().post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 short"), "short.pdf")})
+    assert response.headers['Location'].endswith('/jobs/job-1')
+    assert [(os.path.basename(args[0]), args[1], args[2]) for args in webapp.job_queue.submitted] == [("short.pdf", "3", {})]
+    response = webapp.app.test_client().post('/', data={'mode': '3', 'pages': '7-', 'pdf': (BytesIO(b"%PDF-1.4 short"), "short.pdf")})
+    assert response.headers['Location'].endswith('/unsuccesful') # none of the selected pages are in it
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: webapp.MAX_PAGES + 1)
+    response = webapp.app.test_client().post('/', data={'mode': '3', 'pages': '2-4', 'pdf': (BytesIO(b"%PDF-1.4 long"), "long.pdf")})
+    assert response.headers['Location'].endswith('/jobs/job-2') # only the selected pages count
+
+
+def test_uploads_with_the_same_name_get_their_own_workspace(webapp, upload_dir, monkeypatch):
+    from io import BytesIO
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: 3)
+    client = webapp.app.test_client()
+    client.post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 first"), "lecture1.pdf")})
+    client.post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 second"), "lecture1.pdf")})
+    first_path, second_path = [args[0] for args in webapp.job_queue.submitted]
+    assert first_path != second_path
+    assert upload_dir.join(first_path).read() == "%PDF-1.4 first"
+    assert upload_dir.join(second_path).read() == "%PDF-1.4 second"
+
+
+def test_job_output_is_streamed_while_it_is_written(webapp, tmpdir, monkeypatch):
+    monkeypatch.setattr(webapp, "DOWNLOAD_POLL_INTERVAL", 0)
+    output_path = str(tmpdir.join("new_notes.pdf"))
+    tmpdir.join("new_notes.pdf.part").write("%PDF page 1 ")
+    queue = FakeJobQueue()
+    polls = []
+    def get(job_id):
+        polls.append(job_id)
+        if len(polls) == 3: # the splitter writes the last page and finishes between two polls
+            with open(output_path + ".part", 'a') as partial_output:
+                partial_output.write("page 2 %%EOF")
+            os.rename(output_path + ".part", output_path)
+            return webapp.jobs.Job(job_id, ("notes.pdf",), webapp.jobs.JOB_DONE, "new_notes.pdf", None, 0, 1)
+        return webapp.jobs.Job(job_id, ("notes.pdf",), webapp.jobs.JOB_RUNNING, None, None, 0, None)
+    queue.get = get
+    assert "".join(webapp.generate_job_output(queue, "job-1", output_path)) == "%PDF page 1 page 2 %%EOF"
+
+
+def test_failed_job_output_stream_ends(webapp, tmpdir, monkeypatch):
+    monkeypatch.setattr(webapp, "DOWNLOAD_POLL_INTERVAL", 0)
+    queue = FakeJobQueue()
+    queue.jobs["job-1"] = webapp.jobs.Job("job-1", ("notes.pdf",), webapp.jobs.JOB_FAILED, None, "splitter failed", 0, 1)
+    assert list(webapp.generate_job_output(queue, "job-1", str(tmpdir.join("new_notes.pdf")))) == []
+
+
+def test_job_events_follow_progress_until_done(webapp, monkeypatch):
+    monkeypatch.setattr(webapp, "PROGRESS_POLL_INTERVAL", 0)
+    running = lambda progress: webapp.jobs.Job("job-1", ("notes.pdf",), webapp.jobs.JOB_RUNNING, None, None, 0, None, progress)
+    states = [running(None), running({'stage': 'crop', 'done': 1, 'total': 2}), running({'stage': 'crop', 'done': 1, 'total': 2}), running({'stage': 'crop', 'done': 2, 'total': 2}),
+              webapp.jobs.Job("job-1", ("notes.pdf",), webapp.jobs.JOB_DONE, "new_notes.pdf", None, 0, 1)]
+    queue = FakeJobQueue()
+    queue.get = lambda job_id: states.pop(0)
+    with webapp.app.test_request_context():
+        events = list(webapp.generate_job_events(queue, "job-1"))
+    assert [event.split("\n")[0] for event in events] == ["event: progress", "event: progress", "event: done"]
+    assert '"done": 2' in events[1]
+    assert '"url": "/fixed/new_notes.pdf"' in events[2]
+
+
+def test_job_events_stream_ends_so_that_the_browser_reconnects(webapp, monkeypatch):
+    monkeypatch.setattr(webapp, "EVENT_STREAM_SECONDS", 0)
+    queue = FakeJobQueue()
+    queue.jobs["job-1"] = webapp.jobs.Job("job-1", ("notes.pdf",), webapp.jobs.JOB_RUNNING, None, None, 0, None)
+    with webapp.app.test_request_context():
+        assert list(webapp.generate_job_events(queue, "job-1")) == []
+
+
+def test_unfinished_job_download_goes_to_the_status_page(webapp, upload_dir, monkeypatch):
+    client = webapp.app.test_client()
+    webapp.job_queue.jobs["job-1"] = webapp.jobs.Job("job-1", (WORKSPACE_ID + "/notes.pdf",), webapp.jobs.JOB_RUNNING, None, None, 0, None)
+    webapp.job_queue.jobs["job-2"] = webapp.jobs.Job("job-2", (WORKSPACE_ID + "/notes.pdf",), webapp.jobs.JOB_QUEUED, None, None, 0, None)
+    assert client.get('/jobs/job-1/download').headers['Location'].endswith('/jobs/job-1') # sync workers can not hold a download open
+    monkeypatch.setattr(webapp, "STREAM_DOWNLOADS", True)
+    assert client.get('/jobs/job-2/download').headers['Location'].endswith('/jobs/job-2') # nothing to stream before the job runs
+    monkeypatch.setattr(webapp, "generate_job_output", lambda queue, job_id, output_path: iter(["%PDF page 1 "]))
+    response = client.get('/jobs/job-1/download')
+    assert response.mimetype == 'application/pdf'
+    assert response.data == "%PDF page 1 "
+
+
+def test_metrics_endpoint(webapp, tmpdir, monkeypatch):
+    monkeypatch.setattr(webapp, "metrics_store", webapp.metrics.MetricsStore(str(tmpdir.join("metrics.sqlite"))))
+    webapp.record_split("notes.pdf", "0", "done", 0, [{'stage': "render", 'seconds': 0.2, 'pages': 8, 'bytes': 2048, 'max_rss_bytes': 4096}])
+    response = webapp.app.test_client().get('/metrics')
+    assert response.mimetype == 'text/plain'
+    assert 'pdf_splitter_stage_seconds_bucket{stage="render",le="0.25"} 1' in response.get_data(as_text=True).splitlines()
+
+
+def test_upload_is_turned_away_with_retry_after_when_the_queue_is_full(webapp, upload_dir, monkeypatch):
+    from io import BytesIO
+    def submit_unique(dedup_key, *args, **options):
+        raise webapp.jobs.QueueFullError("Job queue is over its cost budget")
+    monkeypatch.setattr(webapp.job_queue, "submit_unique", submit_unique)
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: 3)
+    response = webapp.app.test_client().post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 busy"), "busy.pdf")})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == "10"
+
+
+def test_clients_behind_the_proxy_get_their_own_upload_rate(webapp, upload_dir, monkeypatch):
+    from io import BytesIO
+    monkeypatch.setattr(webapp, "rate_limiter", webapp.admission.RateLimiter(str(upload_dir.join("rate_limits.sqlite")), 0.01, 1))
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: 3)
+    client = webapp.app.test_client()
+    def upload(client_address):
+        return client.post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 notes"), "notes.pdf")}, headers={'X-Forwarded-For': client_address}, environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code
+    assert upload('203.0.113.1') == 302
+    assert upload('203.0.113.1') == 429
+    assert upload('203.0.113.2') == 302
+
+
+def test_client_over_its_upload_rate_is_turned_away(webapp, upload_dir, monkeypatch):
+    from io import BytesIO
+    monkeypatch.setattr(webapp, "rate_limiter", webapp.admission.RateLimiter(str(upload_dir.join("rate_limits.sqlite")), 0.01, 1))
+    monkeypatch.setattr(webapp.split_pdf, "get_pdf_page_count", lambda path: 3)
+    client = webapp.app.test_client()
+    assert client.post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 first"), "first.pdf")}).status_code == 302
+    response = client.post('/', data={'mode': '3', 'pdf': (BytesIO(b"%PDF-1.4 second"), "second.pdf")})
+    assert response.status_code == 429
+    assert 0 < int(response.headers['Retry-After']) <= 100
+    assert client.post('/api/batch', data={'pdf': [(BytesIO(b"%PDF-1.4 third"), "third.pdf")]}).status_code == 429
+    first_upload_path = webapp.job_queue.submitted[0][0]
+    response = client.get('/uploads/3/'+first_upload_path+'?dpi=300') # saved uploads can not be queued again without an upload
+    assert response.headers['Location'].endswith('/error/') # where the app sends a 404
+    assert len(webapp.job_queue.submitted) == 1
@@ -0,0 +1,40 @@
+import os
+import time
+import workspaces
+
+
+def age(path, seconds):
+    os.utime(str(path), (time.time() - seconds, time.time() - seconds))
+
+
+def make_workspace_with_file(root, size, seconds_old):
+    workspace = root.mkdir(workspaces.new_workspace_id())
+    output = workspace.join("new_a.pdf")
+    output.write("x" * size)
+    age(output, seconds_old)
+    age(workspace, seconds_old)
+    return workspace
+
+
+def test_workspaces_older_than_the_ttl_are_removed(tmpdir):
+    uploads_dir, outputs_dir = tmpdir.mkdir("uploads"), tmpdir.mkdir("outputs")
+    expired = make_workspace_with_file(uploads_dir, 10, 1000)
+    fresh = make_workspace_with_file(outputs_dir, 10, 10)
+    reaper = workspaces.Reaper([str(uploads_dir), str(outputs_dir)], ttl=100, max_bytes=1000, grace=5)
+    assert reaper.reap() == 10
+    assert not expired.check()
+    assert fresh.check()
+
+
+def test_oldest_workspaces_are_removed_first_above_the_quota(tmpdir):
+    outputs_dir = tmpdir.mkdir("outputs")
+    oldest = make_workspace_with_file(outputs_dir, 100, 50)
+    older = make_workspace_with_file(outputs_dir, 100, 40)
+    newest = make_workspace_with_file(outputs_dir, 100, 30)
+    in_use = make_workspace_with_file(outputs_dir, 100, 0)
+    reaper = workspaces.Reaper([str(outputs_dir)], ttl=1000, max_bytes=250, grace=20)
+    reaper.reap()
+    assert [oldest.check(), older.check(), newest.check(), in_use.check()] == [False, False, True, True]
+    reaper = workspaces.Reaper([str(outputs_dir)], ttl=1000, max_bytes=0, grace=20)
+    reaper.reap()
+    assert [newest.check(), in_use.check()] == [False, True] # the quota never removes a workspace within its grace period
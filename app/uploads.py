@@ -0,0 +1,57 @@
+## Uploaded files are written to the upload folder while werkzeug parses the request, and hashed on the way
+## an upload that does not start like a pdf is rejected as soon as its first kilobyte is in, the rest of it is never read
+
+import hashlib
+import os
+import tempfile
+
+PDF_MAGIC = b'%PDF-'
+PDF_HEADER_SEARCH_BYTES = 1024 # pdf readers accept the header anywhere in the first kilobyte
+
+
+class UploadRejected(Exception): # raised while the request is parsed, or when the upload is kept, if it is not a pdf
+	pass
+
+
+# the file werkzeug streams an uploaded file into, a temporary file next to where the upload ends up
+# it is removed when the request closes it, unless it was kept
+class HashingUploadFile(object):
+	def __init__(self, upload_dir, filename=None):
+		self.filename = filename
+		self.file = tempfile.NamedTemporaryFile(dir=upload_dir, prefix='.upload-', suffix='.part', delete=False)
+		self.hash = hashlib.sha256()
+		self.head = b''
+		self.size = 0
+		self.kept = False
+
+	def write(self, data):
+		if len(self.head) < PDF_HEADER_SEARCH_BYTES:
+			self.head += data[:PDF_HEADER_SEARCH_BYTES - len(self.head)]
+			if len(self.head) == PDF_HEADER_SEARCH_BYTES and not self.looks_like_pdf():
+				self.close()
+				raise UploadRejected(str(self.filename)+" is not a pdf")
+		self.hash.update(data)
+		self.file.write(data)
+		self.size += len(data)
+
+	def looks_like_pdf(self):
+		return PDF_MAGIC in self.head
+
+	def content_hash(self): # sha256 of the upload, like result_cache.hash_file would compute it
+		return self.hash.hexdigest()
+
+	def keep(self, destination_path): # move the complete upload to destination_path
+		if not self.looks_like_pdf():
+			self.close()
+			raise UploadRejected(str(self.filename)+" is not a pdf")
+		self.file.close()
+		os.rename(self.file.name, destination_path) # same directory, so other requests never see half an upload
+		self.kept = True
+
+	def close(self):
+		self.file.close()
+		if not self.kept and os.path.exists(self.file.name):
+			os.remove(self.file.name)
+
+	def __getattr__(self, name): # read, readline, seek and tell, for werkzeug and FileStorage.save
+		return getattr(self.file, name)
@@ -0,0 +1,120 @@
+## Every upload gets its own workspace, a directory named after a random id under the upload and output folders,
+## so that two uploads with the same filename never overwrite each other's pdf or output
+## a reaper thread removes workspaces once they are older than a ttl, and the oldest ones first while the folders are over a size quota
+
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+WORKSPACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def new_workspace_id():
+	return uuid.uuid4().hex
+
+def is_workspace_id(workspace_id):
+	return WORKSPACE_ID.match(workspace_id) is not None
+
+def make_workspace(root_path, workspace_id): # the workspace directory under root_path, created if it is not there yet
+	workspace_path = os.path.join(root_path, workspace_id)
+	try:
+		os.mkdir(workspace_path)
+	except OSError:
+		if not os.path.isdir(workspace_path):
+			raise
+	return workspace_path
+
+def entry_usage(entry_path): # (bytes, last modification time) of a file, or of everything in a directory
+	if not os.path.isdir(entry_path):
+		stat = os.stat(entry_path)
+		return stat.st_size, stat.st_mtime
+	total_bytes = 0
+	last_modified = os.stat(entry_path).st_mtime
+	for dir_path, dir_names, filenames in os.walk(entry_path):
+		for filename in filenames:
+			try:
+				stat = os.stat(os.path.join(dir_path, filename))
+			except OSError:
+				continue # removed while it was walked, by a split finishing or another reaper
+			total_bytes += stat.st_size
+			last_modified = max(last_modified, stat.st_mtime)
+	return total_bytes, last_modified
+
+def remove_entry(entry_path):
+	if os.path.isdir(entry_path):
+		shutil.rmtree(entry_path, ignore_errors=True) # another app process may be reaping it at the same time
+	else:
+		try:
+			os.remove(entry_path)
+		except OSError:
+			pass
+
+
+# removes what is directly under each of root_paths, workspaces and single files alike, once it was not modified for ttl seconds
+# then, while everything left takes more than max_bytes, the least recently modified entries
+# entries modified in the last grace seconds are never removed, they may belong to a split that is still queued or running
+class Reaper(object):
+	def __init__(self, root_paths, ttl, max_bytes, grace, interval=60):
+		self.root_paths = root_paths
+		self.ttl = ttl
+		self.max_bytes = max_bytes
+		self.grace = grace
+		self.interval = interval
+		self.stopped = threading.Event()
+		self.thread = None
+
+	def start(self):
+		self.thread = threading.Thread(target=self._run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self):
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+
+	def _run(self):
+		while not self.stopped.is_set():
+			try:
+				self.reap()
+			except Exception as err: # a failed pass is retried on the next one, the thread must not die
+				logger.error("Failed to reap workspaces")
+				logger.error(err)
+			self.stopped.wait(self.interval)
+
+	def reap(self): # a single pass over every root path, returns the number of bytes freed
+		now = time.time()
+		entries = []
+		for root_path in self.root_paths:
+			if not os.path.isdir(root_path):
+				continue
+			for name in os.listdir(root_path):
+				entry_path = os.path.join(root_path, name)
+				try:
+					entry_bytes, last_modified = entry_usage(entry_path)
+				except OSError:
+					continue
+				entries.append((last_modified, entry_bytes, entry_path))
+		entries.sort()
+		total_bytes = sum(entry_bytes for last_modified, entry_bytes, entry_path in entries)
+		freed_bytes = 0
+		for last_modified, entry_bytes, entry_path in entries: # oldest first
+			if now - last_modified < self.grace:
+				break
+			if now - last_modified < self.ttl and total_bytes - freed_bytes <= self.max_bytes:
+				break
+			remove_entry(entry_path)
+			freed_bytes += entry_bytes
+		if total_bytes - freed_bytes > self.max_bytes:
+			logger.warning("Workspaces take "+str(total_bytes - freed_bytes)+" bytes, more than the quota of "+str(self.max_bytes)+", but all of them are still in use")
+		if freed_bytes:
+			logger.info("Reaped "+str(freed_bytes)+" bytes of workspaces")
+		return freed_bytes
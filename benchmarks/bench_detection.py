@@ -0,0 +1,86 @@
+## Micro-benchmark of slide detection on dense pages, the kind with note lines, page numbers and logos around the slides.
+## Compares the old per-contour selection (python loop, del by index, contourArea in a sort key and again in the bounds check)
+## with split_pdf.select_slide_rects on the same contours, then times full detection for 6 slides and for a grid.
+##
+## usage: python benchmarks/bench_detection.py [-c CLUTTER_GLYPHS ...] [-r REPETITIONS]
+
+import argparse
+import os
+import sys
+import timeit
+
+import cv2
+from PIL import ImageDraw
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import split_pdf
+import synthetic_pdf
+
+MIN_SLIDE_SIZE = 50 # the 6 slide bounds at 200 dpi
+MAX_SLIDE_WIDTH = 1050
+MAX_SLIDE_HEIGHT = 840
+GLYPH_PITCH = 13 # pixels between clutter glyphs, so that they never touch
+
+
+def legacy_three_largest_contours(contours, min_area, max_area): # the selection find_left_slides_using_opencv used to do, kept for comparison
+	contours = list(contours)
+	indexes_with_more_than_four_points = []
+	for i in range(0, len(contours) - 1):
+		if len(contours[i]) > 4:
+			indexes_with_more_than_four_points.append(i)
+	for index in indexes_with_more_than_four_points:
+		if index < len(contours):
+			del contours[index]
+	sorted_contours = sorted(contours, key=lambda x: cv2.contourArea(x), reverse=True)
+	three_largest_contours = sorted_contours[:3]
+	slides_inside_bounds = True
+	for contour in three_largest_contours:
+		slides_inside_bounds = slides_inside_bounds and (cv2.contourArea(contour) > min_area and cv2.contourArea(contour) < max_area)
+	return three_largest_contours if slides_inside_bounds else None
+
+
+def draw_dense_page(clutter_glyphs): # a 6 slide page plus up to clutter_glyphs small black glyphs (boxes and letter like blobs) around the slides
+	image = synthetic_pdf.draw_page_image(6)
+	draw = ImageDraw.Draw(image)
+	slide_rects = synthetic_pdf.slide_layout(6, image.size[0], image.size[1])
+	glyphs_drawn = 0
+	for y in range(4, image.size[1] - GLYPH_PITCH, GLYPH_PITCH):
+		for x in range(4, image.size[0] - GLYPH_PITCH, GLYPH_PITCH):
+			if glyphs_drawn == clutter_glyphs:
+				return image
+			if any(x + GLYPH_PITCH >= rect[0] and x <= rect[0] + rect[2] + 2 and y + GLYPH_PITCH >= rect[1] and y <= rect[1] + rect[3] + 2 for rect in slide_rects):
+				continue # keep the slide borders intact
+			if glyphs_drawn % 2 == 0:
+				draw.rectangle([x, y, x + 6, y + 8], fill=(0, 0, 0))
+			else:
+				draw.ellipse([x, y, x + 8, y + 8], fill=(0, 0, 0)) # many contour points, like most letters
+			glyphs_drawn += 1
+	return image
+
+
+def best_time(function, repetitions):
+	return min(timeit.repeat(function, number=1, repeat=repetitions)) * 1000
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-c', '--clutter_glyphs', type=int, nargs='+', default=[0, 1000, 4000, 8000])
+	parser.add_argument('-r', '--repetitions', type=int, default=10)
+	args = parser.parse_args()
+
+	print("%-8s %9s %14s %14s %9s %14s %14s" % ("glyphs", "contours", "legacy sel ms", "numpy sel ms", "speedup", "6 slides ms", "3x2 grid ms"))
+	for clutter_glyphs in args.clutter_glyphs:
+		image = draw_dense_page(clutter_glyphs)
+		left_half = image.crop((0, 0, image.size[0] / 2, image.size[1]))
+		contours = cv2.findContours(split_pdf.get_black_mask(left_half), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+		legacy = best_time(lambda: legacy_three_largest_contours(contours, MIN_SLIDE_SIZE * MIN_SLIDE_SIZE, MAX_SLIDE_WIDTH * MAX_SLIDE_HEIGHT), args.repetitions)
+		vectorized = best_time(lambda: split_pdf.select_slide_rects(contours, MIN_SLIDE_SIZE, MIN_SLIDE_SIZE, MAX_SLIDE_WIDTH, MAX_SLIDE_HEIGHT)[:3], args.repetitions)
+		six_slides = best_time(lambda: split_pdf.find_slide_rects(image, "dense.pdf", 2), args.repetitions)
+		grid = best_time(lambda: split_pdf.find_slide_rects(image, "dense.pdf", None, grid=(3, 2)), args.repetitions)
+		print("%-8d %9d %14.2f %14.2f %8.1fx %14.2f %14.2f" % (clutter_glyphs, len(contours), legacy, vectorized, legacy / vectorized, six_slides, grid))
+
+
+if __name__ == '__main__':
+	main()
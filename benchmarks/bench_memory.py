@@ -0,0 +1,108 @@
+## Reports peak disk and memory use of splitting synthetic decks, through temporary directories
+## (the default) and fully in memory (split_document(..., in_memory=True)). Several deck lengths
+## are measured so that growth of peak RSS with page count shows up; the in memory path streams
+## pages, and pdf_writer streams the output document to disk as slides come in.
+##
+## usage: python benchmarks/bench_memory.py [-p PAGES [PAGES ...]] [-s SLIDES_PER_PAGE]
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import synthetic_pdf
+
+SPLITTING_MODES = {2: 3, 4: 0, 6: 1} # slides per page -> splitting mode
+
+
+def dir_size(dir_path):
+	total = 0
+	for root, dirs, files in os.walk(dir_path):
+		for filename in files:
+			try:
+				total += os.path.getsize(os.path.join(root, filename))
+			except OSError:
+				pass # file was deleted while walking
+	return total
+
+
+class DiskSampler(threading.Thread): # polls the size of a directory and remembers the largest one seen
+	def __init__(self, dir_path, interval=0.02):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.dir_path = dir_path
+		self.interval = interval
+		self.peak_bytes = 0
+		self.stopped = threading.Event()
+
+	def run(self):
+		while not self.stopped.is_set():
+			self.peak_bytes = max(self.peak_bytes, dir_size(self.dir_path))
+			time.sleep(self.interval)
+
+	def stop(self):
+		self.stopped.set()
+		self.join()
+
+
+def run_once(pdf_path, splitting_mode, in_memory): # runs in a fresh interpreter so that peak rss only covers a single split
+	temp_root = tempfile.mkdtemp()
+	tempfile.tempdir = temp_root # every temporary directory of the split ends up here
+	output_dir = tempfile.mkdtemp() + '/'
+	import split_pdf
+	sampler = DiskSampler(temp_root)
+	sampler.start()
+	start = time.time()
+	split_pdf.split_document(os.path.basename(pdf_path), os.path.dirname(pdf_path) + '/', output_dir, splitting_mode, in_memory)
+	elapsed = time.time() - start
+	sampler.stop()
+	output_bytes = os.path.getsize(os.path.join(output_dir, 'new_' + os.path.basename(pdf_path)))
+	shutil.rmtree(temp_root)
+	print(json.dumps({
+		'seconds': elapsed,
+		'peak_temp_disk_bytes': sampler.peak_bytes - output_bytes, # the output itself is written under temp_root too
+		'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+		'peak_pdftoppm_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+	}))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-p', '--pages', type=int, nargs='+', default=[100, 200])
+	parser.add_argument('-s', '--slides_per_page', type=int, default=4, choices=[2, 4, 6])
+	parser.add_argument('--run', choices=['disk', 'memory'], help=argparse.SUPPRESS)
+	parser.add_argument('--pdf', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	splitting_mode = SPLITTING_MODES[args.slides_per_page]
+
+	if args.run:
+		run_once(args.pdf, splitting_mode, args.run == 'memory')
+		return
+
+	work_dir = tempfile.mkdtemp()
+	try:
+		print("%d slides per page" % args.slides_per_page)
+		print("%-6s %-8s %10s %16s %14s %18s" % ("pages", "mode", "time (s)", "peak disk (MB)", "peak RSS (MB)", "pdftoppm RSS (MB)"))
+		for pages in args.pages:
+			pdf_path = os.path.join(work_dir, 'synthetic_%d.pdf' % pages)
+			synthetic_pdf.generate_handout_pdf(pdf_path, pages, args.slides_per_page)
+			for run in ['disk', 'memory']:
+				output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '-s', str(args.slides_per_page), '--run', run, '--pdf', pdf_path])
+				result = json.loads(output.strip().splitlines()[-1])
+				print("%-6d %-8s %10.2f %16.1f %14.1f %18.1f" % (pages, run, result['seconds'], result['peak_temp_disk_bytes'] / 1048576.0,
+					result['peak_rss_kb'] / 1024.0, result['peak_pdftoppm_rss_kb'] / 1024.0))
+	finally:
+		shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,79 @@
+## Compares the filters slides can be resized with (split_pdf.RESIZE_FILTERS), in throughput and in how close their slides are
+## to the lanczos ones every split produced before the filter could be picked (PSNR, higher is closer, lanczos itself is inf).
+## Pages are synthetic 4 slide handout pages with lines of text in every slide, plain or with a photo like gradient behind them,
+## resized the way the in memory path does it, every slide of a page in one resize_page_slides call.
+## The old resize, always PIL's lanczos, is timed for comparison.
+##
+## usage: python benchmarks/bench_resize.py [-p PAGES] [-d DPI] [-w RESIZE_WIDTH] [-r REPETITIONS]
+
+import argparse
+import math
+import os
+import sys
+import timeit
+
+import numpy
+from PIL import Image, ImageDraw
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import split_pdf
+import synthetic_pdf
+
+TEXT_LINE_PITCH = 14 # pixels between lines of text at 200 dpi, about a 10 point font
+
+
+def draw_text_page(dpi, photo): # a 4 slide page rendered at dpi, its slides full of text, and their rectangles
+	scale = dpi / float(synthetic_pdf.RENDER_DPI)
+	page = synthetic_pdf.draw_page_image(4, int(1700 * scale), int(2200 * scale))
+	rects = synthetic_pdf.slide_layout(4, page.size[0], page.size[1])
+	draw = ImageDraw.Draw(page)
+	for rect in rects:
+		for y in range(rect[1] + 40, rect[1] + rect[3] - 20, int(TEXT_LINE_PITCH * scale)):
+			draw.text((rect[0] + 20, y), "The quick brown fox jumps over the lazy dog 0123456789", fill=(0, 0, 0))
+	if photo:
+		gradient = numpy.fromfunction(lambda y, x, c: (x * (c + 1) + y * 3) % 256, (page.size[1], page.size[0], 3)).astype(numpy.uint8)
+		page = Image.blend(page, Image.fromarray(gradient), 0.5)
+	return page, rects
+
+def legacy_resize(page, rects, dpi, resize_width): # what generate_resized_slides used to do, kept for comparison
+	return [slide.resize(split_pdf.get_resized_size(slide.size, dpi, resize_width), Image.ANTIALIAS) for slide in split_pdf.crop_slides(page, rects)]
+
+def psnr(slides, reference_slides): # peak signal to noise ratio of slides against reference_slides, in dB
+	squared_error = 0.0
+	pixel_count = 0
+	for slide, reference_slide in zip(slides, reference_slides):
+		difference = numpy.asarray(slide, dtype=numpy.float64) - numpy.asarray(reference_slide, dtype=numpy.float64)
+		squared_error += numpy.sum(difference * difference)
+		pixel_count += difference.size
+	if squared_error == 0:
+		return float('inf')
+	return 10 * math.log10(255.0 ** 2 / (squared_error / pixel_count))
+
+def best_time(function, repetitions):
+	return min(timeit.repeat(function, number=1, repeat=repetitions))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-p', '--pages', type=int, default=50)
+	parser.add_argument('-d', '--dpi', type=int, default=split_pdf.RENDER_DPI, choices=split_pdf.ALLOWED_DPIS)
+	parser.add_argument('-w', '--resize_width', type=int, help='width slides are resized to, follows the dpi by default')
+	parser.add_argument('-r', '--repetitions', type=int, default=3)
+	args = parser.parse_args()
+
+	print("%d pages at %d dpi, 4 slides each" % (args.pages, args.dpi))
+	print("%-8s %-16s %10s %12s %12s %10s" % ("content", "filter", "seconds", "ms/page", "pages/s", "PSNR (dB)"))
+	for photo in [False, True]:
+		page, rects = draw_text_page(args.dpi, photo)
+		reference_slides = split_pdf.resize_page_slides(page, rects, args.dpi, args.resize_width, 'lanczos')
+		cases = [("lanczos, old", lambda: legacy_resize(page, rects, args.dpi, args.resize_width))]
+		cases += [(resize_filter, lambda resize_filter=resize_filter: split_pdf.resize_page_slides(page, rects, args.dpi, args.resize_width, resize_filter)) for resize_filter in split_pdf.RESIZE_FILTERS]
+		for name, resize in cases:
+			seconds = best_time(lambda: [resize() for i in range(0, args.pages)], args.repetitions)
+			print("%-8s %-16s %10.3f %12.2f %12.1f %10.1f" % ("photo" if photo else "plain", name, seconds, seconds * 1000 / args.pages, args.pages / seconds, psnr(resize(), reference_slides)))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,76 @@
+## Compares the old 2 slide disk path (every page written again as two half page PPMs, which crop_images then crops)
+## with cropping both slides straight out of the full pages, like every other mode does.
+## Pages are synthetic 2 slide handout pages, written as PPMs the way pdf2image leaves them, so rasterization is not timed.
+##
+## usage: python benchmarks/bench_two_slides.py [-p PAGES] [-r REPETITIONS]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import page_store
+import split_pdf
+import synthetic_pdf
+
+
+def legacy_crop(pages_dir, half_imgs_dir, crop_dir, upper_slide_rect, page_size): # what process_2_slide_pdf used to do before resizing, kept for comparison
+	pages = page_store.PageStore(pages_dir)
+	halves = page_store.PageStore(half_imgs_dir)
+	filename_counter = 0
+	for page_pixels in pages.generate_pages(split_pdf.sort_file_list_uuid(pages.filenames())):
+		halves.write('a-b-c-d-e-'+str(filename_counter)+'.ppm', page_store.crop_pixels(page_pixels, [0, 0, page_size[0], page_size[1] / 2]))
+		halves.write('a-b-c-d-e-'+str(filename_counter + 1)+'.ppm', page_store.crop_pixels(page_pixels, [0, page_size[1] / 2, page_size[0], page_size[1] - page_size[1] / 2]))
+		filename_counter += 2
+	split_pdf.crop_images(half_imgs_dir, crop_dir, [upper_slide_rect])
+
+def empty_dirs(*dir_paths):
+	for dir_path in dir_paths:
+		for filename in os.listdir(dir_path):
+			os.remove(os.path.join(dir_path, filename))
+
+def best_time(function, repetitions, *dirs_to_empty):
+	def run():
+		empty_dirs(*dirs_to_empty)
+		return timeit.timeit(function, number=1)
+	return min(run() for i in range(0, repetitions))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-p', '--pages', type=int, default=50)
+	parser.add_argument('-r', '--repetitions', type=int, default=3)
+	args = parser.parse_args()
+
+	work_dir = tempfile.mkdtemp()
+	pages_dir, half_imgs_dir, crop_dir, resize_dir, output_dir = [os.path.join(work_dir, name) for name in ['pages', 'halves', 'crop', 'resize', 'output']]
+	for dir_path in [pages_dir, half_imgs_dir, crop_dir, resize_dir, output_dir]:
+		os.mkdir(dir_path)
+	try:
+		page_img = synthetic_pdf.draw_page_image(2)
+		for page_number in range(0, args.pages):
+			page_img.save(os.path.join(pages_dir, 'page-'+str(page_number)+'.ppm'), 'PPM')
+		slide_rects = split_pdf.find_slide_rects(page_img, "synthetic.pdf", 3)
+		validator = split_pdf.make_page_validator(page_img, slide_rects, "synthetic.pdf", 3)
+
+		legacy = best_time(lambda: legacy_crop(pages_dir, half_imgs_dir, crop_dir, slide_rects[0], page_img.size), args.repetitions, half_imgs_dir, crop_dir)
+		direct = best_time(lambda: split_pdf.crop_images(pages_dir, crop_dir, slide_rects, validator), args.repetitions, crop_dir)
+		whole_path = best_time(lambda: split_pdf.process_2_slide_pdf(pages_dir, "synthetic.pdf", pages_dir + '/', output_dir + '/', page_img, crop_dir, resize_dir), args.repetitions, crop_dir, resize_dir)
+		print("%d pages" % args.pages)
+		print("%-34s %10s %12s" % ("", "seconds", "ms/page"))
+		print("%-34s %10.3f %12.2f" % ("halves, then crop (old)", legacy, legacy * 1000 / args.pages))
+		print("%-34s %10.3f %12.2f" % ("crop full pages (new)", direct, direct * 1000 / args.pages))
+		print("%-34s %9.1fx" % ("crop speedup", legacy / direct))
+		print("%-34s %10.3f %12.2f" % ("process_2_slide_pdf, after raster", whole_path, whole_path * 1000 / args.pages))
+		print("%-34s %9.1fx" % ("estimated whole path speedup", (whole_path - direct + legacy) / whole_path))
+	finally:
+		shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,68 @@
+## Compares the latency of splitting a pdf in a freshly spawned interpreter (the old
+## call_pdf_splitter_subprocess behaviour) against a pool of warm pre-forked workers.
+##
+## usage: python benchmarks/bench_worker_startup.py [-r REPETITIONS]
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import split_pdf
+
+TEST_FILES_DIR = os.path.join(APP_DIR, 'test_files/')
+TEST_PDFS = [('2_slides_3_pgs.pdf', 3), ('4_slides_3_pgs.pdf', 0)] # (filename, splitting mode)
+
+
+def run_cold_subprocess(filename, splitting_mode, output_dir):
+	args = [sys.executable, os.path.join(APP_DIR, 'split_pdf.py'), '-f', filename, '-i', TEST_FILES_DIR, '-o', output_dir, '-m', str(splitting_mode)]
+	start = time.time()
+	returncode = subprocess.call(args)
+	elapsed = time.time() - start
+	if returncode != 0:
+		raise Exception("cold subprocess failed on "+filename)
+	return elapsed
+
+
+def run_warm_worker(pool, filename, splitting_mode, output_dir):
+	start = time.time()
+	pool.apply(split_pdf.split_document, (filename, TEST_FILES_DIR, output_dir, splitting_mode))
+	return time.time() - start
+
+
+def median(values):
+	values = sorted(values)
+	middle = len(values) // 2
+	if len(values) % 2 == 1:
+		return values[middle]
+	return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-r', '--repetitions', type=int, default=5)
+	args = parser.parse_args()
+
+	output_dir = tempfile.mkdtemp() + '/'
+	pool = multiprocessing.Pool(processes=1)
+	try:
+		pool.apply(split_pdf.split_document, (TEST_PDFS[0][0], TEST_FILES_DIR, output_dir, TEST_PDFS[0][1])) # warm the worker up once
+		print("%-22s %14s %14s %8s" % ("file", "cold (s)", "warm (s)", "speedup"))
+		for filename, splitting_mode in TEST_PDFS:
+			cold = [run_cold_subprocess(filename, splitting_mode, output_dir) for i in range(args.repetitions)]
+			warm = [run_warm_worker(pool, filename, splitting_mode, output_dir) for i in range(args.repetitions)]
+			print("%-22s %14.3f %14.3f %7.1fx" % (filename, median(cold), median(warm), median(cold) / median(warm)))
+	finally:
+		pool.terminate()
+		shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+	main()
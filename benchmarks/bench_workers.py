@@ -0,0 +1,50 @@
+## Measures how splitting a synthetic deck scales with the number of worker processes
+## (split_document(..., workers=N)).
+##
+## usage: python benchmarks/bench_workers.py [-p PAGES] [-s SLIDES_PER_PAGE] [-r REPETITIONS]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import split_pdf
+import synthetic_pdf
+
+SPLITTING_MODES = {2: 3, 4: 0, 6: 1} # slides per page -> splitting mode
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-p', '--pages', type=int, default=100)
+	parser.add_argument('-s', '--slides_per_page', type=int, default=4, choices=[2, 4, 6])
+	parser.add_argument('-r', '--repetitions', type=int, default=3)
+	args = parser.parse_args()
+
+	work_dir = tempfile.mkdtemp() + '/'
+	try:
+		synthetic_pdf.generate_handout_pdf(work_dir + 'synthetic.pdf', args.pages, args.slides_per_page)
+		print("%d pages, %d slides per page" % (args.pages, args.slides_per_page))
+		print("%-8s %10s %10s %9s" % ("workers", "time (s)", "pages/s", "speedup"))
+		baseline = None
+		for workers in WORKER_COUNTS:
+			timings = []
+			for i in range(args.repetitions):
+				start = time.time()
+				split_pdf.split_document('synthetic.pdf', work_dir, work_dir, SPLITTING_MODES[args.slides_per_page], True, workers)
+				timings.append(time.time() - start)
+			best = min(timings)
+			baseline = baseline or best
+			print("%-8d %10.2f %10.1f %8.1fx" % (workers, best, args.pages / best, baseline / best))
+	finally:
+		shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+	main()
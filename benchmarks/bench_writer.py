@@ -0,0 +1,83 @@
+## Compares the old output writer (png encode every slide, then reportlab decodes and recompresses it)
+## with pdf_writer, which compresses every slide once and copies the bytes into the file, for flate and jpeg.
+## Slides come from synthetic handout pages, plain (text and borders on white) or with a photo like gradient behind them.
+##
+## usage: python benchmarks/bench_writer.py [-s SLIDES] [-r REPETITIONS]
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+import StringIO
+
+import numpy
+from PIL import Image
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import split_pdf
+import synthetic_pdf
+
+
+def legacy_write(path, slides): # what create_new_document_from_images used to do, kept for comparison
+	c = canvas.Canvas(path, pagesize=letter)
+	for slide in slides:
+		side_im_data = StringIO.StringIO()
+		slide.save(side_im_data, format='png')
+		side_out = ImageReader(StringIO.StringIO(side_im_data.getvalue()))
+		slide_width, slide_height = side_out.getSize()
+		c.drawImage(side_out, 50, 250, width=split_pdf.RESIZE_BASEWIDTH, height=split_pdf.RESIZE_BASEWIDTH*slide_height/float(slide_width))
+		c.showPage()
+	c.save()
+
+
+def make_slides(slide_count, photo): # slide_count distinct 500 pixel wide slides, every page of the deck is different
+	slides = []
+	page_number = 0
+	while len(slides) < slide_count:
+		page = synthetic_pdf.draw_page_image(4)
+		if photo:
+			gradient = numpy.fromfunction(lambda y, x, c: (x * (c + 1) + y * 3 + page_number * 7) % 256, (page.size[1], page.size[0], 3)).astype(numpy.uint8)
+			page = Image.blend(page, Image.fromarray(gradient), 0.5)
+		rects = synthetic_pdf.slide_layout(4, page.size[0], page.size[1])
+		slides.extend(split_pdf.generate_resized_slides([page], rects))
+		page_number += 1
+	return slides[:slide_count]
+
+
+def best_time(function, repetitions):
+	return min(timeit.repeat(function, number=1, repeat=repetitions))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-s', '--slides', type=int, default=300)
+	parser.add_argument('-r', '--repetitions', type=int, default=3)
+	args = parser.parse_args()
+
+	output_dir = tempfile.mkdtemp()
+	writers = [
+		("reportlab png", lambda slides: legacy_write(os.path.join(output_dir, "legacy.pdf"), slides), "legacy.pdf"),
+		("flate", lambda slides: split_pdf.create_new_document_from_images("flate.pdf", slides, output_dir+"/"), "new_flate.pdf"),
+		("jpeg q85", lambda slides: split_pdf.create_new_document_from_images("jpeg85.pdf", slides, output_dir+"/", 'jpeg', 85), "new_jpeg85.pdf"),
+		("jpeg q60", lambda slides: split_pdf.create_new_document_from_images("jpeg60.pdf", slides, output_dir+"/", 'jpeg', 60), "new_jpeg60.pdf"),
+	]
+	print("%-8s %-14s %10s %12s %10s" % ("content", "writer", "seconds", "ms/slide", "size KB"))
+	for photo in [False, True]:
+		slides = make_slides(args.slides, photo)
+		for name, write, output_filename in writers:
+			seconds = best_time(lambda: write(slides), args.repetitions)
+			size = os.path.getsize(os.path.join(output_dir, output_filename))
+			print("%-8s %-14s %10.2f %12.2f %10d" % ("photo" if photo else "plain", name, seconds, seconds * 1000 / len(slides), size / 1024))
+	for filename in os.listdir(output_dir):
+		os.remove(os.path.join(output_dir, filename))
+	os.rmdir(output_dir)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,117 @@
+## Load test for a running webapp: clients upload synthetic handouts through /api/batch at the same time, more of them than the
+## server is allowed to split at once, and follow their jobs until they are done.
+## Reports how many uploads were admitted, turned away as saturated (503) or rate limited (429), and latency percentiles of each.
+## With admission control, admitted uploads finish within a bounded time and the rest are turned away in milliseconds,
+## instead of every upload waiting longer and longer.
+## Every upload is made unique, so that deduplication and the result cache do not hide the load. All clients come from this
+## machine's address, raise UPLOAD_RATE and UPLOAD_BURST on the server to measure saturation rather than rate limiting.
+##
+## usage: python benchmarks/load_test.py [--url URL] [-c CLIENTS] [-n UPLOADS_PER_CLIENT] [-p PAGES] [-s SLIDES_PER_PAGE] [-d DPI]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib2
+import uuid
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import synthetic_pdf
+
+POLL_INTERVAL = 0.5 # seconds between job status checks of a client
+JOB_TIMEOUT = 600 # seconds a client follows a job before counting it as timed out
+
+
+def encode_multipart(fields, files): # (content type, body) of a multipart/form-data request, files are (field, filename, bytes)
+	boundary = uuid.uuid4().hex
+	lines = []
+	for name, value in fields:
+		lines += ['--'+boundary, 'Content-Disposition: form-data; name="%s"' % name, '', str(value)]
+	for name, filename, data in files:
+		lines += ['--'+boundary, 'Content-Disposition: form-data; name="%s"; filename="%s"' % (name, filename), 'Content-Type: application/pdf', '', data]
+	lines += ['--'+boundary+'--', '']
+	return 'multipart/form-data; boundary='+boundary, '\r\n'.join(lines)
+
+def request_json(url, data=None, headers={}): # (status code, json body, headers) of a request, error statuses included
+	try:
+		response = urllib2.urlopen(urllib2.Request(url, data, headers))
+	except urllib2.HTTPError as err:
+		response = err
+	body = response.read()
+	try:
+		return response.getcode(), json.loads(body), response.info()
+	except ValueError:
+		return response.getcode(), None, response.info()
+
+def upload_and_wait(base_url, pdf_bytes, splitting_mode, dpi): # (outcome, seconds from the upload to the outcome)
+	unique_pdf = pdf_bytes+'\n%'+uuid.uuid4().hex+'\n' # a comment after the end of the file, pdf readers ignore it
+	content_type, body = encode_multipart([('mode', splitting_mode), ('dpi', dpi)], [('pdf', 'load.pdf', unique_pdf)])
+	start = time.time()
+	status_code, response, headers = request_json(base_url+'/api/batch', body, {'Content-Type': content_type})
+	if status_code == 503 or status_code == 429:
+		return str(status_code), time.time() - start
+	if status_code != 200 or response['files'][0]['status'] == 'rejected':
+		return 'error', time.time() - start
+	entry = response['files'][0]
+	if entry['status'] == 'done':
+		return 'done', time.time() - start
+	while time.time() - start < JOB_TIMEOUT:
+		status_code, job, headers = request_json(base_url+entry['status_url'])
+		if job is not None and job['status'] in ('done', 'failed'):
+			return job['status'], time.time() - start
+		time.sleep(POLL_INTERVAL)
+	return 'timeout', time.time() - start
+
+def run_client(base_url, pdf_bytes, splitting_mode, dpi, uploads, results, results_lock):
+	for i in range(0, uploads):
+		outcome = upload_and_wait(base_url, pdf_bytes, splitting_mode, dpi)
+		with results_lock:
+			results.append(outcome)
+
+def percentile(sorted_values, fraction):
+	return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def print_results(results, seconds):
+	print("%d uploads in %.1f s" % (len(results), seconds))
+	print("%-10s %8s %10s %10s %10s" % ("outcome", "count", "p50 (s)", "p95 (s)", "max (s)"))
+	for outcome in sorted(set(outcome for outcome, latency in results)):
+		latencies = sorted(latency for result_outcome, latency in results if result_outcome == outcome)
+		print("%-10s %8d %10.3f %10.3f %10.3f" % (outcome, len(latencies), percentile(latencies, 0.5), percentile(latencies, 0.95), latencies[-1]))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--url', type=str, default='http://127.0.0.1:5000')
+	parser.add_argument('-c', '--clients', type=int, default=20)
+	parser.add_argument('-n', '--uploads', type=int, default=3, help='uploads every client makes, one after the other')
+	parser.add_argument('-p', '--pages', type=int, default=20)
+	parser.add_argument('-s', '--slides_per_page', type=int, default=4, choices=[2, 4, 6])
+	parser.add_argument('-d', '--dpi', type=int, default=200)
+	args = parser.parse_args()
+
+	pdf_path = os.path.join(tempfile.mkdtemp(), 'load.pdf')
+	synthetic_pdf.generate_handout_pdf(pdf_path, args.pages, args.slides_per_page)
+	with open(pdf_path, 'rb') as pdf_file:
+		pdf_bytes = pdf_file.read()
+	os.remove(pdf_path)
+	os.rmdir(os.path.dirname(pdf_path))
+
+	results = []
+	results_lock = threading.Lock()
+	splitting_mode = {2: 3, 4: 0, 6: 1}[args.slides_per_page]
+	threads = [threading.Thread(target=run_client, args=(args.url.rstrip('/'), pdf_bytes, splitting_mode, args.dpi, args.uploads, results, results_lock)) for i in range(0, args.clients)]
+	start = time.time()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	print_results(results, time.time() - start)
+
+
+if __name__ == '__main__':
+	main()
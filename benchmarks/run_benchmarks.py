@@ -0,0 +1,156 @@
+## Benchmark suite: splits synthetic 2, 4 and 6 slides per page handouts through every processing path (disk, memory and vector),
+## each split in a fresh interpreter so that peak RSS only covers that split, and reports pages/s end to end and per stage
+## (from split_document's stage timings), peak RSS and output size.
+## Results can be saved as a JSON baseline, later runs with the same settings are compared against it and fail when any
+## result is worse than the baseline by more than the threshold.
+##
+## usage: python benchmarks/run_benchmarks.py [-p PAGES] [-d DPI] [--slide_scale SCALE] [-r REPETITIONS]
+##                                            [--save BASELINE] [--baseline BASELINE] [-t THRESHOLD]
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import synthetic_pdf
+
+SPLITTING_MODES = {2: 3, 4: 0, 6: 1} # slides per page -> splitting mode
+PROCESSING_PATHS = {'disk': {}, 'memory': {'in_memory': True}, 'vector': {'vector': True}} # split_document keyword arguments of every path
+DEFAULT_THRESHOLD = 0.2 # fraction a result can be worse than the baseline before the run fails
+MIN_COMPARED_STAGE_SECONDS = 0.05 # shorter stages are mostly noise, they are reported but not compared
+CASE_METRICS = [('pages_per_second', True), ('peak_rss_mb', False), ('output_kb', False)] # (name, higher is better) of the end to end results
+
+
+def run_once(pdf_path, processing_path, splitting_mode, dpi): # runs in a fresh interpreter, prints the split's results as json
+	import split_pdf
+	output_dir = tempfile.mkdtemp() + '/'
+	timings = []
+	try:
+		start = time.time()
+		output_filename = split_pdf.split_document(os.path.basename(pdf_path), os.path.dirname(pdf_path) + '/', output_dir, splitting_mode, dpi=dpi, timings=timings, **PROCESSING_PATHS[processing_path])
+		seconds = time.time() - start
+		output_bytes = os.path.getsize(output_dir + output_filename)
+	finally:
+		shutil.rmtree(output_dir)
+	print(json.dumps({
+		'seconds': seconds,
+		'stages': timings,
+		'output_bytes': output_bytes,
+		'peak_rss_kb': max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss), # pdftoppm included
+	}))
+
+def run_case(pdf_path, pages, processing_path, splitting_mode, dpi, repetitions): # best of repetitions runs, every one in its own interpreter
+	runs = []
+	for i in range(0, repetitions):
+		output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--run', processing_path, '--pdf', pdf_path, '-m', str(splitting_mode), '-d', str(dpi)])
+		runs.append(json.loads(output.strip().splitlines()[-1]))
+	stages = {}
+	for run in runs:
+		for span in run['stages']:
+			stage = stages.setdefault(span['stage'], {'seconds': span['seconds'], 'pages': span['pages']})
+			stage['seconds'] = min(stage['seconds'], span['seconds'])
+	for stage in stages.values():
+		stage['pages_per_second'] = stage['pages'] / stage['seconds'] if stage['pages'] and stage['seconds'] > 0 else None
+	return {
+		'pages_per_second': pages / min(run['seconds'] for run in runs),
+		'peak_rss_mb': min(run['peak_rss_kb'] for run in runs) / 1024.0,
+		'output_kb': runs[0]['output_bytes'] / 1024.0,
+		'stages': stages,
+	}
+
+def worse_by(baseline_value, value, higher_is_better): # fraction value is worse than baseline_value, negative if it is better
+	if not baseline_value:
+		return 0
+	if higher_is_better:
+		return (baseline_value - value) / float(baseline_value)
+	return (value - baseline_value) / float(baseline_value)
+
+def find_regressions(baseline, results, threshold): # every result worse than its baseline by more than threshold, as printable strings
+	regressions = []
+	for case_name, case in sorted(results['cases'].items()):
+		baseline_case = baseline['cases'].get(case_name)
+		if baseline_case is None:
+			continue # a new case, there is nothing to compare it to yet
+		for metric, higher_is_better in CASE_METRICS:
+			worse = worse_by(baseline_case[metric], case[metric], higher_is_better)
+			if worse > threshold:
+				regressions.append("%s %s: %.2f -> %.2f (%d%% worse)" % (case_name, metric, baseline_case[metric], case[metric], worse * 100))
+		for stage_name, stage in sorted(case['stages'].items()):
+			baseline_stage = baseline_case['stages'].get(stage_name)
+			if baseline_stage is None or baseline_stage['seconds'] < MIN_COMPARED_STAGE_SECONDS:
+				continue
+			worse = worse_by(baseline_stage['seconds'], stage['seconds'], False)
+			if worse > threshold:
+				regressions.append("%s %s stage: %.3fs -> %.3fs (%d%% worse)" % (case_name, stage_name, baseline_stage['seconds'], stage['seconds'], worse * 100))
+	return regressions
+
+def print_results(results):
+	print("%-10s %10s %14s %12s  %s" % ("case", "pages/s", "peak RSS (MB)", "output (KB)", "stages (pages/s, or seconds)"))
+	for case_name, case in sorted(results['cases'].items()):
+		stages = ", ".join("%s %s" % (stage_name, "%.1f/s" % stage['pages_per_second'] if stage['pages_per_second'] else "%.3fs" % stage['seconds']) for stage_name, stage in sorted(case['stages'].items()))
+		print("%-10s %10.2f %14.1f %12.1f  %s" % (case_name, case['pages_per_second'], case['peak_rss_mb'], case['output_kb'], stages))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-p', '--pages', type=int, default=20)
+	parser.add_argument('-d', '--dpi', type=int, default=200)
+	parser.add_argument('--slide_scale', type=float, default=1.0, help='slide size relative to the default layout, up to '+str(synthetic_pdf.MAX_SLIDE_SCALE))
+	parser.add_argument('-s', '--slides_per_page', type=int, nargs='+', default=sorted(SPLITTING_MODES.keys()), choices=sorted(SPLITTING_MODES.keys()))
+	parser.add_argument('--paths', nargs='+', default=sorted(PROCESSING_PATHS.keys()), choices=sorted(PROCESSING_PATHS.keys()))
+	parser.add_argument('-r', '--repetitions', type=int, default=3)
+	parser.add_argument('--save', type=str, help='write the results to this json baseline')
+	parser.add_argument('--baseline', type=str, help='compare the results against this json baseline, exit with 1 on regressions')
+	parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD)
+	parser.add_argument('--run', choices=sorted(PROCESSING_PATHS.keys()), help=argparse.SUPPRESS)
+	parser.add_argument('--pdf', help=argparse.SUPPRESS)
+	parser.add_argument('-m', '--mode', type=int, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.run:
+		run_once(args.pdf, args.run, args.mode, args.dpi)
+		return
+
+	settings = {'pages': args.pages, 'dpi': args.dpi, 'slide_scale': args.slide_scale}
+	baseline = None
+	if args.baseline:
+		with open(args.baseline) as baseline_file:
+			baseline = json.load(baseline_file)
+		if baseline['settings'] != settings:
+			print("Baseline was recorded with %s, run with the same settings to compare" % json.dumps(baseline['settings'], sort_keys=True))
+			sys.exit(2)
+
+	results = {'settings': settings, 'cases': {}}
+	work_dir = tempfile.mkdtemp()
+	try:
+		for slides_per_page in args.slides_per_page:
+			pdf_path = os.path.join(work_dir, 'synthetic_%dup.pdf' % slides_per_page)
+			synthetic_pdf.generate_handout_pdf(pdf_path, args.pages, slides_per_page, args.slide_scale)
+			for processing_path in args.paths:
+				results['cases']['%dup-%s' % (slides_per_page, processing_path)] = run_case(pdf_path, args.pages, processing_path, SPLITTING_MODES[slides_per_page], args.dpi, args.repetitions)
+	finally:
+		shutil.rmtree(work_dir)
+	print_results(results)
+
+	if args.save:
+		with open(args.save, 'w') as baseline_file:
+			json.dump(results, baseline_file, indent=2, sort_keys=True)
+	if baseline is not None:
+		regressions = find_regressions(baseline, results, args.threshold)
+		for regression in regressions:
+			print("REGRESSION " + regression)
+		if regressions:
+			sys.exit(1)
+		print("No regressions against %s (threshold %d%%)" % (args.baseline, args.threshold * 100))
+
+
+if __name__ == '__main__':
+	main()
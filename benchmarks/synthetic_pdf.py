@@ -0,0 +1,67 @@
+## Generates synthetic "n slides in a single slide" handouts, laid out the way split_pdf expects them:
+## black bordered slides, mirrored around the vertical centre of the page.
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from PIL import Image, ImageDraw
+
+RENDER_DPI = 200 # dpi pdf2image renders at by default, letter pages become 1700x2200 pixels
+POINTS_PER_INCH = 72
+MAX_SLIDE_SCALE = 1.3
+
+
+# [x, y, width, height] of every slide, in the order split_pdf emits them for modes 0, 1 and 3
+# slide_scale grows or shrinks the slides around their centres, up to MAX_SLIDE_SCALE before neighbouring slides touch
+def slide_layout(slides_per_page, page_width, page_height, slide_scale=1.0):
+	if slide_scale <= 0 or slide_scale > MAX_SLIDE_SCALE:
+		raise Exception("Slide scale must be between 0 and "+str(MAX_SLIDE_SCALE))
+	half_width = page_width / 2
+	if slides_per_page == 2:
+		slide_width = int(page_width * 0.6 * slide_scale)
+		slide_height = int(slide_width * 0.75)
+		x = (page_width - slide_width) / 2
+		y = (page_height / 2 - slide_height) / 2
+		return [[x, y, slide_width, slide_height], [x, page_height / 2 + y, slide_width, slide_height]]
+	if slides_per_page == 4:
+		slide_width = int(half_width * 0.76 * slide_scale)
+		slide_height = int(slide_width * 0.75)
+		x = (half_width - slide_width) / 2
+		y = (page_height / 2 - slide_height) / 2
+		return [[x, y, slide_width, slide_height], [half_width + x, y, slide_width, slide_height],
+			[x, page_height / 2 + y, slide_width, slide_height], [half_width + x, page_height / 2 + y, slide_width, slide_height]]
+	if slides_per_page == 6:
+		slide_width = int(half_width * 0.76 * slide_scale)
+		slide_height = int(slide_width * 0.75)
+		x = (half_width - slide_width) / 2
+		row_height = page_height / 3
+		y = (row_height - slide_height) / 2
+		return [[x, y, slide_width, slide_height], [x, row_height + y, slide_width, slide_height], [x, 2 * row_height + y, slide_width, slide_height],
+			[half_width + x, y, slide_width, slide_height], [half_width + x, row_height + y, slide_width, slide_height], [half_width + x, 2 * row_height + y, slide_width, slide_height]]
+	raise Exception("Unsupported number of slides per page: "+str(slides_per_page))
+
+
+def draw_page_image(slides_per_page, page_width=1700, page_height=2200, slide_scale=1.0): # a single handout page as a PIL image, like pdf2image would return it
+	image = Image.new('RGB', (page_width, page_height), (255, 255, 255))
+	draw = ImageDraw.Draw(image)
+	for i, rect in enumerate(slide_layout(slides_per_page, page_width, page_height, slide_scale)):
+		draw.rectangle([rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3]], outline=(0, 0, 0))
+		draw.text((rect[0] + 20, rect[1] + 20), "slide "+str(i), fill=(120, 120, 120))
+	return image
+
+
+def generate_handout_pdf(path, pages, slides_per_page, slide_scale=1.0): # write a handout pdf of the given number of letter sized pages
+	page_width_px = int(letter[0] * RENDER_DPI / POINTS_PER_INCH)
+	page_height_px = int(letter[1] * RENDER_DPI / POINTS_PER_INCH)
+	scale = float(POINTS_PER_INCH) / RENDER_DPI
+	c = canvas.Canvas(path, pagesize=letter)
+	for page in range(0, pages):
+		for i, rect in enumerate(slide_layout(slides_per_page, page_width_px, page_height_px, slide_scale)):
+			x = rect[0] * scale
+			y = letter[1] - (rect[1] + rect[3]) * scale # reportlab puts the origin at the bottom left
+			c.setLineWidth(1)
+			c.rect(x, y, rect[2] * scale, rect[3] * scale, stroke=1, fill=0)
+			c.setFillGray(0.5)
+			c.drawString(x + 10, y + rect[3] * scale - 20, "page "+str(page)+" slide "+str(i))
+			c.setFillGray(0)
+		c.showPage()
+	c.save()